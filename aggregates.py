@@ -0,0 +1,144 @@
+# Server-side aggregation for the Visualizations tab.
+# Counts, fixed-bin histograms and violin/box summaries are computed with
+# NumPy and only those summaries are sent to Plotly, so the size of a figure
+# depends on the number of bins and groups rather than the number of rows.
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from tracing import traced
+
+# Points on the density curve of each violin
+DENSITY_POINTS = 100
+
+
+# Function to count rows per (x value, group) pair
+def grouped_counts(x, groups):
+    x_codes, x_names = pd.factorize(pd.Series(x), sort=True)
+    group_codes, group_names = pd.factorize(pd.Series(groups), sort=True)
+    valid = (x_codes >= 0) & (group_codes >= 0)
+    flat = x_codes[valid] * len(group_names) + group_codes[valid]
+    counts = np.bincount(flat, minlength=len(x_names) * len(group_names))
+    return list(x_names), list(group_names), counts.reshape(len(x_names), len(group_names))
+
+
+# Value of quantile q from an already sorted array (linear interpolation)
+def _sorted_quantile(values, q):
+    if len(values) == 0:
+        return np.nan
+    position = q * (len(values) - 1)
+    lower = int(np.floor(position))
+    upper = min(lower + 1, len(values) - 1)
+    return float(values[lower] + (values[upper] - values[lower]) * (position - lower))
+
+
+class SortedGroups:
+    # Function to sort a numerical column once per group (missing values dropped)
+    def __init__(self, values, groups):
+        values = np.asarray(values, dtype=np.float64)
+        codes, names = pd.factorize(pd.Series(groups), sort=True)
+        keep = ~np.isnan(values) & (codes >= 0)
+        values, codes = values[keep], codes[keep]
+        order = np.lexsort((values, codes))
+        values, codes = values[order], codes[order]
+        bounds = np.searchsorted(codes, np.arange(len(names) + 1))
+        self.names = list(names)
+        self.sorted = [values[bounds[i]:bounds[i + 1]] for i in range(len(names))]
+        self.min = float(values.min()) if len(values) else 0.0
+        self.max = float(values.max()) if len(values) else 0.0
+
+    # Function to count each group in equal-width bins over the overall range
+    def histogram(self, bins):
+        high = self.max if self.max > self.min else self.min + 1.0
+        edges = np.linspace(self.min, high, bins + 1)
+        counts = []
+        for values in self.sorted:
+            # Bins are [left, right) except the last one, which also holds the maximum
+            cumulative = np.concatenate([[0], np.searchsorted(values, edges[1:-1], side='left'), [len(values)]])
+            counts.append(np.diff(cumulative))
+        return edges, np.array(counts)
+
+    # Function to summarise each group like a box plot
+    def box_stats(self):
+        stats = []
+        for values in self.sorted:
+            q1, median, q3 = (_sorted_quantile(values, q) for q in (0.25, 0.5, 0.75))
+            iqr = q3 - q1
+            # Whiskers reach the furthest points within 1.5 IQR, as Plotly draws them
+            low = values[np.searchsorted(values, q1 - 1.5 * iqr, side='left')] if len(values) else np.nan
+            high = values[np.searchsorted(values, q3 + 1.5 * iqr, side='right') - 1] if len(values) else np.nan
+            stats.append({'count': len(values), 'q1': q1, 'median': median, 'q3': q3,
+                          'lowerfence': float(low), 'upperfence': float(high),
+                          'mean': float(values.mean()) if len(values) else np.nan})
+        return stats
+
+    # Function to estimate each group's density on a shared grid
+    # The data is binned first and the bins are smoothed with a Gaussian kernel
+    # (Silverman bandwidth), so the cost depends on the grid, not on the rows.
+    def density(self, points=DENSITY_POINTS):
+        high = self.max if self.max > self.min else self.min + 1.0
+        edges = np.linspace(self.min, high, points + 1)
+        grid = (edges[:-1] + edges[1:]) / 2
+        step = edges[1] - edges[0]
+        densities = []
+        for values in self.sorted:
+            if len(values) < 2:
+                densities.append(np.zeros(points))
+                continue
+            cumulative = np.concatenate([[0], np.searchsorted(values, edges[1:-1], side='left'), [len(values)]])
+            counts = np.diff(cumulative).astype(np.float64)
+            iqr = _sorted_quantile(values, 0.75) - _sorted_quantile(values, 0.25)
+            spread = min(values.std(), iqr / 1.349) if iqr > 0 else values.std()
+            bandwidth = max(0.9 * spread * len(values) ** -0.2, step)
+            offsets = np.arange(-points + 1, points) * step
+            kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+            smoothed = np.convolve(counts, kernel)[points - 1:2 * points - 1]
+            densities.append(smoothed / (smoothed.sum() * step))
+        return grid, np.array(densities)
+
+
+# Function to draw grouped bar counts (same layout as px.histogram with barmode='group')
+@traced('figure.bar')
+def bar_figure(x_names, group_names, counts, x_title, legend_title):
+    fig = go.Figure()
+    for j, group in enumerate(group_names):
+        fig.add_trace(go.Bar(x=[str(x) for x in x_names], y=counts[:, j], name=str(group)))
+    fig.update_layout(barmode='group', xaxis=dict(title=x_title, type='category'),
+                      yaxis=dict(title='count'), legend=dict(title=legend_title))
+    return fig
+
+
+# Function to draw a stacked histogram from binned counts
+@traced('figure.histogram')
+def histogram_figure(groups, bins, feature, legend_title):
+    edges, counts = groups.histogram(bins)
+    centers = (edges[:-1] + edges[1:]) / 2
+    fig = go.Figure()
+    for name, group_counts in zip(groups.names, counts):
+        fig.add_trace(go.Bar(x=centers, y=group_counts, width=np.diff(edges), name=str(name),
+                             customdata=np.column_stack([edges[:-1], edges[1:]]),
+                             hovertemplate='%{customdata[0]:.2f} - %{customdata[1]:.2f}<br>count=%{y}'))
+    fig.update_layout(barmode='relative', bargap=0, xaxis=dict(title=feature), yaxis=dict(title='count'),
+                      legend=dict(title=legend_title))
+    return fig
+
+
+# Function to draw violins with inner boxes from density and quantile summaries
+@traced('figure.violin')
+def violin_figure(groups, feature, x_title, width=0.8):
+    grid, densities = groups.density()
+    fig = go.Figure()
+    peak = densities.max() if densities.size and densities.max() > 0 else 1.0
+    for i, (name, density, stats) in enumerate(zip(groups.names, densities, groups.box_stats())):
+        half = density / peak * width / 2
+        fig.add_trace(go.Scatter(x=np.concatenate([i - half, (i + half)[::-1]]),
+                                 y=np.concatenate([grid, grid[::-1]]),
+                                 fill='toself', mode='lines', name=str(name), hoverinfo='skip'))
+        fig.add_trace(go.Box(x=[i], q1=[stats['q1']], median=[stats['median']], q3=[stats['q3']],
+                             lowerfence=[stats['lowerfence']], upperfence=[stats['upperfence']],
+                             mean=[stats['mean']], width=width / 6, name=str(name), showlegend=False,
+                             fillcolor='white', line=dict(color='black', width=1)))
+    fig.update_layout(xaxis=dict(title=x_title, tickvals=list(range(len(groups.names))),
+                                 ticktext=[str(n) for n in groups.names]),
+                      yaxis=dict(title=feature), showlegend=False)
+    return fig
@@ -0,0 +1,92 @@
+# Content-addressed store for intermediate arrays.
+# Every artifact is saved under a key derived from the stage name, the keys or
+# hashes of its inputs and its parameters, so an unchanged stage is loaded
+# back (memory-mapped) instead of being recomputed.
+import hashlib
+import json
+import os
+import shutil
+import time as timer
+
+import numpy as np
+
+ARTIFACT_DIR = os.path.join('.cache', 'artifacts')
+META_FILE = 'meta.json'
+
+
+# Function to hash JSON-serialisable parts into a hex key
+def hash_key(*parts):
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# Function to hash the contents of a dict of arrays
+def hash_arrays(arrays):
+    sha = hashlib.sha256()
+    for name in sorted(arrays):
+        values = np.ascontiguousarray(arrays[name])
+        sha.update('{}:{}:{}'.format(name, values.dtype.str, values.shape).encode('utf-8'))
+        sha.update(values.tobytes())
+    return sha.hexdigest()
+
+
+class ArtifactStore:
+    def __init__(self, root=ARTIFACT_DIR):
+        self.root = root
+        # One entry per stage run: stage name, key, 'hit' or 'miss', seconds
+        self.log = []
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    # Function to build the key of a stage from its inputs and parameters
+    def key(self, stage, inputs, params):
+        return hash_key(stage, inputs, params)
+
+    # Function to load the arrays and metadata of a key, or None if missing
+    def load(self, key):
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, META_FILE)) as f:
+                meta = json.load(f)
+            arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+                      for name in meta['arrays']}
+        except (OSError, ValueError, KeyError):
+            return None
+        return arrays, meta['meta']
+
+    # Function to save arrays and metadata under a key
+    def save(self, key, arrays, meta=None):
+        path = self._path(key)
+        tmp_path = '{}.tmp-{}'.format(path, os.getpid())
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, values in arrays.items():
+            np.save(os.path.join(tmp_path, name + '.npy'), np.asarray(values))
+        with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+            json.dump({'arrays': sorted(arrays), 'meta': meta or {}}, f)
+        shutil.rmtree(path, ignore_errors=True)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another process stored the same key first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    # Function to load a stage from the store or compute and save it
+    # compute() must return (dict of arrays, JSON-serialisable metadata).
+    def stage(self, stage, inputs, params, compute):
+        start = timer.perf_counter()
+        key = self.key(stage, inputs, params)
+        result = self.load(key)
+        status = 'hit'
+        if result is None:
+            arrays, meta = compute()
+            self.save(key, arrays, meta)
+            result = self.load(key)
+            if result is None:
+                result = arrays, meta
+            status = 'miss'
+        self.log.append({'stage': stage, 'key': key, 'status': status,
+                         'seconds': timer.perf_counter() - start})
+        arrays, meta = result
+        return key, arrays, meta
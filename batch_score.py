@@ -0,0 +1,128 @@
+# Headless batch scoring with the tuned XGBoost model.
+# The input CSV is streamed in fixed-size chunks, encoded with the model's
+# feature schema and scored with one predict_proba call per chunk, so memory
+# stays bounded however large the file is. Chunks can optionally be scored in worker processes.
+# The input can also be a store written by ingest.py, whose chunks are already
+# encoded and only need remapping to the training vocabularies.
+#
+#   python batch_score.py test.csv -o submission.csv --chunksize 100000 --workers 4
+import argparse
+import os
+import sys
+import time as timer
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ingest import IngestedData
+from model_bundle import MODEL_BUNDLE_DIR, load_predictor
+
+# Model and feature schema loaded once per worker process
+_worker_state = {}
+
+
+# Function to score one chunk of encoded features
+def score_features(model, ids, features, with_probability=False, threshold=0.5):
+    probability = model.predict_proba(features)[:, 1]
+    scored = pd.DataFrame({'id': ids, 'stroke': (probability > threshold).astype(np.int8)})
+    if with_probability:
+        scored['probability'] = probability
+    return scored
+
+
+# Function to score one chunk of raw records
+def score_chunk(model, chunk, schema, with_probability=False, threshold=0.5):
+    ids = chunk['id'].to_numpy() if 'id' in chunk.columns else chunk.index.to_numpy()
+    return score_features(model, ids, schema.encode(chunk), with_probability, threshold)
+
+
+def _init_worker(model_path, schema):
+    _worker_state['model'] = load_predictor(model_path)[0]
+    _worker_state['schema'] = schema
+
+
+def _score_in_worker(chunk, with_probability):
+    return score_chunk(_worker_state['model'], chunk, _worker_state['schema'], with_probability)
+
+
+def _score_features_in_worker(ids, features, with_probability):
+    return score_features(_worker_state['model'], ids, features, with_probability)
+
+
+# Function to yield (ids, encoded features) from an ingested store
+def _ingested_chunks(path, schema):
+    offset = 0
+    for ids, features, _ in IngestedData(path).iter_chunks(schema):
+        yield (np.arange(offset, offset + len(features)) if ids is None else np.asarray(ids)), features
+        offset += len(features)
+
+
+# Function to yield scored chunks in input order
+# The schema defaults to the one of the model (its bundle, or the persisted schema for a joblib file).
+def iter_scored_chunks(input_path, model_path=MODEL_BUNDLE_DIR, chunksize=100000, workers=0,
+                       with_probability=False, schema=None):
+    model, model_schema = load_predictor(model_path)
+    if schema is None:
+        schema = model_schema
+    # Ingested stores are encoded up front; CSV chunks are encoded where they are scored
+    if os.path.isdir(input_path):
+        chunks = _ingested_chunks(input_path, schema)
+    else:
+        chunks = pd.read_csv(input_path, chunksize=chunksize)
+
+    if workers <= 0:
+        for chunk in chunks:
+            if isinstance(chunk, pd.DataFrame):
+                yield score_chunk(model, chunk, schema, with_probability)
+            else:
+                yield score_features(model, chunk[0], chunk[1], with_probability)
+        return
+
+    # At most two chunks per worker are in flight, which bounds memory
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_path, schema)) as pool:
+        for chunk in chunks:
+            if isinstance(chunk, pd.DataFrame):
+                pending.append(pool.submit(_score_in_worker, chunk, with_probability))
+            else:
+                pending.append(pool.submit(_score_features_in_worker, chunk[0], chunk[1], with_probability))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# Function to score a CSV file into an output CSV, returning (rows, seconds)
+def score_file(input_path, output_path, model_path=MODEL_BUNDLE_DIR, chunksize=100000, workers=0,
+               with_probability=False):
+    start = timer.perf_counter()
+    rows = 0
+    with open(output_path, 'w', newline='') as out:
+        for i, scored in enumerate(iter_scored_chunks(input_path, model_path, chunksize, workers,
+                                                      with_probability)):
+            scored.to_csv(out, header=(i == 0), index=False)
+            rows += len(scored)
+    return rows, timer.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score patient records with the tuned stroke model.')
+    parser.add_argument('input', nargs='?', default='test.csv', help='CSV with the raw patient columns, or a store written by ingest.py')
+    parser.add_argument('-o', '--output', default='submission.csv', help='where to write id,stroke[,probability]')
+    parser.add_argument('--model', default=MODEL_BUNDLE_DIR, help='model bundle directory or joblib file')
+    parser.add_argument('--chunksize', type=int, default=100000, help='rows per chunk')
+    parser.add_argument('--workers', type=int, default=0, help='worker processes (0 scores in this process)')
+    parser.add_argument('--probability', action='store_true', help='also write the stroke probability')
+    args = parser.parse_args(argv)
+
+    rows, seconds = score_file(args.input, args.output, args.model, args.chunksize, args.workers,
+                               args.probability)
+    print('scored {} rows in {:.2f} s ({:,.0f} rows/sec)'.format(rows, seconds, rows / max(seconds, 1e-9)),
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2 @@
+# Benchmarks for the project's hot paths, run from the repository root:
+#   python -m benchmarks.<name>
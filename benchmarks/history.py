@@ -0,0 +1,79 @@
+# Machine-readable benchmark history.
+# Every run appends one JSON line per (benchmark, rows) result to
+# benchmarks/history.jsonl, tagged with the git commit and a machine
+# fingerprint. A new result is a regression when it is slower than the median
+# of the recent results of the same benchmark, size and machine from other
+# commits by more than the allowed ratio.
+import json
+import os
+import platform
+import subprocess
+import sys
+import time as timer
+
+import numpy as np
+
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.jsonl')
+# Slower than ratio x the reference median (and by at least min_seconds) is a regression
+REGRESSION_RATIO = 1.25
+MIN_REGRESSION_SECONDS = 0.002
+# Earlier results compared against, per benchmark and size
+WINDOW = 5
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git'] + list(args), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Function to describe where a result was measured
+def environment():
+    return {'commit': _git('rev-parse', '--short', 'HEAD'), 'dirty': bool(_git('status', '--porcelain', '-uno')),
+            'machine': '{}/{}/{} cpus'.format(platform.node(), platform.machine(), os.cpu_count()),
+            'python': platform.python_version(), 'numpy': np.__version__, 'time': timer.time()}
+
+
+def load(path=HISTORY_FILE):
+    records = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A line cut short by an interrupted write
+                    continue
+    return records
+
+
+def append(records, path=HISTORY_FILE):
+    with open(path, 'a') as f:
+        for record in records:
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+# Function to compare new results with the history, returning the regressions
+def detect_regressions(records, history, ratio=REGRESSION_RATIO, min_seconds=MIN_REGRESSION_SECONDS,
+                       window=WINDOW):
+    regressions = []
+    for record in records:
+        earlier = [h['seconds'] for h in history
+                   if h['benchmark'] == record['benchmark'] and h['rows'] == record['rows']
+                   and h['machine'] == record['machine'] and h['commit'] != record['commit']][-window:]
+        if not earlier:
+            continue
+        reference = float(np.median(earlier))
+        if record['seconds'] > reference * ratio and record['seconds'] - reference > min_seconds:
+            regressions.append(dict(record, reference_seconds=reference))
+    return regressions
+
+
+# Function to print regressions in a readable form
+def report(regressions, out=sys.stderr):
+    for r in regressions:
+        print('regression: {} at {:,} rows {:.4f} s vs {:.4f} s ({:+.0%})'.format(
+            r['benchmark'], r['rows'], r['seconds'], r['reference_seconds'],
+            r['seconds'] / r['reference_seconds'] - 1), file=out)
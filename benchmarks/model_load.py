@@ -0,0 +1,130 @@
+# Load time and memory of the tuned model: joblib pickle against the model bundle.
+# Each loader runs in a fresh interpreter that has already imported XGBoost,
+# joblib and model_bundle, so only the load is measured: the first (cold) load,
+# the median of the repeated loads and the resident memory the first load
+# added. The registry row is get_bundle after the bundle was loaded once.
+# When the pickle cannot be loaded by the installed XGBoost, the bundle's model
+# is pickled again, so both formats always hold the same booster.
+#
+#   python -m benchmarks.model_load --repeat 20
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time as timer
+
+import joblib
+import numpy as np
+
+import model_bundle
+
+
+# Function to read the resident memory of this process in bytes
+def resident_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # Peak instead of current memory where /proc is missing
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _load_function(loader, path):
+    if loader == 'joblib':
+        return lambda: joblib.load(path)
+    if loader == 'bundle':
+        return lambda: model_bundle.load_bundle(path)
+    return lambda: model_bundle.get_bundle(path)
+
+
+# Function to measure one loader in this process (run by the child interpreter)
+def measure_here(loader, path, repeat):
+    # Imports the loaders would trigger are not part of the load
+    from xgboost import XGBClassifier
+    XGBClassifier()
+    load = _load_function(loader, path)
+    if loader == 'registry':
+        load()
+    before_rss = resident_bytes()
+    start = timer.perf_counter()
+    kept = load()
+    cold = timer.perf_counter() - start
+    rss_added = resident_bytes() - before_rss
+    times = []
+    for _ in range(repeat):
+        start = timer.perf_counter()
+        load()
+        times.append(timer.perf_counter() - start)
+    del kept
+    return {'loader': loader, 'cold_seconds': cold, 'seconds': float(np.median(times)),
+            'rss_added_bytes': rss_added}
+
+
+# Function to measure one loader in a fresh interpreter
+def measure(loader, path, repeat):
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.model_load', '--child', loader, path,
+                             '--repeat', str(repeat)], stdout=subprocess.PIPE, check=True,
+                            universal_newlines=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+# Function to write the files compared: the pickle and the bundle in every booster format
+# Returns ({label: (loader, path)}, note on where the pickle came from).
+def prepare_files(model_path, bundle_path, work_dir):
+    bundle = model_bundle.load_bundle(bundle_path)
+    files = {'bundle.' + bundle.manifest['booster']['format']: ('bundle', bundle_path)}
+    if model_bundle.supports_ubjson() and 'bundle.ubj' not in files:
+        ubj_path = os.path.join(work_dir, 'bundle_ubj')
+        model_bundle.save_bundle(bundle.model, ubj_path, bundle.schema, bundle.metrics,
+                                 bundle.manifest['data'], 'ubj')
+        files['bundle.ubj'] = ('bundle', ubj_path)
+    files['registry'] = ('registry', bundle_path)
+
+    try:
+        joblib.load(model_path)
+        files['joblib'] = ('joblib', model_path)
+        note = 'pickle: {}'.format(model_path)
+    except Exception:
+        pickle_path = os.path.join(work_dir, 'model.pkl')
+        joblib.dump(bundle.model, pickle_path)
+        files['joblib'] = ('joblib', pickle_path)
+        note = 'pickle: bundle model pickled again ({} does not load with this XGBoost)'.format(model_path)
+    return files, note
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare loading the tuned model from joblib and from its bundle.')
+    parser.add_argument('--model', default=model_bundle.MODEL_FILE, help='joblib file of the fitted classifier')
+    parser.add_argument('--bundle', default=model_bundle.MODEL_BUNDLE_DIR, help='model bundle directory')
+    parser.add_argument('--repeat', type=int, default=10, help='timed loads after the cold one')
+    parser.add_argument('--child', nargs=2, metavar=('LOADER', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure_here(args.child[0], args.child[1], args.repeat)))
+        return
+
+    work_dir = tempfile.mkdtemp(prefix='bench-model-load-')
+    try:
+        files, note = prepare_files(args.model, args.bundle, work_dir)
+        print(note, file=sys.stderr)
+        print('{:<12} {:>10} {:>10} {:>12} {:>10}'.format('format', 'cold', 'median', 'rss added', 'file'),
+              file=sys.stderr)
+        for label in sorted(files, key=lambda label: (label == 'registry', label)):
+            loader, path = files[label]
+            result = measure(loader, path, args.repeat)
+            size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) \
+                if os.path.isdir(path) else os.path.getsize(path)
+            print('{:<12} {:>7.2f} ms {:>7.2f} ms {:>9.1f} MB {:>7.0f} kB'.format(
+                label, result['cold_seconds'] * 1000, result['seconds'] * 1000,
+                result['rss_added_bytes'] / 2 ** 20, size / 1024), file=sys.stderr)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
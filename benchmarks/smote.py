@@ -0,0 +1,64 @@
+# SMOTE benchmark: the native oversampler against imblearn on the same data.
+# The data is a synthetic stroke dataset of each size (benchmarks.synthetic),
+# encoded with the feature schema. The native oversampler is timed cold (index
+# built) and warm (index taken from the cache, new seed), and both
+# implementations must produce balanced outputs of the same shape.
+#
+#   python -m benchmarks.smote --sizes 5000 500000 5000000
+import argparse
+import sys
+import time as timer
+
+import numpy as np
+from imblearn.over_sampling import SMOTE
+
+import oversampling
+from benchmarks import synthetic
+from features import TARGET, load_schema
+
+
+# Function to build an encoded benchmark matrix of n synthetic patients
+def make_data(n_rows, seed=0):
+    df = synthetic.generate(n_rows, seed)
+    return load_schema().encode(df).to_numpy(), df[TARGET].to_numpy()
+
+
+def _timed(function):
+    start = timer.perf_counter()
+    result = function()
+    return result, timer.perf_counter() - start
+
+
+# Function to time both oversamplers on one size, returning a result row
+def run(n_rows, seed=42):
+    X, y = make_data(n_rows)
+    oversampling._index_cache.clear()
+    (X_imb, y_imb), imb_seconds = _timed(
+        lambda: SMOTE(sampling_strategy='minority', random_state=seed).fit_resample(X, y))
+    (X_cold, y_cold), cold_seconds = _timed(lambda: oversampling.fit_resample(X, y, seed=seed))
+    (X_warm, _), warm_seconds = _timed(lambda: oversampling.fit_resample(X, y, seed=seed + 1))
+    if X_cold.shape != X_imb.shape or not np.array_equal(np.bincount(y_cold), np.bincount(y_imb)):
+        raise AssertionError('native output {} differs from imblearn {}'.format(X_cold.shape, X_imb.shape))
+    repeat, _ = _timed(lambda: oversampling.fit_resample(X, y, seed=seed))
+    if not np.array_equal(repeat[0], X_cold):
+        raise AssertionError('native output is not reproducible for a fixed seed')
+    return {'rows': n_rows, 'synthetic': len(X_cold) - n_rows, 'imblearn_seconds': imb_seconds,
+            'native_cold_seconds': cold_seconds, 'native_warm_seconds': warm_seconds}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the native SMOTE oversampler against imblearn.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5000, 500000, 5000000])
+    args = parser.parse_args(argv)
+
+    print('{:>9} {:>10} {:>10} {:>11} {:>11} {:>8}'.format(
+        'rows', 'synthetic', 'imblearn', 'native', 'cached', 'speedup'), file=sys.stderr)
+    for n_rows in args.sizes:
+        row = run(n_rows)
+        print('{rows:>9,} {synthetic:>10,} {imblearn_seconds:>9.2f}s {native_cold_seconds:>10.2f}s '
+              '{native_warm_seconds:>10.2f}s {speedup:>7.1f}x'.format(
+                  speedup=row['imblearn_seconds'] / row['native_cold_seconds'], **row), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# Cold-start import profile of the Streamlit app.
+# The module-level imports of stroke.py are read from its source and imported
+# in a fresh interpreter under `python -X importtime`, after streamlit itself
+# (which the server has already loaded when the script starts). Modules loaded
+# through lazy_import() are not counted. The median over several runs is
+# compared with the budget and with the profile checked in as
+# startup_baseline.json, so a new eager import shows up as a regression.
+#
+#   python -m benchmarks.startup            # profile, exit 1 when over budget
+#   python -m benchmarks.startup --update   # rewrite the checked-in baseline
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_baseline.json')
+APP_FILE = os.path.join(ROOT, 'stroke.py')
+PRELOADED = ('streamlit',)
+# Import time allowed for the script's own eager imports
+BUDGET_SECONDS = 1.0
+# A module is reported when it got this much slower than its baseline
+REGRESSION_SECONDS = 0.05
+MARKER = '-- script imports --'
+
+
+# Function to list the modules a script imports at module level
+def eager_imports(path=APP_FILE):
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            names = [node.module]
+        else:
+            continue
+        modules.extend(name for name in names if name not in modules)
+    return modules
+
+
+# Function to parse `-X importtime` output after the marker into {top-level module: seconds}
+def parse_importtime(stderr):
+    lines = stderr.split(MARKER, 1)[-1].splitlines()
+    modules = {}
+    for line in lines:
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented below the module that triggered them
+        if name[1:].startswith(' '):
+            continue
+        modules[name.strip()] = int(cumulative) / 1e6
+    return modules
+
+
+# Function to import the modules in a fresh interpreter and return their import times
+def profile_once(modules, preloaded=PRELOADED):
+    code = ''.join('import {}\n'.format(name) for name in preloaded)
+    code += 'import os, sys\nsys.stderr.flush()\nos.write(2, {!r})\n'.format((MARKER + '\n').encode())
+    code += ''.join('import {}\n'.format(name) for name in modules)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return parse_importtime(result.stderr)
+
+
+# Function to profile several cold starts, returning the median seconds per module and in total
+def profile(modules, repeat=5):
+    runs = [profile_once(modules) for _ in range(repeat)]
+    names = sorted(set().union(*runs))
+    per_module = {name: float(np.median([run.get(name, 0.0) for run in runs])) for name in names}
+    total = float(np.median([sum(run.values()) for run in runs]))
+    return total, per_module
+
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Profile the cold-start imports of stroke.py.')
+    parser.add_argument('--app', default=APP_FILE, help='script whose imports are profiled')
+    parser.add_argument('--repeat', type=int, default=5, help='cold starts to take the median over')
+    parser.add_argument('--budget', type=float, default=BUDGET_SECONDS, help='allowed seconds for eager imports')
+    parser.add_argument('--top', type=int, default=15, help='modules to list')
+    parser.add_argument('--update', action='store_true', help='write the profile as the new baseline')
+    args = parser.parse_args(argv)
+
+    modules = eager_imports(args.app)
+    total, per_module = profile(modules, args.repeat)
+    baseline = load_baseline()
+    previous = baseline['modules'] if baseline else {}
+
+    print('{:<40} {:>9} {:>9}'.format('module', 'seconds', 'baseline'), file=sys.stderr)
+    for name, seconds in sorted(per_module.items(), key=lambda item: -item[1])[:args.top]:
+        print('{:<40} {:>9.3f} {:>9}'.format(name, seconds, '{:.3f}'.format(previous[name]) if name in previous
+                                             else 'new'), file=sys.stderr)
+    print('eager imports: {:.3f} s (budget {:.3f} s{})'.format(
+        total, args.budget, ', baseline {:.3f} s'.format(baseline['total_seconds']) if baseline else ''),
+        file=sys.stderr)
+
+    regressions = [name for name, seconds in per_module.items()
+                   if seconds - previous.get(name, 0.0) > REGRESSION_SECONDS] if baseline else []
+    for name in regressions:
+        print('regression: {} {:.3f} s (baseline {:.3f} s)'.format(
+            name, per_module[name], previous.get(name, 0.0)), file=sys.stderr)
+
+    if args.update:
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'preloaded': list(PRELOADED), 'total_seconds': total,
+                       'modules': per_module}, f, indent=1, sort_keys=True)
+        print('wrote {}'.format(BASELINE_FILE), file=sys.stderr)
+    if total > args.budget or regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# Benchmark suite for the app's hot paths on synthetic data from 5k to 5M patients.
+# Each benchmark calls the same functions the app runs for that step:
+#   data_load         dataset.load from the columnar cache (load_dataset_views)
+#   cohort_index      CohortIndex build (get_cohort_index)
+#   filter            CohortIndex.filter (filter_data)
+#   correlation_build PartitionedMoments.from_frame (get_moment_stats)
+#   correlation       cohort merge and range mask (create_correlation_matrix)
+#   preprocess        prepare_model_data with an empty artifact store (tab4)
+#   predict_proba     tuned XGBoost model on every row
+#   score_metrics     score_predictions (threshold sweep, curves and point metrics)
+#   metrics_plots     calculate_metrics_and_plots
+#   figure.*          the uncached figure builders (create_bar_plot, create_violin_plot,
+#                     the histogram and create_scatterplot_with_correlation)
+# The median of each benchmark goes to the JSONL history (benchmarks/history.py)
+# and the run exits non-zero when a benchmark regressed against earlier commits.
+#
+#   python -m benchmarks.suite --scales 5000 50000
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time as timer
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import dataset
+import model_bundle
+from aggregates import SortedGroups, bar_figure, grouped_counts, histogram_figure, violin_figure
+from artifacts import ArtifactStore
+from benchmarks import history, synthetic
+from cohort import CohortIndex
+from corr_stats import PartitionedMoments
+from downsample import group_line_stats, reduce_points, scatter_figure
+from evaluation import TUNED_XGB_PARAMS, calculate_metrics_and_plots, score_predictions
+from features import TARGET, load_schema
+from preprocessing import prepare_model_data
+
+SCALES = (5000, 50000, 500000, 5000000)
+DATASET_CACHE = os.path.join('.cache', 'benchmarks', 'dataset')
+MODEL_FILE = 'XGBoostTunedModel.pkl'
+# Sidebar selections of the Visualizations section
+SELECTIONS = {'work_type': 'Private', 'smoking_status': 'never smoked', 'gender': 'Female'}
+AGE_RANGE = (20, 80)
+# Stop repeating a benchmark once it has used this many seconds
+TIME_BUDGET = 10.0
+
+
+# Function to time a function: one warm-up call when it is quick, then up to repeat calls
+def measure(function, repeat=5, budget=TIME_BUDGET):
+    start = timer.perf_counter()
+    function()
+    first = timer.perf_counter() - start
+    times = [] if first < 1.0 else [first]
+    while len(times) < repeat and sum(times) + first < budget:
+        start = timer.perf_counter()
+        function()
+        times.append(timer.perf_counter() - start)
+    return times or [first]
+
+
+# Function to load the tuned model from its bundle or the pickle, refitting it with the tuned
+# parameters when neither loads with the installed XGBoost; returns (model, 'bundle', 'file' or 'refit')
+def load_tuned_model(path=MODEL_FILE, bundle_path=model_bundle.MODEL_BUNDLE_DIR):
+    if model_bundle.is_bundle(bundle_path):
+        return model_bundle.get_bundle(bundle_path).model, 'bundle'
+    try:
+        return joblib.load(path), 'file'
+    except Exception:
+        from xgboost import XGBClassifier
+        real = dataset.load().imputed
+        model = XGBClassifier(**TUNED_XGB_PARAMS)
+        model.fit(load_schema().encode(real).to_numpy(), real[TARGET].to_numpy())
+        return model, 'refit'
+
+
+# Function to build the benchmarks of one dataset as name -> zero-argument function
+def make_benchmarks(csv_path, model, schema):
+    data = dataset.load(csv_path, DATASET_CACHE)
+    df = data.imputed
+    numerical = df.select_dtypes(include=[np.floating]).columns
+    index = CohortIndex(df)
+    moments = PartitionedMoments.from_frame(df, numerical, ['stroke', 'gender'])
+    X = schema.encode(df).to_numpy()
+    y = df[TARGET].to_numpy()
+    y_score = model.predict_proba(X)[:, 1]
+    result = score_predictions(y, y_score)
+
+    def correlation():
+        corr = moments.correlation({'stroke': 1})
+        return corr[(corr >= -1.0) & (corr <= 1.0)]
+
+    def preprocess():
+        root = tempfile.mkdtemp(prefix='bench-artifacts-')
+        try:
+            return prepare_model_data(df, ArtifactStore(root), schema=schema)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    def scatter():
+        rows = reduce_points(df[['age', 'avg_glucose_level']].to_numpy(), y == 1)
+        line_stats = group_line_stats(df['age'], df['avg_glucose_level'], df['gender'])
+        shown = df.iloc[rows]
+        return scatter_figure(shown['age'], shown['avg_glucose_level'], shown['gender'], line_stats,
+                              'age', 'avg_glucose_level', 'gender')
+
+    return {
+        'data_load': lambda: dataset.load(csv_path, DATASET_CACHE),
+        'cohort_index': lambda: CohortIndex(df),
+        'filter': lambda: index.filter(df, SELECTIONS, AGE_RANGE),
+        'correlation_build': lambda: PartitionedMoments.from_frame(df, numerical, ['stroke', 'gender']),
+        'correlation': correlation,
+        'preprocess': preprocess,
+        'predict_proba': lambda: model.predict_proba(X),
+        'score_metrics': lambda: score_predictions(y, y_score),
+        'metrics_plots': lambda: calculate_metrics_and_plots(result),
+        'figure.bar': lambda: bar_figure(*grouped_counts(df['stroke'], df['work_type']),
+                                         x_title='stroke', legend_title='work_type'),
+        'figure.violin': lambda: violin_figure(SortedGroups(df['age'], df['stroke']), 'age', x_title='stroke'),
+        'figure.histogram': lambda: histogram_figure(SortedGroups(df['bmi'], df['gender']), 20, 'bmi', 'gender'),
+        'figure.scatter': scatter,
+    }
+
+
+# Function to run every benchmark at every scale, returning one record per (benchmark, rows)
+def run(scales=SCALES, repeat=5, only=None, seed=0, out=sys.stderr):
+    model, model_source = load_tuned_model()
+    schema = load_schema()
+    env = history.environment()
+    records = []
+    for rows in scales:
+        csv_path = synthetic.write(rows, seed)
+        for name, function in make_benchmarks(csv_path, model, schema).items():
+            if only and name not in only:
+                continue
+            times = measure(function, repeat)
+            record = dict(env, benchmark=name, rows=rows, seconds=float(np.median(times)),
+                          min_seconds=float(np.min(times)), repeats=len(times), model=model_source)
+            records.append(record)
+            print('{:>9,} {:<18} {:>10.2f} ms {:>10.2f} ms {:>3}x'.format(
+                rows, name, record['seconds'] * 1000, record['min_seconds'] * 1000, len(times)), file=out)
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the app hot paths on synthetic data.')
+    parser.add_argument('--scales', type=int, nargs='+', default=list(SCALES), help='dataset sizes in rows')
+    parser.add_argument('--repeat', type=int, default=5, help='timed calls per benchmark')
+    parser.add_argument('--only', nargs='+', default=None, help='run only these benchmarks')
+    parser.add_argument('--history', default=history.HISTORY_FILE, help='JSONL history file')
+    parser.add_argument('--no-record', action='store_true', help='compare without appending to the history')
+    args = parser.parse_args(argv)
+
+    print('{:>9} {:<18} {:>13} {:>13} {:>4}'.format('rows', 'benchmark', 'median', 'min', 'runs'), file=sys.stderr)
+    records = run(args.scales, args.repeat, args.only)
+    regressions = history.detect_regressions(records, history.load(args.history))
+    history.report(regressions)
+    if not args.no_record:
+        history.append(records, args.history)
+        print('appended {} results to {}'.format(len(records), args.history), file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# Synthetic patients with the schema of healthcare-dataset-stroke-data.csv.
+# Rows are drawn with replacement from the real dataset separately for the
+# stroke and no-stroke classes, so the class imbalance is kept exactly and the
+# joint distribution of the other columns approximately. The measurements get
+# a little noise (clipped to the observed ranges) and missing bmi values stay
+# missing. The same (rows, seed) always gives the same data.
+#
+#   python -m benchmarks.synthetic 500000 -o big.csv
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from data_cache import DATA_FILE
+
+SYNTHETIC_DIR = os.path.join('.cache', 'benchmarks', 'synthetic')
+# Noise standard deviation and rounding per measurement column
+NOISE = {'age': (1.0, 2), 'avg_glucose_level': (2.0, 2), 'bmi': (0.5, 1)}
+
+
+# Function to generate n synthetic patients in the column order of the source file
+def generate(n_rows, seed=0, source=DATA_FILE):
+    real = pd.read_csv(source)
+    rng = np.random.default_rng(seed)
+    stroke = real['stroke'].to_numpy() == 1
+    n_stroke = int(round(n_rows * stroke.mean()))
+    rows = np.concatenate([rng.choice(np.flatnonzero(stroke), n_stroke),
+                           rng.choice(np.flatnonzero(~stroke), n_rows - n_stroke)])
+    rows = rows[rng.permutation(n_rows)]
+
+    df = real.iloc[rows].reset_index(drop=True)
+    df['id'] = np.arange(1, n_rows + 1)
+    for name, (scale, decimals) in NOISE.items():
+        values = df[name].to_numpy()
+        noisy = values + rng.normal(scale=scale, size=n_rows)
+        df[name] = np.round(np.clip(noisy, real[name].min(), real[name].max()), decimals)
+    return df
+
+
+# Function to write (or reuse) the CSV of a synthetic dataset and return its path
+def write(n_rows, seed=0, out_dir=SYNTHETIC_DIR, source=DATA_FILE):
+    path = os.path.join(out_dir, 'stroke_{}_{}.csv'.format(n_rows, seed))
+    if not os.path.exists(path):
+        os.makedirs(out_dir, exist_ok=True)
+        tmp_path = path + '.tmp'
+        generate(n_rows, seed, source).to_csv(tmp_path, index=False, na_rep='N/A')
+        os.replace(tmp_path, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a synthetic stroke dataset as CSV.')
+    parser.add_argument('rows', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default=None, help='CSV to write (default: the benchmark cache)')
+    args = parser.parse_args(argv)
+
+    if args.output:
+        generate(args.rows, args.seed).to_csv(args.output, index=False, na_rep='N/A')
+        path = args.output
+    else:
+        path = write(args.rows, args.seed)
+    print('wrote {} rows to {}'.format(args.rows, path), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
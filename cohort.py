@@ -0,0 +1,76 @@
+# Indexed cohort filtering for the sidebar filters.
+# Rows are ordered by age once, so an age range becomes a contiguous slice of
+# positions found by binary search. Every categorical value gets a packed
+# bitmap in that same order, so a filter is a few byte-wise ANDs over the
+# slice instead of a scan of every row.
+import numpy as np
+import pandas as pd
+
+FILTER_COLUMNS = ['work_type', 'smoking_status', 'gender']
+RANGE_COLUMN = 'age'
+
+# Number of set bits for every byte value
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+
+class CohortIndex:
+    def __init__(self, df, columns=FILTER_COLUMNS, range_column=RANGE_COLUMN):
+        values = df[range_column].to_numpy(dtype=np.float64)
+        self.n_rows = len(values)
+        self.order = np.argsort(values, kind='stable')
+        self.sorted_values = values[self.order]
+        self.bitmaps = {}
+        for name in columns:
+            codes, categories = pd.factorize(df[name])
+            codes = codes[self.order]
+            self.bitmaps[name] = {category: np.packbits(codes == i) for i, category in enumerate(categories)}
+
+    # Function to find the [start, stop) slice of age-ordered rows inside a closed range
+    def _slice(self, value_range):
+        start = int(np.searchsorted(self.sorted_values, value_range[0], side='left'))
+        stop = int(np.searchsorted(self.sorted_values, value_range[1], side='right'))
+        return start, max(start, stop)
+
+    # Function to AND the selected bitmaps over the bytes covering the slice
+    def _bits(self, selections, start, stop):
+        first, last = start // 8, (stop + 7) // 8
+        bits = np.full(last - first, 0xFF, dtype=np.uint8)
+        for name, value in selections.items():
+            bitmap = self.bitmaps[name].get(value)
+            if bitmap is None:
+                return None
+            np.bitwise_and(bits, bitmap[first:last], out=bits)
+        return bits
+
+    # Function to count a cohort without building it
+    def count(self, selections, value_range):
+        start, stop = self._slice(value_range)
+        if start == stop:
+            return 0
+        bits = self._bits(selections, start, stop)
+        if bits is None:
+            return 0
+        total = int(_POPCOUNT[bits].sum())
+        # Drop the bits of the edge bytes that fall outside the slice
+        head = start % 8
+        if head:
+            total -= int(np.unpackbits(bits[:1])[:head].sum())
+        tail = (stop + 7) // 8 * 8 - stop
+        if tail:
+            total -= int(np.unpackbits(bits[-1:])[8 - tail:].sum())
+        return total
+
+    # Function to return the matching row positions in their original order
+    def positions(self, selections, value_range):
+        start, stop = self._slice(value_range)
+        if start == stop:
+            return np.empty(0, dtype=np.int64)
+        bits = self._bits(selections, start, stop)
+        if bits is None:
+            return np.empty(0, dtype=np.int64)
+        offset = start - start // 8 * 8
+        mask = np.unpackbits(bits)[offset:offset + stop - start].astype(bool)
+        return np.sort(self.order[start:stop][mask])
+
+    def filter(self, df, selections, value_range):
+        return df.iloc[self.positions(selections, value_range)]
@@ -0,0 +1,110 @@
+# Streaming correlation statistics for the numerical columns.
+# Missing values are handled pairwise, as pandas' corr does: every pair of
+# columns keeps the count of rows where both are present, the means of both
+# columns over those rows, their co-moment and the two sums of squares. New
+# rows are merged with Chan's parallel update (Welford generalised to
+# batches), so appending rows costs O(new rows) and statistics of separate
+# partitions can be combined into any cohort without touching the rows again.
+import numpy as np
+import pandas as pd
+
+
+class MomentStats:
+    # For columns i and j, n[i, j] counts the rows where both are present, mean[i, j] is
+    # the mean of column i over those rows, comoment[i, j] the sum of products of the
+    # deviations of i and j, and square[i, j] the sum of squared deviations of column i.
+    def __init__(self, columns, n=None, mean=None, comoment=None, square=None):
+        self.columns = list(columns)
+        k = len(self.columns)
+        self.n = np.zeros((k, k)) if n is None else n
+        self.mean = np.zeros((k, k)) if mean is None else mean
+        self.comoment = np.zeros((k, k)) if comoment is None else comoment
+        self.square = np.zeros((k, k)) if square is None else square
+
+    # Function to compute the pairwise statistics of a batch of rows (missing values are NaN)
+    @classmethod
+    def from_rows(cls, columns, X):
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(columns))
+        present = np.isfinite(X)
+        # Sums are taken around each column's mean, which keeps them small; shifts cancel out below
+        shift = np.where(present, X, 0.0).sum(axis=0) / np.maximum(present.sum(axis=0), 1)
+        Z = np.where(present, X - shift, 0.0)
+        M = present.astype(np.float64)
+        n = M.T @ M
+        total = Z.T @ M
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(n > 0, total / n, 0.0)
+        comoment = Z.T @ Z - mean * total.T
+        square = (Z * Z).T @ M - mean * total
+        return cls(columns, n, mean + shift[:, None], comoment, square)
+
+    # Function to fold a batch of rows into the statistics
+    def update(self, X):
+        merged = self.merge(MomentStats.from_rows(self.columns, X))
+        self.n, self.mean, self.comoment, self.square = merged.n, merged.mean, merged.comoment, merged.square
+        return self
+
+    # Function to combine two sets of statistics, pair by pair (Chan et al.)
+    def merge(self, other):
+        n = self.n + other.n
+        share = other.n / np.maximum(n, 1)
+        delta = other.mean - self.mean
+        mean = self.mean + delta * share
+        weight = self.n * share
+        comoment = self.comoment + other.comoment + delta * delta.T * weight
+        square = self.square + other.square + delta * delta * weight
+        return MomentStats(self.columns, n, mean, comoment, square)
+
+    def covariance(self, ddof=1):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = np.where(self.n > ddof, self.comoment / (self.n - ddof), np.nan)
+        return pd.DataFrame(cov, index=self.columns, columns=self.columns)
+
+    def correlation(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = self.comoment / np.sqrt(self.square * self.square.T)
+        corr = np.where(self.n > 1, np.clip(corr, -1.0, 1.0), np.nan)
+        diagonal = np.diag(self.square) > 0
+        np.fill_diagonal(corr, np.where(diagonal, 1.0, np.nan))
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+
+class PartitionedMoments:
+    # Statistics kept separately for every combination of the partition columns
+    def __init__(self, columns, partition_columns):
+        self.columns = list(columns)
+        self.partition_columns = list(partition_columns)
+        self.partitions = {}
+
+    @classmethod
+    def from_frame(cls, df, columns, partition_columns):
+        return cls(columns, partition_columns).append(df)
+
+    # Function to add new rows; only the partitions they fall into are updated
+    def append(self, df):
+        if len(df) == 0:
+            return self
+        if not self.partition_columns:
+            self.partitions.setdefault((), MomentStats(self.columns)).update(df[self.columns].to_numpy())
+            return self
+        for key, rows in df.groupby(self.partition_columns, sort=False, observed=True):
+            key = key if isinstance(key, tuple) else (key,)
+            self.partitions.setdefault(key, MomentStats(self.columns)).update(rows[self.columns].to_numpy())
+        return self
+
+    # Function to merge the partitions matching the selections (column -> value or list of values)
+    def cohort(self, selections=None):
+        selections = selections or {}
+        wanted = []
+        for name in self.partition_columns:
+            value = selections.get(name)
+            wanted.append(None if value is None else set(value if isinstance(value, (list, tuple, set)) else [value]))
+        total = MomentStats(self.columns)
+        for key, stats in self.partitions.items():
+            if all(w is None or k in w for k, w in zip(key, wanted)):
+                total = total.merge(stats)
+        return total
+
+    def correlation(self, selections=None):
+        return self.cohort(selections).correlation()
+
@@ -0,0 +1,92 @@
+# Leak-free cross-validation for the registered models.
+# The encoded (not resampled) arrays are put in shared memory once. Each fold
+# runs in a worker process: SMOTE and the scaler are fitted on the training
+# rows of that fold only, and the held-out rows are scored as they are, so no
+# synthetic or rescaled information reaches the evaluation rows.
+# 'honest' mode is stratified k-fold; 'fast' mode is one stratified holdout
+# split with the same in-fold resampling.
+import os
+import time as timer
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import StratifiedKFold, StratifiedShuffleSplit
+from sklearn.preprocessing import StandardScaler
+
+from evaluation import MODEL_REGISTRY, evaluate_model
+from leaderboard import METRIC_COLUMNS
+from preprocessing import resample
+from shared_arrays import SharedArrays, attach_arrays
+
+CV_MODES = ('honest', 'fast')
+
+
+# Function to return the (train, test) row indices of one fold
+def fold_indices(y, fold, n_splits=5, mode='honest', test_size=0.22, random_state=42):
+    if mode == 'fast':
+        splitter = StratifiedShuffleSplit(n_splits=1, test_size=test_size, random_state=random_state)
+    else:
+        splitter = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    for i, (train_rows, test_rows) in enumerate(splitter.split(np.zeros(len(y)), y)):
+        if i == fold:
+            return train_rows, test_rows
+    raise IndexError('fold {} out of range'.format(fold))
+
+
+# Function run in a worker: resample, scale, fit and score one model on one fold
+def _fold_worker(name, fold, specs, n_splits, mode, sampling_strategy, random_state, threads):
+    data = attach_arrays(specs)
+    X, y = data['X'], data['y']
+    train_rows, test_rows = fold_indices(y, fold, n_splits, mode, random_state=random_state)
+
+    start = timer.perf_counter()
+    resampled, _ = resample(X[train_rows], y[train_rows], sampling_strategy, random_state)
+    train_X, train_y = resampled['X'], resampled['y']
+    test_X, test_y = X[test_rows], y[test_rows]
+    spec = MODEL_REGISTRY[name]
+    if spec.scaled:
+        scaler = StandardScaler().fit(train_X)
+        train_X, test_X = scaler.transform(train_X), scaler.transform(test_X)
+    prepare_seconds = timer.perf_counter() - start
+
+    model = spec.factory()
+    if 'n_jobs' in model.get_params():
+        model.set_params(n_jobs=threads)
+    result = evaluate_model(model, train_X, train_y, test_X, test_y)
+    row = {'model': name, 'fold': fold, 'train_rows': len(train_y), 'test_rows': len(test_y),
+           'prepare_seconds': prepare_seconds, 'train_seconds': result['fit_seconds'],
+           'inference_seconds': result['predict_seconds']}
+    for column in METRIC_COLUMNS:
+        row[column] = float(result[column])
+    return row
+
+
+# Function to cross-validate models in parallel, yielding one row per finished (model, fold)
+def run_cross_validation(X, y, names=None, n_splits=5, mode='honest', sampling_strategy='minority',
+                         random_state=42, max_workers=None, mp_context=None):
+    if mode not in CV_MODES:
+        raise ValueError('mode must be one of {}'.format(CV_MODES))
+    names = list(names or MODEL_REGISTRY)
+    folds = range(1 if mode == 'fast' else n_splits)
+    tasks = [(name, fold) for name in names for fold in folds]
+    if max_workers is None:
+        max_workers = min(len(tasks), os.cpu_count() or 1)
+    threads = max(1, (os.cpu_count() or 1) // max_workers)
+
+    with SharedArrays({'X': np.asarray(X), 'y': np.asarray(y)}) as shared:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as pool:
+            futures = [pool.submit(_fold_worker, name, fold, shared.specs, n_splits, mode, sampling_strategy,
+                                   random_state, threads) for name, fold in tasks]
+            for future in as_completed(futures):
+                yield future.result()
+
+
+# Function to average the fold rows of each model (mean and standard deviation)
+def summarize(rows):
+    frame = pd.DataFrame(rows)
+    columns = METRIC_COLUMNS + ['prepare_seconds', 'train_seconds', 'inference_seconds']
+    summary = frame.groupby('model', sort=False)[columns].agg(['mean', 'std'])
+    summary.columns = ['{} {}'.format(column, stat) for column, stat in summary.columns]
+    summary.insert(0, 'folds', frame.groupby('model', sort=False).size())
+    return summary.sort_values('roc_auc mean', ascending=False)
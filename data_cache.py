@@ -0,0 +1,189 @@
+# Columnar cache for the stroke dataset.
+# The CSV is parsed once and every column is saved as a .npy file next to a
+# manifest holding the checksum of the source file. Later loads memory-map the
+# saved arrays instead of parsing the CSV again.
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time as timer
+
+import numpy as np
+import pandas as pd
+
+DATA_FILE = 'healthcare-dataset-stroke-data.csv'
+CACHE_DIR = os.path.join('.cache', 'dataset')
+MANIFEST_FILE = 'manifest.json'
+CACHE_FORMAT = 1
+
+# Details of the most recent load ('cold' when the cache had to be built)
+last_load = {}
+
+
+# Function to compute the sha256 checksum of a file
+def file_checksum(path, block_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _cache_path(csv_path, cache_dir):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir, name)
+
+
+# Smallest signed integer type able to hold the category codes
+def _code_dtype(n_categories):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format') != CACHE_FORMAT:
+        return None
+    return manifest
+
+
+def _write_manifest(path, manifest):
+    with open(os.path.join(path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+
+# Function to return the manifest if the cache still matches the source file
+def fresh_manifest(csv_path=DATA_FILE, cache_dir=CACHE_DIR):
+    path = _cache_path(csv_path, cache_dir)
+    manifest = _read_manifest(path)
+    if manifest is None:
+        return None
+    stat = os.stat(csv_path)
+    if stat.st_size != manifest['size']:
+        return None
+    if stat.st_mtime_ns == manifest['mtime_ns']:
+        return manifest
+    # Touched but maybe not changed (e.g. a fresh checkout): compare contents
+    if file_checksum(csv_path) != manifest['checksum']:
+        return None
+    manifest['mtime_ns'] = stat.st_mtime_ns
+    try:
+        _write_manifest(path, manifest)
+    except OSError:
+        pass
+    return manifest
+
+
+# Function to parse the CSV and write one .npy file per column
+# Text columns are stored as integer codes into their sorted categories.
+def build_cache(csv_path=DATA_FILE, cache_dir=CACHE_DIR):
+    path = _cache_path(csv_path, cache_dir)
+    stat = os.stat(csv_path)
+    checksum = file_checksum(csv_path)
+    df = pd.read_csv(csv_path)
+
+    tmp_path = '{}.tmp-{}'.format(path, os.getpid())
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        column = df[name]
+        file_name = '{:03d}.npy'.format(i)
+        if pd.api.types.is_numeric_dtype(column):
+            np.save(os.path.join(tmp_path, file_name), column.to_numpy())
+            columns.append({'name': name, 'file': file_name, 'kind': 'numeric'})
+        else:
+            codes, categories = pd.factorize(column, sort=True)
+            codes = codes.astype(_code_dtype(len(categories)))
+            np.save(os.path.join(tmp_path, file_name), codes)
+            columns.append({'name': name, 'file': file_name, 'kind': 'categorical',
+                            'categories': [str(c) for c in categories]})
+
+    manifest = {
+        'format': CACHE_FORMAT,
+        'checksum': checksum,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'rows': len(df),
+        'columns': columns,
+    }
+    _write_manifest(tmp_path, manifest)
+
+    # Swap the finished directory in; another process may have won the race
+    shutil.rmtree(path, ignore_errors=True)
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return manifest
+
+
+# Function to open the cached columns as read-only memory maps
+# Returns the manifest and a dict of column name -> array (codes for text columns).
+def load_columns(csv_path=DATA_FILE, cache_dir=CACHE_DIR):
+    start = timer.perf_counter()
+    manifest = fresh_manifest(csv_path, cache_dir)
+    mode = 'warm'
+    if manifest is None:
+        manifest = build_cache(csv_path, cache_dir)
+        mode = 'cold'
+
+    path = _cache_path(csv_path, cache_dir)
+    columns = {}
+    for column in manifest['columns']:
+        columns[column['name']] = np.load(os.path.join(path, column['file']), mmap_mode='r')
+
+    last_load.clear()
+    last_load.update({'mode': mode, 'seconds': timer.perf_counter() - start,
+                      'rows': manifest['rows'], 'checksum': manifest['checksum']})
+    return manifest, columns
+
+
+# Function to load the dataset as a DataFrame with the same dtypes as pd.read_csv
+def load_dataset(csv_path=DATA_FILE, cache_dir=CACHE_DIR):
+    start = timer.perf_counter()
+    manifest, columns = load_columns(csv_path, cache_dir)
+    data = {}
+    for column in manifest['columns']:
+        values = columns[column['name']]
+        if column['kind'] == 'categorical':
+            # Code -1 marks a missing value and picks the trailing NaN
+            lookup = np.array(column['categories'] + [np.nan], dtype=object)
+            values = lookup[values]
+        data[column['name']] = values
+    df = pd.DataFrame(data)
+    last_load['seconds'] = timer.perf_counter() - start
+    return df
+
+
+# Function to time a cold load (cache rebuilt) and a warm load (memory-mapped)
+def benchmark(csv_path=DATA_FILE, cache_dir=CACHE_DIR, repeats=5):
+    shutil.rmtree(_cache_path(csv_path, cache_dir), ignore_errors=True)
+    load_dataset(csv_path, cache_dir)
+    cold = last_load['seconds']
+    warm = []
+    for _ in range(repeats):
+        load_dataset(csv_path, cache_dir)
+        warm.append(last_load['seconds'])
+    start = timer.perf_counter()
+    pd.read_csv(csv_path)
+    csv = timer.perf_counter() - start
+    return {'rows': last_load['rows'], 'cold_seconds': cold,
+            'warm_seconds': min(warm), 'read_csv_seconds': csv}
+
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else DATA_FILE
+    result = benchmark(source)
+    print('rows:            {}'.format(result['rows']))
+    print('cold load:       {:.2f} ms'.format(result['cold_seconds'] * 1000))
+    print('warm load:       {:.2f} ms'.format(result['warm_seconds'] * 1000))
+    print('pandas read_csv: {:.2f} ms'.format(result['read_csv_seconds'] * 1000))
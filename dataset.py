@@ -0,0 +1,171 @@
+# Typed, read-only views of the stroke dataset.
+# Columns come from the columnar cache (data_cache) and are narrowed once:
+# text columns become categoricals over the cached codes, 0/1 flags int8 and
+# measurements float32. Three views are built over the same column arrays:
+#   raw      - the dataset as loaded (without the id column)
+#   imputed  - raw with missing bmi values set to the median
+#   encoded  - imputed with category codes instead of labels (model input)
+# Views are versioned by the checksum of the source file, so caches can key on
+# dataset.key(view) instead of hashing frames.
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_cache
+from tracing import span, traced
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+VIEWS = ('raw', 'imputed', 'encoded')
+DROP_COLUMNS = ['id']
+IMPUTE_COLUMN = 'bmi'
+
+
+# Function to make an array read-only so shared views cannot be written through
+def _frozen(values):
+    values = np.asarray(values)
+    if values.flags.writeable:
+        values = values.view()
+        values.flags.writeable = False
+    return values
+
+
+# Function to pick the narrowest dtype for a numeric cached column
+def _narrow(values):
+    if np.issubdtype(values.dtype, np.floating):
+        return values.astype(np.float32)
+    low, high = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return values.astype(dtype)
+    return np.asarray(values)
+
+
+def _frame(columns, index):
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+class Dataset:
+    def __init__(self, manifest, columns, drop=DROP_COLUMNS):
+        self.version = manifest['checksum']
+        self.load_info = dict(data_cache.last_load)
+        self.classes = {}
+        raw, codes = {}, {}
+        for column in manifest['columns']:
+            name = column['name']
+            if name in drop:
+                continue
+            if column['kind'] == 'categorical':
+                self.classes[name] = column['categories']
+                raw[name] = pd.Categorical.from_codes(columns[name], categories=column['categories'])
+                codes[name] = _frozen(raw[name].codes)
+            else:
+                raw[name] = _frozen(_narrow(columns[name]))
+        index = pd.RangeIndex(manifest['rows'])
+
+        # Only the imputed column gets a new buffer; everything else is shared
+        imputed = dict(raw)
+        with span('impute'):
+            values = raw[IMPUTE_COLUMN]
+            imputed[IMPUTE_COLUMN] = _frozen(np.where(np.isnan(values), np.nanmedian(values),
+                                                      values).astype(values.dtype))
+        encoded = dict(imputed)
+        encoded.update(codes)
+
+        self.raw = _frame(raw, index)
+        self.imputed = _frame(imputed, index)
+        self.encoded = _frame(encoded, index)
+
+    # Cache key of a view; changes whenever the source file changes
+    def key(self, view='raw'):
+        return '{}:{}'.format(self.version, view)
+
+    def view(self, name):
+        if name not in VIEWS:
+            raise ValueError('unknown view {!r}, expected one of {}'.format(name, VIEWS))
+        return getattr(self, name)
+
+    # Function to report the bytes held by the views, counting shared buffers once
+    def memory_report(self):
+        buffers = {}
+        views = {}
+        for name in VIEWS:
+            frame = self.view(name)
+            total = 0
+            for column in frame.columns:
+                for array in _column_buffers(frame[column]):
+                    key = (array.__array_interface__['data'][0], array.nbytes)
+                    buffers[key] = array.nbytes
+                    total += array.nbytes
+            views[name] = total
+        return {'rows': len(self.raw), 'views': views, 'unique_bytes': sum(buffers.values()),
+                'object_bytes': object_frame_bytes(self.raw)}
+
+
+# Function to list the NumPy buffers behind a column (codes for categoricals)
+def _column_buffers(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return [np.asarray(series.array.codes)]
+    return [series.to_numpy()]
+
+
+# Function to estimate what the same frame costs with object strings and float64 (pd.read_csv dtypes)
+def object_frame_bytes(df):
+    total = 0
+    for name in df.columns:
+        column = df[name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            total += int(column.astype(object).memory_usage(index=False, deep=True))
+        else:
+            total += len(column) * 8
+    return total
+
+
+# Function to estimate the bytes held by a session's DataFrames and arrays
+def session_bytes(values):
+    total = 0
+    for value in values:
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            total += int(np.sum(value.memory_usage(index=True, deep=True)))
+        elif isinstance(value, np.ndarray):
+            total += value.nbytes
+        elif isinstance(value, (list, tuple)):
+            total += session_bytes(value)
+        elif isinstance(value, dict):
+            total += session_bytes(value.values())
+    return total
+
+
+# Function to return the peak and current resident memory of this process in bytes
+def process_memory():
+    peak = current = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        peak = peak * 1024 if os.uname().sysname != 'Darwin' else peak
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {'peak_rss': peak, 'rss': current}
+
+
+# Function to load the typed views from the columnar cache
+@traced('dataset.load')
+def load(csv_path=data_cache.DATA_FILE, cache_dir=data_cache.CACHE_DIR):
+    manifest, columns = data_cache.load_columns(csv_path, cache_dir)
+    return Dataset(manifest, columns)
+
+
+# Function to return the checksum of the current source file (rebuilding the cache if stale)
+def current_version(csv_path=data_cache.DATA_FILE, cache_dir=data_cache.CACHE_DIR):
+    manifest = data_cache.fresh_manifest(csv_path, cache_dir)
+    if manifest is None:
+        manifest = data_cache.build_cache(csv_path, cache_dir)
+    return manifest['checksum']
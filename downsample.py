@@ -0,0 +1,171 @@
+# Point reduction for the scatter, trendline and 3D views.
+# Dense regions are thinned on a grid (a fixed number of points per cell) while
+# outliers and rows flagged to keep, such as the minority stroke class, always
+# survive. Very large inputs can be drawn as a 2D density raster instead.
+# Trendlines come from closed-form least squares on running centred moments
+# (merged with Chan's update, as in corr_stats), so no statsmodels fit is
+# needed. Row-level views (HiPlot) use a stratified sample.
+import numpy as np
+import pandas as pd
+import plotly.colors
+import plotly.graph_objects as go
+
+from tracing import traced
+
+
+# Function to pick the rows to draw from an (n, d) coordinate matrix
+# Inputs with at most min_rows rows are drawn in full.
+def reduce_points(coords, keep=None, grid=128, per_cell=8, outlier_z=3.0, seed=0, min_rows=20000):
+    coords = np.asarray(coords, dtype=np.float64)
+    n_rows, n_dims = coords.shape
+    if n_rows <= min_rows:
+        return np.arange(n_rows)
+    finite = np.isfinite(coords).all(axis=1)
+    selected = np.zeros(n_rows, dtype=bool) if keep is None else np.asarray(keep, dtype=bool).copy()
+
+    # Outliers by robust z-score (median / MAD) on any axis
+    median = np.nanmedian(coords, axis=0)
+    mad = np.nanmedian(np.abs(coords - median), axis=0) * 1.4826
+    mad[mad == 0] = np.inf
+    with np.errstate(invalid='ignore'):
+        selected |= (np.abs(coords - median) / mad > outlier_z).any(axis=1) & finite
+
+    # Grid cell of each row, then up to per_cell randomly chosen rows per cell
+    rows = np.flatnonzero(finite & ~selected)
+    if len(rows):
+        low = coords[rows].min(axis=0)
+        span = coords[rows].max(axis=0) - low
+        span[span == 0] = 1.0
+        cells = np.minimum(((coords[rows] - low) / span * grid).astype(np.int64), grid - 1)
+        cell_id = np.zeros(len(rows), dtype=np.int64)
+        for d in range(n_dims):
+            cell_id = cell_id * grid + cells[:, d]
+        priority = np.random.default_rng(seed).random(len(rows))
+        order = np.lexsort((priority, cell_id))
+        sorted_cells = cell_id[order]
+        first = np.searchsorted(sorted_cells, sorted_cells, side='left')
+        rank = np.arange(len(rows)) - first
+        selected[rows[order[rank < per_cell]]] = True
+    return np.flatnonzero(selected)
+
+
+# Function to sample about max_rows positions while keeping every stratum's share
+# Each non-empty stratum keeps at least one row, so rare classes stay visible.
+def stratified_sample(strata, max_rows, seed=0):
+    codes, names = pd.factorize(pd.Series(strata))
+    n_rows = len(codes)
+    if n_rows <= max_rows:
+        return np.arange(n_rows)
+    rng = np.random.default_rng(seed)
+    picked = []
+    for i in range(-1, len(names)):
+        rows = np.flatnonzero(codes == i)
+        if len(rows) == 0:
+            continue
+        take = max(1, int(round(len(rows) * max_rows / n_rows)))
+        picked.append(rng.choice(rows, size=min(take, len(rows)), replace=False))
+    return np.sort(np.concatenate(picked))
+
+
+class LineStats:
+    # Count, means, sum of squared x deviations (m2_x) and co-moment (c_xy) for
+    # y = slope * x + intercept; two sets merge with Chan's parallel update
+    def __init__(self, n=0, mean_x=0.0, mean_y=0.0, m2_x=0.0, c_xy=0.0, x_min=np.inf, x_max=-np.inf):
+        self.n, self.mean_x, self.mean_y, self.m2_x, self.c_xy = n, mean_x, mean_y, m2_x, c_xy
+        self.x_min, self.x_max = x_min, x_max
+
+    def update(self, x, y):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        valid = np.isfinite(x) & np.isfinite(y)
+        x, y = x[valid], y[valid]
+        if len(x) == 0:
+            return self
+        mean_x, mean_y = x.mean(), y.mean()
+        dx = x - mean_x
+        batch = LineStats(len(x), mean_x, mean_y, float(dx @ dx), float(dx @ (y - mean_y)),
+                          float(x.min()), float(x.max()))
+        merged = self.merge(batch)
+        self.n, self.mean_x, self.mean_y, self.m2_x, self.c_xy = (merged.n, merged.mean_x, merged.mean_y,
+                                                                  merged.m2_x, merged.c_xy)
+        self.x_min, self.x_max = merged.x_min, merged.x_max
+        return self
+
+    def merge(self, other):
+        n = self.n + other.n
+        if n == 0:
+            return LineStats()
+        share = other.n / n
+        dx, dy = other.mean_x - self.mean_x, other.mean_y - self.mean_y
+        weight = self.n * share
+        return LineStats(n, self.mean_x + dx * share, self.mean_y + dy * share,
+                         self.m2_x + other.m2_x + dx * dx * weight, self.c_xy + other.c_xy + dx * dy * weight,
+                         min(self.x_min, other.x_min), max(self.x_max, other.x_max))
+
+    # Function to fit the least-squares line; returns (slope, intercept) or None
+    def fit(self):
+        if self.n < 2 or self.m2_x <= 0:
+            return None
+        slope = self.c_xy / self.m2_x
+        return slope, self.mean_y - slope * self.mean_x
+
+
+# Function to compute line statistics for every hue group
+def group_line_stats(x, y, groups):
+    codes, names = pd.factorize(pd.Series(groups), sort=True)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    return {name: LineStats().update(x[codes == i], y[codes == i]) for i, name in enumerate(names)}
+
+
+# Function to count points on a 2D grid for the raster view
+def density_grid(x, y, bins=200):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.isfinite(x) & np.isfinite(y)
+    counts, x_edges, y_edges = np.histogram2d(x[valid], y[valid], bins=bins)
+    return counts, x_edges, y_edges
+
+
+def _trend_trace(name, stats, color):
+    line = stats.fit()
+    if line is None:
+        return None
+    slope, intercept = line
+    x = np.array([stats.x_min, stats.x_max])
+    return go.Scatter(x=x, y=slope * x + intercept, mode='lines', name='{} trend'.format(name),
+                      line=dict(color=color), legendgroup=str(name),
+                      hovertemplate='y = {:.4g} x + {:.4g}<extra></extra>'.format(slope, intercept))
+
+
+# Function to draw (already reduced) points per hue group with their trendlines
+@traced('figure.scatter')
+def scatter_figure(x, y, groups, line_stats, x_title, y_title, legend_title):
+    palette = plotly.colors.qualitative.Plotly
+    groups = pd.Series(groups).to_numpy()
+    fig = go.Figure()
+    for i, (name, stats) in enumerate(line_stats.items()):
+        color = palette[i % len(palette)]
+        mask = groups == name
+        fig.add_trace(go.Scattergl(x=np.asarray(x)[mask], y=np.asarray(y)[mask], mode='markers',
+                                   name=str(name), legendgroup=str(name), marker=dict(color=color)))
+        trend = _trend_trace(name, stats, color)
+        if trend is not None:
+            fig.add_trace(trend)
+    fig.update_layout(xaxis=dict(title=x_title), yaxis=dict(title=y_title), legend=dict(title=legend_title))
+    return fig
+
+
+# Function to draw a density raster with the group trendlines on top
+@traced('figure.density')
+def density_figure(counts, x_edges, y_edges, line_stats, x_title, y_title, legend_title):
+    palette = plotly.colors.qualitative.Plotly
+    fig = go.Figure(go.Heatmap(z=counts.T, x=(x_edges[:-1] + x_edges[1:]) / 2, y=(y_edges[:-1] + y_edges[1:]) / 2,
+                               colorscale='Greys', showscale=False, name='points',
+                               hovertemplate='count=%{z}<extra></extra>'))
+    for i, (name, stats) in enumerate(line_stats.items()):
+        trend = _trend_trace(name, stats, palette[i % len(palette)])
+        if trend is not None:
+            fig.add_trace(trend)
+    fig.update_layout(xaxis=dict(title=x_title), yaxis=dict(title=y_title), legend=dict(title=legend_title))
+    return fig
@@ -0,0 +1,159 @@
+# Model registry and evaluation engine for the Method Assessment tab.
+# A model is fitted once and scored once; every metric and curve is derived
+# from that single probability vector through one threshold sweep, so the
+# metrics at another decision threshold need no re-scoring.
+import json
+import os
+from collections import OrderedDict, namedtuple
+from functools import partial
+
+import numpy as np
+import plotly.graph_objects as go
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+from sklearn.naive_bayes import GaussianNB
+from sklearn.svm import SVC
+from sklearn.tree import DecisionTreeClassifier
+from xgboost import XGBClassifier
+
+from thresholds import MAX_CURVE_POINTS, ThresholdSweep
+from tracing import span, traced
+
+# factory builds an unfitted model, scaled selects the standardized matrices,
+# train_accuracy also scores the training split, importance_rows caps the rows
+# permutation importance scores (None keeps importance.IMPORTANCE_ROWS)
+ModelSpec = namedtuple('ModelSpec', ['factory', 'scaled', 'train_accuracy', 'importance_rows'], defaults=(None,))
+
+# Parameters found by tuning.py, per model; they replace the hand-tuned defaults below
+TUNED_PARAMS_FILE = 'tuned_params.json'
+
+
+# Function to read the tuned parameters of a model ({} when it has not been tuned)
+def load_tuned_params(model, path=TUNED_PARAMS_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f).get(model, {}).get('params', {})
+    except (OSError, ValueError):
+        return {}
+
+
+TUNED_XGB_PARAMS = dict(objective="reg:logistic", random_state=42, use_label_encoder=False,
+                        colsample_bytree=0.5, gamma=0.2, learning_rate=0.25,
+                        max_depth=10, min_child_weight=1)
+TUNED_XGB_PARAMS.update(load_tuned_params('xgboost'))
+
+MODEL_REGISTRY = OrderedDict([
+    ("XGBoost (XGB) with HyperTuned Parameters",
+     ModelSpec(partial(XGBClassifier, **TUNED_XGB_PARAMS), False, True)),
+    ("XGBoost (XGB)",
+     ModelSpec(partial(XGBClassifier, objective="reg:logistic", random_state=42, use_label_encoder=False),
+               False, False)),
+    ("Random Forest (RF)",
+     ModelSpec(partial(RandomForestClassifier, n_estimators=100, random_state=42), False, False)),
+    ("Logistic Regression (LR)",
+     ModelSpec(partial(LogisticRegression, solver='lbfgs', random_state=42), True, False)),
+    ("Decision Tree (DT)",
+     ModelSpec(partial(DecisionTreeClassifier, random_state=42), False, False)),
+    ("Gaussian Naive Bayes (GNB)",
+     ModelSpec(GaussianNB, False, False)),
+    ("Singular Vector Machine (SVM)",
+     # Every scored row is compared with thousands of support vectors, so importance uses fewer rows
+     ModelSpec(partial(SVC, kernel='rbf', probability=True), True, False, 200)),
+])
+
+
+# Function to compute every metric and curve from one probability vector
+# The curves are thinned for plotting; the AUCs use every distinct score.
+def score_predictions(test_y, y_score, threshold=0.5):
+    sweep = ThresholdSweep(test_y, y_score)
+    fpr, tpr = sweep.roc_curve(MAX_CURVE_POINTS)
+    precision, recall = sweep.pr_curve(MAX_CURVE_POINTS)
+    result = {
+        'y_score': y_score,
+        'sweep': sweep,
+        'roc_auc': sweep.roc_auc(),
+        'fpr': fpr,
+        'tpr': tpr,
+        'precision_curve': precision,
+        'recall_curve': recall,
+        'pr_auc': sweep.pr_auc(),
+    }
+    result.update(sweep.metrics(threshold))
+    return result
+
+
+# Function to move a scored result to another decision threshold (no re-scoring)
+def at_threshold(result, threshold):
+    return dict(result, **result['sweep'].metrics(threshold))
+
+
+# Function to fit a model once and compute all metrics from one predict_proba call
+def evaluate_model(model, train_X, train_y, test_X, test_y, train_accuracy=False):
+    with span('fit') as fit_span:
+        model.fit(train_X, train_y)
+
+    with span('predict') as predict_span:
+        y_score = model.predict_proba(test_X)[:, 1]
+
+    result = score_predictions(test_y, y_score)
+    result.update({'model': model, 'fit_seconds': fit_span.seconds, 'predict_seconds': predict_span.seconds})
+    if train_accuracy:
+        result['train_accuracy'] = accuracy_score(train_y, model.predict(train_X))
+    return result
+
+
+# Function to fit and score a registry entry on the prepared model data
+def evaluate_registered(name, model_data):
+    spec = MODEL_REGISTRY[name]
+    if spec.scaled:
+        train_X, test_X = model_data.X_train_std, model_data.X_test_std
+    else:
+        train_X, test_X = model_data.X_train, model_data.X_test
+    return evaluate_model(spec.factory(), train_X, model_data.y_train, test_X, model_data.y_test,
+                          train_accuracy=spec.train_accuracy)
+
+
+# Plots for the models, with the operating point of the decision threshold on both curves
+@traced('figure.metrics')
+def calculate_metrics_and_plots(result):
+    cm = np.asarray(result['confusion_matrix'])
+    threshold_label = 'Threshold {:.2f}'.format(result.get('threshold', 0.5))
+
+    # Confusion Matrix Heatmap
+    fig_cm = go.Figure()
+    fig_cm.add_trace(go.Heatmap(z=cm[::-1], x=['Predicted 0', 'Predicted 1'], y=['Actual 1', 'Actual 0'],
+                                colorscale='Viridis', showscale=False))
+    fig_cm.update_layout(title='Confusion Matrix ({})'.format(threshold_label), xaxis=dict(title='Predicted Class'), yaxis=dict(title='Actual Class'))
+
+    # ROC Curve
+    fig_roc = go.Figure()
+    fig_roc.add_trace(go.Scatter(x=result['fpr'], y=result['tpr'], mode='lines',
+                                 name='ROC curve (AUC={:.2f})'.format(result['roc_auc'])))
+    fig_roc.add_trace(go.Scatter(x=[cm[0, 1] / max(cm[0].sum(), 1)], y=[result['recall']], mode='markers',
+                                 marker=dict(size=10), name=threshold_label))
+    fig_roc.update_layout(title='Receiver Operating Characteristic (ROC) Curve',
+                          xaxis=dict(title='False Positive Rate'),
+                          yaxis=dict(title='True Positive Rate'),
+                          showlegend=True)
+
+    # Precision-Recall Curve
+    fig_pr = go.Figure()
+    fig_pr.add_trace(go.Scatter(x=result['recall_curve'], y=result['precision_curve'], mode='lines',
+                                name='Precision-Recall curve (AUC={:.2f})'.format(result['pr_auc'])))
+    fig_pr.add_trace(go.Scatter(x=[result['recall']], y=[result['precision']], mode='markers',
+                                marker=dict(size=10), name=threshold_label))
+    fig_pr.update_layout(title='Precision-Recall Curve',
+                         xaxis=dict(title='Recall'),
+                         yaxis=dict(title='Precision'),
+                         showlegend=True)
+
+    # Metrics Bar Graph
+    metrics_labels = ['Accuracy', 'ROC AUC', 'Precision', 'Recall', 'F1-Score']
+    metrics_values = [result['accuracy'], result['roc_auc'], result['precision'], result['recall'], result['f1']]
+
+    fig_metrics = go.Figure()
+    fig_metrics.add_trace(go.Bar(x=metrics_labels, y=metrics_values, name='Metrics'))
+    fig_metrics.update_layout(barmode='group', xaxis=dict(title='Metrics'), yaxis=dict(title='Value'))
+
+    return fig_cm, fig_roc, fig_pr, fig_metrics
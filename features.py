@@ -0,0 +1,113 @@
+# Feature schema shared by training and every inference path.
+# The schema fixes the feature order, the sorted vocabulary of each
+# categorical column (LabelEncoder order) and the bmi fill value. It is saved
+# as feature_schema.json next to the model, and its encoders are plain NumPy
+# lookup tables, so a whole column is encoded in one vectorized call.
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_cache
+
+FEATURE_COLUMNS = ['gender', 'age', 'hypertension', 'heart_disease', 'ever_married', 'work_type',
+                   'Residence_type', 'avg_glucose_level', 'bmi', 'smoking_status']
+CATEGORICAL_COLUMNS = ['gender', 'ever_married', 'work_type', 'Residence_type', 'smoking_status']
+TARGET = 'stroke'
+IMPUTE_COLUMN = 'bmi'
+FEATURE_SCHEMA_FILE = 'feature_schema.json'
+SCHEMA_FORMAT = 1
+
+
+# Function to map a text column to vocabulary codes (NaN for unseen values)
+def encode_column(values, vocabulary):
+    vocabulary = np.asarray(vocabulary, dtype=str)
+    values = np.asarray(values, dtype=str)
+    if len(vocabulary) == 0:
+        return np.full(len(values), np.nan)
+    positions = np.searchsorted(vocabulary, values).clip(0, len(vocabulary) - 1)
+    return np.where(vocabulary[positions] == values, positions, np.nan)
+
+
+class FeatureSchema:
+    def __init__(self, classes, bmi_median, columns=FEATURE_COLUMNS, source=None):
+        self.columns = list(columns)
+        self.classes = {name: sorted(str(v) for v in classes[name]) for name in CATEGORICAL_COLUMNS}
+        self.bmi_median = float(bmi_median)
+        self.source = source
+        # Compiled vocabularies: code i is the i-th sorted label
+        self.vocabularies = {name: np.asarray(values, dtype=str) for name, values in self.classes.items()}
+
+    # Function to derive the schema from a raw frame (vocabularies and bmi median)
+    @classmethod
+    def fit(cls, df, source=None):
+        classes = {name: df[name].dropna().astype(str).unique() for name in CATEGORICAL_COLUMNS}
+        return cls(classes, df[IMPUTE_COLUMN].median(), source=source)
+
+    # Function to derive the schema of the training dataset from the column cache
+    @classmethod
+    def from_training_data(cls, csv_path=data_cache.DATA_FILE):
+        manifest, columns = data_cache.load_columns(csv_path)
+        classes = {column['name']: column['categories'] for column in manifest['columns']
+                   if column['name'] in CATEGORICAL_COLUMNS}
+        return cls(classes, np.nanmedian(columns[IMPUTE_COLUMN]), source=manifest['checksum'])
+
+    def to_dict(self):
+        return {'format': SCHEMA_FORMAT, 'columns': self.columns, 'classes': self.classes,
+                'bmi_median': self.bmi_median, 'source': self.source}
+
+    @classmethod
+    def from_dict(cls, state):
+        if state.get('format') != SCHEMA_FORMAT:
+            raise ValueError('unsupported feature schema format {!r}'.format(state.get('format')))
+        return cls(state['classes'], state['bmi_median'], state['columns'], state.get('source'))
+
+    # Short content hash, e.g. for cache keys and model manifests
+    @property
+    def version(self):
+        payload = json.dumps([self.columns, self.classes, self.bmi_median], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def save(self, path=FEATURE_SCHEMA_FILE):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    # Function to compile the lookup table from a column's distinct values to schema codes
+    # The trailing NaN is picked by missing values (code -1).
+    def lookup_table(self, name, values):
+        return np.append(encode_column(np.asarray(values, dtype=str), self.vocabularies[name]), np.nan)
+
+    # Function to encode a whole categorical column; unseen or missing labels become NaN
+    def encode_categorical(self, name, values):
+        values = values if isinstance(values, pd.Series) else pd.Series(values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values)
+        return self.lookup_table(name, uniques)[codes]
+
+    # Function to build the model input frame (float64, schema column order) from raw records
+    def encode(self, df):
+        data = {}
+        for name in self.columns:
+            if name in self.classes:
+                data[name] = self.encode_categorical(name, df[name])
+            else:
+                data[name] = pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float64)
+        data[IMPUTE_COLUMN] = np.where(np.isnan(data[IMPUTE_COLUMN]), self.bmi_median, data[IMPUTE_COLUMN])
+        return pd.DataFrame(data, columns=self.columns, index=df.index)
+
+
+# Function to load the persisted schema, creating it from the training data when missing
+def load_schema(path=FEATURE_SCHEMA_FILE, csv_path=data_cache.DATA_FILE):
+    if os.path.exists(path):
+        with open(path) as f:
+            return FeatureSchema.from_dict(json.load(f))
+    schema = FeatureSchema.from_training_data(csv_path)
+    try:
+        schema.save(path)
+    except OSError:
+        pass
+    return schema
@@ -0,0 +1,176 @@
+# Feature importance for the fitted models.
+# Permutation importance is the drop in ROC AUC when one feature column of a
+# stratified subsample is shuffled. All repeats of a feature are stacked into
+# one matrix and scored with a single predict_proba call, and the features are
+# spread over a process pool whose workers receive the model once. Results
+# are artifacts keyed by the model bytes, the data and the parameters, so
+# they are computed once per model. Tree models also report their built-in
+# importances (XGBoost gain, cover and weight; impurity for sklearn trees).
+#
+#   python importance.py --model models/xgboost_tuned --repeats 10 --workers 4
+import argparse
+import hashlib
+import os
+import pickle
+import sys
+import time as timer
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from sklearn.metrics import roc_auc_score
+
+from artifacts import ArtifactStore, hash_arrays
+from downsample import stratified_sample
+from tracing import span
+
+IMPORTANCE_ROWS = 2000
+N_REPEATS = 10
+BOOSTER_IMPORTANCE_TYPES = ('gain', 'cover', 'weight')
+
+# Model and subsample sent once to each worker process
+_worker_state = {}
+
+
+# Function to hash a fitted model by its pickled bytes
+def model_hash(model):
+    return hashlib.sha256(pickle.dumps(model, protocol=4)).hexdigest()
+
+
+# Function to measure the ROC AUC drop of every repeat of one shuffled feature
+def permutation_drops(model, X, y, feature, n_repeats, seed, baseline):
+    rng = np.random.default_rng([seed, feature])
+    n_rows = len(X)
+    stacked = np.tile(X, (n_repeats, 1))
+    for repeat in range(n_repeats):
+        stacked[repeat * n_rows:(repeat + 1) * n_rows, feature] = X[rng.permutation(n_rows), feature]
+    scores = model.predict_proba(stacked)[:, 1].reshape(n_repeats, n_rows)
+    return np.array([baseline - roc_auc_score(y, score) for score in scores])
+
+
+def _init_worker(model, X, y, threads):
+    if 'n_jobs' in getattr(model, 'get_params', dict)():
+        model.set_params(n_jobs=threads)
+    _worker_state.update(model=model, X=X, y=y)
+
+
+def _drops_in_worker(feature, n_repeats, seed, baseline):
+    state = _worker_state
+    return permutation_drops(state['model'], state['X'], state['y'], feature, n_repeats, seed, baseline)
+
+
+# Function to compute permutation importance, returning (arrays, meta) for the artifact store
+def compute_permutation_importance(model, X, y, n_repeats=N_REPEATS, max_rows=IMPORTANCE_ROWS, seed=0,
+                                   workers=None, mp_context=None):
+    start = timer.perf_counter()
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    if max_rows and len(X) > max_rows:
+        rows = stratified_sample(y, max_rows, seed)
+        X, y = X[rows], y[rows]
+    baseline = roc_auc_score(y, model.predict_proba(X)[:, 1])
+    features = range(X.shape[1])
+    if workers is None:
+        workers = min(len(features), os.cpu_count() or 1)
+
+    if workers <= 1:
+        drops = [permutation_drops(model, X, y, feature, n_repeats, seed, baseline) for feature in features]
+    else:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_init_worker,
+                                 initargs=(model, X, y, threads)) as pool:
+            drops = list(pool.map(_drops_in_worker, features, [n_repeats] * len(features),
+                                  [seed] * len(features), [baseline] * len(features)))
+    importances = np.vstack(drops)
+    arrays = {'importances': importances, 'mean': importances.mean(axis=1), 'std': importances.std(axis=1)}
+    meta = {'baseline_roc_auc': float(baseline), 'rows': int(len(y)), 'n_repeats': int(n_repeats),
+            'seconds': timer.perf_counter() - start}
+    return arrays, meta
+
+
+# Function to return the built-in importances of a tree model as shares summing to 1 per column
+def model_importances(model, feature_names):
+    table = pd.DataFrame(index=pd.Index(feature_names, name='feature'))
+    if hasattr(model, 'get_booster'):
+        booster = model.get_booster()
+        names = {'f{}'.format(i): name for i, name in enumerate(feature_names)}
+        for kind in BOOSTER_IMPORTANCE_TYPES:
+            scores = pd.Series({names.get(k, k): v for k, v in booster.get_score(importance_type=kind).items()},
+                               dtype=np.float64)
+            # Features never used in a split are missing from get_score
+            scores = scores.reindex(table.index).fillna(0.0)
+            table[kind] = scores / scores.sum() if scores.sum() > 0 else scores
+    elif hasattr(model, 'feature_importances_'):
+        table['impurity'] = np.asarray(model.feature_importances_, dtype=np.float64)
+    return table
+
+
+# Function to compute (or load) the importance table of a fitted model on (X, y)
+# Returns the table (permutation mean/std and built-in shares, sorted) and the run details.
+def feature_importance(model, X, y, feature_names, store=None, n_repeats=N_REPEATS, max_rows=IMPORTANCE_ROWS,
+                       seed=0, workers=None, mp_context=None):
+    if store is None:
+        store = ArtifactStore()
+    inputs = [model_hash(model), hash_arrays({'X': np.asarray(X), 'y': np.asarray(y)})]
+    params = {'n_repeats': n_repeats, 'max_rows': max_rows, 'seed': seed, 'scoring': 'roc_auc'}
+    with span('importance'):
+        _, arrays, meta = store.stage(
+            'importance', inputs, params,
+            lambda: compute_permutation_importance(model, X, y, n_repeats, max_rows, seed, workers, mp_context))
+    table = model_importances(model, feature_names)
+    table.insert(0, 'permutation_mean', np.asarray(arrays['mean']))
+    table.insert(1, 'permutation_std', np.asarray(arrays['std']))
+    meta = dict(meta, status=store.log[-1]['status'])
+    return table.sort_values('permutation_mean', ascending=False), meta
+
+
+# Function to draw the permutation importances with one standard deviation error bars
+def importance_figure(table):
+    table = table.iloc[::-1]
+    fig = go.Figure(go.Bar(x=table['permutation_mean'], y=table.index, orientation='h',
+                           error_x=dict(type='data', array=table['permutation_std']), name='permutation'))
+    fig.update_layout(title='Permutation importance (ROC AUC drop)', xaxis_title='ROC AUC drop',
+                      yaxis_title='feature', height=400)
+    return fig
+
+
+# Function to draw the built-in importance shares side by side (None when the model has none)
+def builtin_importance_figure(table):
+    kinds = [kind for kind in BOOSTER_IMPORTANCE_TYPES + ('impurity',) if kind in table.columns]
+    if not kinds:
+        return None
+    table = table.iloc[::-1]
+    fig = go.Figure([go.Bar(x=table[kind], y=table.index, orientation='h', name=kind) for kind in kinds])
+    fig.update_layout(title='Built-in importance (share)', barmode='group', xaxis_title='share',
+                      yaxis_title='feature', height=400)
+    return fig
+
+
+def main(argv=None):
+    from dataset import load
+    from features import load_schema
+    from model_bundle import MODEL_BUNDLE_DIR, load_predictor
+    from preprocessing import prepare_model_data
+
+    parser = argparse.ArgumentParser(description='Permutation and built-in feature importance of a fitted model.')
+    parser.add_argument('--model', default=MODEL_BUNDLE_DIR, help='model bundle directory or joblib file')
+    parser.add_argument('--repeats', type=int, default=N_REPEATS, help='shuffles per feature')
+    parser.add_argument('--rows', type=int, default=IMPORTANCE_ROWS, help='stratified test rows used (0: all)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per feature)')
+    args = parser.parse_args(argv)
+
+    model_data = prepare_model_data(load().imputed, schema=load_schema())
+    start = timer.perf_counter()
+    table, meta = feature_importance(load_predictor(args.model)[0], model_data.X_test, model_data.y_test,
+                                     model_data.feature_names, n_repeats=args.repeats, max_rows=args.rows,
+                                     workers=args.workers)
+    with pd.option_context('display.width', 120):
+        print(table.round(4).to_string())
+    print('{} on {} rows x {} repeats (baseline ROC AUC {:.4f}) in {:.2f} s'.format(
+        'loaded' if meta['status'] == 'hit' else 'computed', meta['rows'], meta['n_repeats'],
+        meta['baseline_roc_auc'], timer.perf_counter() - start), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
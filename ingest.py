@@ -0,0 +1,269 @@
+# Streaming ingestion of patient files of any size.
+# The CSV is read once in chunks. Text columns are dictionary-encoded in
+# first-seen order (vocabularies grow as new values appear), the bmi median is
+# estimated with a mergeable quantile sketch and every chunk is written as one
+# .npy file per column. The sorted vocabularies (LabelEncoder order) and the
+# median are only known at the end, so the remap to sorted codes and the bmi
+# imputation are applied when chunks are read back.
+#
+#   python ingest.py big.csv -o .cache/ingest/big --chunksize 100000
+import argparse
+import json
+import os
+import shutil
+import sys
+import time as timer
+
+import numpy as np
+import pandas as pd
+
+from features import CATEGORICAL_COLUMNS, FEATURE_COLUMNS, IMPUTE_COLUMN, TARGET, FeatureSchema
+
+INGEST_DIR = os.path.join('.cache', 'ingest')
+MANIFEST_FILE = 'manifest.json'
+STORE_FORMAT = 1
+ID_COLUMN = 'id'
+
+
+class QuantileSketch:
+    # KLL-style sketch: level h holds items that each stand for 2**h values.
+    # A full level is sorted and every other item (random offset) moves up a
+    # level, so memory stays around 3 * k items for any number of values and
+    # two sketches merge by concatenating their levels.
+    def __init__(self, k=2048, seed=0):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self.seed = seed
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            grew = level + 1 == len(self.levels)
+            if grew:
+                self.levels.append(np.empty(0))
+            items = np.sort(items)
+            # An odd item out stays behind so the total weight is preserved
+            keep = items[:1] if len(items) % 2 else items[:0]
+            items = items[len(keep):]
+            promoted = items[self._rng.integers(2)::2]
+            self.levels[level] = keep
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            # A new top level shrinks the capacity of every level below it
+            level = 0 if grew else level + 1
+
+    # Function to add a batch of values (NaN values are ignored)
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    # Function to fold another sketch into this one
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    # Function to estimate quantile q, interpolating between ranks like pandas
+    # (exact while nothing has been compacted)
+    def quantile(self, q):
+        if self.n == 0:
+            return float('nan')
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        position = q * (self.n - 1)
+        lower, upper = int(np.floor(position)), int(np.ceil(position))
+        low_value = items[min(np.searchsorted(cumulative, lower, side='right'), len(items) - 1)]
+        high_value = items[min(np.searchsorted(cumulative, upper, side='right'), len(items) - 1)]
+        return float(low_value + (high_value - low_value) * (position - lower))
+
+    # The seed and the generator state are kept, so a restored sketch compacts as the original would
+    def to_dict(self):
+        return {'k': self.k, 'n': self.n, 'seed': self.seed, 'rng': self._rng.bit_generator.state,
+                'levels': [items.tolist() for items in self.levels]}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state['k'], state.get('seed', 0))
+        if 'rng' in state:
+            sketch._rng.bit_generator.state = state['rng']
+        sketch.n = state['n']
+        sketch.levels = [np.asarray(items, dtype=np.float64) for items in state['levels']]
+        return sketch
+
+
+# Function to dictionary-encode a text column against a growing first-seen vocabulary
+def _append_codes(values, vocabulary):
+    codes, uniques = pd.factorize(values)
+    lookup = np.array([vocabulary.setdefault(str(value), len(vocabulary)) for value in uniques] + [-1],
+                      dtype=np.int32)
+    # Code -1 (missing) picks the trailing -1
+    return lookup[codes]
+
+
+def _store_path(csv_path):
+    return os.path.join(INGEST_DIR, os.path.splitext(os.path.basename(csv_path))[0])
+
+
+# Function to stream a CSV into a chunked columnar store, returning its manifest
+def ingest(csv_path, out_dir=None, chunksize=100000, k=2048):
+    start = timer.perf_counter()
+    out_dir = out_dir or _store_path(csv_path)
+    tmp_dir = '{}.tmp-{}'.format(out_dir, os.getpid())
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    vocabularies = {name: {} for name in CATEGORICAL_COLUMNS}
+    sketch = QuantileSketch(k)
+    chunks = []
+    columns = None
+    for i, chunk in enumerate(pd.read_csv(csv_path, chunksize=chunksize)):
+        arrays = {}
+        for name in FEATURE_COLUMNS:
+            if name in CATEGORICAL_COLUMNS:
+                arrays[name] = _append_codes(chunk[name], vocabularies[name])
+            else:
+                values = pd.to_numeric(chunk[name], errors='coerce').to_numpy(dtype=np.float64)
+                if name == IMPUTE_COLUMN:
+                    sketch.update(values)
+                arrays[name] = values.astype(np.float32)
+        if TARGET in chunk.columns:
+            arrays[TARGET] = chunk[TARGET].to_numpy(dtype=np.int8)
+        if ID_COLUMN in chunk.columns:
+            arrays[ID_COLUMN] = chunk[ID_COLUMN].to_numpy(dtype=np.int64)
+
+        chunk_dir = os.path.join(tmp_dir, '{:05d}'.format(i))
+        os.makedirs(chunk_dir)
+        for name, values in arrays.items():
+            np.save(os.path.join(chunk_dir, name + '.npy'), values)
+        chunks.append({'dir': '{:05d}'.format(i), 'rows': len(chunk)})
+        columns = list(arrays)
+
+    seen = {name: list(vocabulary) for name, vocabulary in vocabularies.items()}
+    manifest = {
+        'format': STORE_FORMAT,
+        'source': os.path.abspath(csv_path),
+        'rows': sum(chunk['rows'] for chunk in chunks),
+        'columns': columns or [],
+        'chunks': chunks,
+        'vocabularies': seen,
+        'classes': {name: sorted(values) for name, values in seen.items()},
+        'bmi_median': sketch.quantile(0.5),
+        'sketch': sketch.to_dict(),
+        'seconds': timer.perf_counter() - start,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f)
+
+    # The old store is set aside, not deleted, until the new one is in place
+    old_dir = '{}.old-{}'.format(out_dir, os.getpid())
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    try:
+        os.replace(tmp_dir, out_dir)
+    except OSError:
+        if os.path.exists(old_dir):
+            os.replace(old_dir, out_dir)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return manifest
+
+
+class IngestedData:
+    # Read side of an ingested store; chunks come back encoded and imputed
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != STORE_FORMAT:
+            raise ValueError('unsupported ingest store format in {}'.format(path))
+        self.classes = self.manifest['classes']
+        self.rows = self.manifest['rows']
+
+    # Feature schema of the file itself (its own vocabularies and bmi median)
+    @property
+    def schema(self):
+        return FeatureSchema(self.classes, self.manifest['bmi_median'], source=self.manifest['source'])
+
+    def _load(self, chunk, name):
+        return np.load(os.path.join(self.path, chunk['dir'], name + '.npy'), mmap_mode='r')
+
+    # Function to yield (ids, features, target) per chunk
+    # Scoring passes the training schema so codes and the bmi fill match the model.
+    def iter_chunks(self, schema=None):
+        schema = schema or self.schema
+        # First-seen codes map to schema codes through one lookup table per column
+        remaps = {name: schema.lookup_table(name, self.manifest['vocabularies'][name]) for name in CATEGORICAL_COLUMNS}
+        for chunk in self.manifest['chunks']:
+            data = {}
+            for name in FEATURE_COLUMNS:
+                values = self._load(chunk, name)
+                # Missing text (-1) picks the trailing NaN of the remap
+                data[name] = remaps[name][values] if name in CATEGORICAL_COLUMNS else values.astype(np.float64)
+            data[IMPUTE_COLUMN] = np.where(np.isnan(data[IMPUTE_COLUMN]), schema.bmi_median, data[IMPUTE_COLUMN])
+            features = pd.DataFrame(data, columns=schema.columns)
+            ids = self._load(chunk, ID_COLUMN) if ID_COLUMN in self.manifest['columns'] else None
+            target = self._load(chunk, TARGET) if TARGET in self.manifest['columns'] else None
+            yield ids, features, target
+
+    # Function to build the training frame for prepare_model_data
+    # Text columns come back as categoricals over the codes, so encoding them
+    # with the schema is a lookup on the codes rather than on strings.
+    def training_frame(self):
+        frames = []
+        for _, features, target in self.iter_chunks():
+            if target is None:
+                raise ValueError('{} has no {} column'.format(self.manifest['source'], TARGET))
+            data = {}
+            for name in features.columns:
+                values = features[name].to_numpy()
+                if name in CATEGORICAL_COLUMNS:
+                    codes = np.where(np.isnan(values), -1, values).astype(np.int32)
+                    values = pd.Categorical.from_codes(codes, categories=self.classes[name])
+                data[name] = values
+            data[TARGET] = np.asarray(target)
+            frames.append(pd.DataFrame(data))
+        return pd.concat(frames, ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stream a patient CSV into an encoded columnar store.')
+    parser.add_argument('input', help='CSV with the raw patient columns')
+    parser.add_argument('-o', '--output', default=None, help='store directory (default .cache/ingest/<name>)')
+    parser.add_argument('--chunksize', type=int, default=100000, help='rows per chunk')
+    parser.add_argument('--sketch-size', type=int, default=2048, help='items kept per sketch level (k)')
+    args = parser.parse_args(argv)
+
+    manifest = ingest(args.input, args.output, args.chunksize, args.sketch_size)
+    seconds = manifest['seconds']
+    print('ingested {} rows in {} chunks in {:.2f} s ({:,.0f} rows/sec)'.format(
+        manifest['rows'], len(manifest['chunks']), seconds, manifest['rows'] / max(seconds, 1e-9)), file=sys.stderr)
+    print('bmi median estimate {:.4g}'.format(manifest['bmi_median']), file=sys.stderr)
+    for name, classes in manifest['classes'].items():
+        print('{:<16} {}'.format(name, ', '.join(classes)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# Lazy module imports for the Streamlit app.
+# lazy_import('xgboost') returns a stand-in module that performs the real
+# import the first time one of its attributes is used, so a library is only
+# loaded once a tab or feature needs it. The first-use import time of each
+# module is recorded in import_log.
+import importlib
+import time as timer
+import types
+from collections import OrderedDict
+
+# Seconds spent importing each lazily loaded module, in load order
+import_log = OrderedDict()
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_module'] = None
+
+    # Function to import the real module on first use
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            start = timer.perf_counter()
+            module = importlib.import_module(self.__name__)
+            import_log[self.__name__] = timer.perf_counter() - start
+            self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return '<lazy module {!r} ({})>'.format(self.__name__, state)
+
+
+def lazy_import(name):
+    return LazyModule(name)
@@ -0,0 +1,47 @@
+# Train and evaluate every registered model at the same time.
+# The prepared matrices are placed in shared memory once and each model is
+# fitted in its own worker process. Rows are yielded as models finish so the
+# app can update the table live.
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from evaluation import MODEL_REGISTRY, evaluate_model
+from shared_arrays import SharedArrays, attach_arrays
+
+MATRIX_NAMES = ['X_train', 'X_test', 'y_train', 'y_test', 'X_train_std', 'X_test_std']
+METRIC_COLUMNS = ['accuracy', 'roc_auc', 'pr_auc', 'precision', 'recall', 'f1']
+
+
+# Function run in a worker: fit one registry entry on the shared matrices
+def _evaluate_worker(name, specs, threads):
+    data = attach_arrays(specs)
+    spec = MODEL_REGISTRY[name]
+    model = spec.factory()
+    if 'n_jobs' in model.get_params():
+        model.set_params(n_jobs=threads)
+    if spec.scaled:
+        train_X, test_X = data['X_train_std'], data['X_test_std']
+    else:
+        train_X, test_X = data['X_train'], data['X_test']
+    result = evaluate_model(model, train_X, data['y_train'], test_X, data['y_test'])
+    row = {'model': name,
+           'train_seconds': result['fit_seconds'],
+           'inference_seconds': result['predict_seconds']}
+    for column in METRIC_COLUMNS:
+        row[column] = float(result[column])
+    return row
+
+
+# Function to evaluate the models in parallel, yielding one row per finished model
+def run_leaderboard(model_data, names=None, max_workers=None, mp_context=None):
+    names = list(names or MODEL_REGISTRY)
+    if max_workers is None:
+        max_workers = min(len(names), os.cpu_count() or 1)
+    # Split the cores between workers so multi-threaded models do not oversubscribe
+    threads = max(1, (os.cpu_count() or 1) // max_workers)
+
+    with SharedArrays({name: getattr(model_data, name) for name in MATRIX_NAMES}) as shared:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as pool:
+            futures = [pool.submit(_evaluate_worker, name, shared.specs, threads) for name in names]
+            for future in as_completed(futures):
+                yield future.result()
@@ -0,0 +1,258 @@
+# Versioned model bundles.
+# A bundle is a directory with the booster in XGBoost's native format
+# (booster.json, or booster.ubj where XGBoost writes UBJSON) and manifest.json,
+# which records the bundle format, the feature schema (column order, encoder
+# vocabularies and bmi fill value), the training parameters, the metrics on
+# held-out real patients (never SMOTE rows) and the hashes of the data and of
+# the booster file. Loading runs no pickle: the booster file is checked against
+# its hash and parsed by XGBoost, so a bundle written by the pinned XGBoost
+# loads in later releases. The registry keeps one loaded bundle per directory
+# and process.
+#
+#   python model_bundle.py export --model XGBoostTunedModel.pkl --out models/xgboost_tuned
+#   python model_bundle.py info models/xgboost_tuned
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import sys
+import threading
+import time as timer
+
+import joblib
+import numpy as np
+
+from features import FeatureSchema, load_schema
+
+BUNDLE_FORMAT = 1
+MANIFEST_FILE = 'manifest.json'
+MODEL_BUNDLE_DIR = os.path.join('models', 'xgboost_tuned')
+MODEL_FILE = 'XGBoostTunedModel.pkl'
+BOOSTER_FILES = {'json': 'booster.json', 'ubj': 'booster.ubj'}
+# Largest prediction difference accepted between a model and its exported bundle
+ROUND_TRIP_TOLERANCE = 1e-6
+METRIC_NAMES = ('accuracy', 'roc_auc', 'precision', 'recall', 'f1', 'pr_auc')
+
+# Loaded bundles by directory, with the manifest modification time they were loaded at
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _file_sha256(path, block_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _xgboost_version():
+    import xgboost
+    return xgboost.__version__
+
+
+# Function to tell whether the installed XGBoost writes UBJSON (1.6 and later)
+def supports_ubjson():
+    major, minor = (int(part) for part in _xgboost_version().split('.')[:2])
+    return (major, minor) >= (1, 6)
+
+
+# Function to keep the JSON-representable training parameters (NaN becomes null)
+def _json_params(params):
+    kept = {}
+    for name, value in sorted(params.items()):
+        if isinstance(value, float) and math.isnan(value):
+            kept[name] = None
+        elif value is None or isinstance(value, (bool, int, float, str)):
+            kept[name] = value
+    return kept
+
+
+class ModelBundle:
+    def __init__(self, model, schema, manifest, path=None):
+        self.model = model
+        self.schema = schema
+        self.manifest = manifest
+        self.path = path
+        self._compiled = None
+
+    # Short content hash of the booster, e.g. for cache keys
+    @property
+    def version(self):
+        return self.manifest['booster']['sha256'][:16]
+
+    @property
+    def metrics(self):
+        return self.manifest.get('metrics', {})
+
+    # The booster compiled to NumPy arrays for fast single-row scoring (tree_engine), built on first use
+    @property
+    def compiled(self):
+        if self._compiled is None:
+            from tree_engine import compile_booster
+            self._compiled = compile_booster(self.model)
+        return self._compiled
+
+    # Function to score raw records (DataFrame in the dataset's own labels) with the bundle's encoders
+    def predict_proba(self, df):
+        return self.model.predict_proba(self.schema.encode(df).to_numpy())
+
+
+# Function to tell whether a path is a bundle directory
+def is_bundle(path):
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+
+# Function to write a fitted XGBClassifier and its schema as a bundle directory
+# metrics and data (hashes and row counts of the data used) go to the manifest as given.
+def save_bundle(model, path, schema, metrics=None, data=None, booster_format='json'):
+    if not hasattr(model, 'get_booster'):
+        raise TypeError('model bundles hold XGBoost models, not {}'.format(type(model).__name__))
+    if booster_format not in BOOSTER_FILES:
+        raise ValueError('unknown booster format {!r}'.format(booster_format))
+    if booster_format == 'ubj' and not supports_ubjson():
+        raise ValueError('XGBoost {} cannot write UBJSON (1.6 or later is needed)'.format(_xgboost_version()))
+
+    path = os.path.normpath(path)
+    tmp_path = '{}.tmp-{}'.format(path, os.getpid())
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    booster_file = BOOSTER_FILES[booster_format]
+    booster_path = os.path.join(tmp_path, booster_file)
+    model.save_model(booster_path)
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'created': timer.strftime('%Y-%m-%dT%H:%M:%SZ', timer.gmtime()),
+        'model_class': '{}.{}'.format(type(model).__module__, type(model).__name__),
+        'xgboost_version': _xgboost_version(),
+        'booster': {'file': booster_file, 'format': booster_format, 'bytes': os.path.getsize(booster_path),
+                    'sha256': _file_sha256(booster_path)},
+        'params': _json_params(model.get_params()),
+        'feature_names': list(schema.columns),
+        'schema': schema.to_dict(),
+        'schema_version': schema.version,
+        'metrics': metrics or {},
+        'data': data or {},
+    }
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+    # Replace an older bundle in one step, so readers never see a half-written one
+    old_path = '{}.old-{}'.format(path, os.getpid())
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return manifest
+
+
+# Function to load a bundle directory, checking its format, booster hash and schema
+def load_bundle(path):
+    from xgboost import XGBClassifier
+
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise ValueError('unsupported model bundle format {!r}'.format(manifest.get('format')))
+    booster_path = os.path.join(path, manifest['booster']['file'])
+    if _file_sha256(booster_path) != manifest['booster']['sha256']:
+        raise ValueError('{} does not match the hash in its manifest'.format(booster_path))
+    schema = FeatureSchema.from_dict(manifest['schema'])
+    if schema.version != manifest['schema_version'] or schema.columns != manifest['feature_names']:
+        raise ValueError('feature schema of {} does not match its manifest'.format(path))
+
+    model = XGBClassifier()
+    model.load_model(booster_path)
+    return ModelBundle(model, schema, manifest, path)
+
+
+# Function to return the bundle of a directory, loading it once per process
+# A bundle exported again (newer manifest) is loaded again.
+def get_bundle(path=MODEL_BUNDLE_DIR):
+    key = os.path.abspath(path)
+    modified = os.stat(os.path.join(path, MANIFEST_FILE)).st_mtime_ns
+    with _registry_lock:
+        entry = _registry.get(key)
+        if entry is None or entry[0] != modified:
+            entry = (modified, load_bundle(path))
+            _registry[key] = entry
+    return entry[1]
+
+
+def clear_registry():
+    with _registry_lock:
+        _registry.clear()
+
+
+# Function to load a classifier and the feature schema it expects from a bundle or a joblib file
+def load_predictor(path=MODEL_BUNDLE_DIR):
+    if is_bundle(path):
+        bundle = get_bundle(path)
+        return bundle.model, bundle.schema
+    return joblib.load(path), load_schema()
+
+
+# Function to export a fitted model as a bundle with its metrics on held-out real rows
+# X_test and y_test must be real patients (preprocessing.holdout_stage), not SMOTE output.
+# The rows a pickled model was fitted on are not known, so only the test rows are hashed.
+# The bundle is loaded back and must predict the test rows like the model itself.
+def export(model, out, schema, X_test, y_test, booster_format='json'):
+    from artifacts import hash_arrays
+    from evaluation import score_predictions
+
+    y_score = model.predict_proba(X_test)[:, 1]
+    result = score_predictions(y_test, y_score)
+    metrics = {name: float(result[name]) for name in METRIC_NAMES}
+    metrics['split'] = 'holdout'
+    data = {'source': schema.source,
+            'test_hash': hash_arrays({'X': np.asarray(X_test), 'y': np.asarray(y_test)}),
+            'test_rows': int(len(y_test)), 'test_positives': int(np.sum(y_test))}
+    save_bundle(model, out, schema, metrics, data, booster_format)
+
+    bundle = load_bundle(out)
+    difference = float(np.abs(bundle.model.predict_proba(X_test)[:, 1] - y_score).max())
+    if difference > ROUND_TRIP_TOLERANCE:
+        raise ValueError('bundle predictions differ from the model by {:.3g}'.format(difference))
+    return bundle, difference
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export and inspect versioned model bundles.')
+    commands = parser.add_subparsers(dest='command')
+    export_parser = commands.add_parser('export', help='write a bundle from a joblib-pickled XGBoost model')
+    export_parser.add_argument('--model', default=MODEL_FILE, help='joblib file of the fitted classifier')
+    export_parser.add_argument('--out', default=MODEL_BUNDLE_DIR, help='bundle directory to write')
+    export_parser.add_argument('--format', choices=sorted(BOOSTER_FILES), default='json',
+                               help='booster file format (ubj needs XGBoost 1.6 or later)')
+    info_parser = commands.add_parser('info', help='load a bundle and print its manifest')
+    info_parser.add_argument('path', nargs='?', default=MODEL_BUNDLE_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        from dataset import load
+        from preprocessing import holdout_stage
+
+        schema = load_schema()
+        _, splits, _ = holdout_stage(load().imputed, schema=schema)
+        bundle, difference = export(joblib.load(args.model), args.out, schema, splits['X_test'], splits['y_test'],
+                                    args.format)
+        print('wrote {} (booster {}, max prediction difference {:.3g})'.format(
+            args.out, bundle.version, difference), file=sys.stderr)
+    elif args.command == 'info':
+        start = timer.perf_counter()
+        bundle = load_bundle(args.path)
+        seconds = timer.perf_counter() - start
+        manifest = dict(bundle.manifest, schema='<{} columns, version {}>'.format(
+            len(bundle.schema.columns), bundle.manifest['schema_version']))
+        print(json.dumps(manifest, indent=1, sort_keys=True))
+        print('loaded in {:.1f} ms'.format(seconds * 1000), file=sys.stderr)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# Native SMOTE oversampling.
+# The k nearest minority neighbours of every minority row are found once with
+# a KD-tree and kept with the index, so new synthetic rows are just vectorized
+# interpolations between a row and one of its cached neighbours. Rows are
+# generated in fixed-size blocks, each with its own seeded generator, so the
+# output depends only on the seed. New minority rows can be added without
+# rebuilding the tree: their neighbours are looked up in the tree and among
+# the other new rows, and existing neighbour lists are patched where a new row
+# is closer.
+from collections import OrderedDict
+
+import numpy as np
+from sklearn.neighbors import KDTree
+
+from artifacts import hash_arrays
+
+K_NEIGHBORS = 5
+# Synthetic rows generated per seeded block
+BLOCK_ROWS = 65536
+# Rebuild the tree once the rows added since the last build exceed this share
+REBUILD_RATIO = 0.25
+# Indexes kept in memory, least recently used dropped first
+INDEX_CACHE_SIZE = 4
+
+_index_cache = OrderedDict()
+
+
+# Function to keep the k smallest distances per row of two candidate lists
+def _merge_neighbors(distances, indices, new_distances, new_indices, k):
+    distances = np.concatenate([distances, new_distances], axis=1)
+    indices = np.concatenate([indices, new_indices], axis=1)
+    order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+
+class SmoteIndex:
+    def __init__(self, minority, k_neighbors=K_NEIGHBORS, leaf_size=40, rebuild_ratio=REBUILD_RATIO):
+        self.points = np.ascontiguousarray(minority, dtype=np.float64)
+        if len(self.points) <= k_neighbors:
+            raise ValueError('SMOTE needs more than {} minority rows, got {}'.format(k_neighbors, len(self.points)))
+        self.k = k_neighbors
+        self.leaf_size = leaf_size
+        self.rebuild_ratio = rebuild_ratio
+        self._build()
+
+    # Function to (re)build the tree and the neighbour lists of every row
+    def _build(self):
+        self.tree = KDTree(self.points, leaf_size=self.leaf_size)
+        self.n_indexed = len(self.points)
+        distances, indices = self.tree.query(self.points, k=self.k + 1)
+        # The first hit is the row itself
+        self.distances, self.neighbors = distances[:, 1:], indices[:, 1:]
+
+    # Function to add minority rows, keeping every neighbour list exact
+    def add(self, rows):
+        rows = np.ascontiguousarray(rows, dtype=np.float64).reshape(-1, self.points.shape[1])
+        if len(rows) == 0:
+            return self
+        n_old = len(self.points)
+        new_ids = n_old + np.arange(len(rows))
+
+        # Neighbours of the new rows among the indexed rows ...
+        k_tree = min(self.k, self.n_indexed)
+        distances, indices = self.tree.query(rows, k=k_tree)
+        # ... and among the rows added since the last build (including each other)
+        pending = np.concatenate([self.points[self.n_indexed:], rows])
+        pending_ids = np.concatenate([np.arange(self.n_indexed, n_old), new_ids])
+        k_pending = min(self.k + 1, len(pending))
+        gaps, nearest = KDTree(pending, leaf_size=self.leaf_size).query(rows, k=k_pending)
+        # A row is not its own neighbour
+        gaps[pending_ids[nearest] == new_ids[:, None]] = np.inf
+        new_distances, new_neighbors = _merge_neighbors(distances, indices, gaps, pending_ids[nearest], self.k)
+
+        # Existing rows whose neighbours include one of the new rows
+        k_new = min(self.k, len(rows))
+        distances, indices = KDTree(rows, leaf_size=self.leaf_size).query(self.points, k=k_new)
+        self.distances, self.neighbors = _merge_neighbors(self.distances, self.neighbors,
+                                                          distances, new_ids[indices], self.k)
+
+        self.points = np.concatenate([self.points, rows])
+        self.distances = np.concatenate([self.distances, new_distances])
+        self.neighbors = np.concatenate([self.neighbors, new_neighbors])
+        if len(self.points) - self.n_indexed > self.rebuild_ratio * self.n_indexed:
+            self._build()
+        return self
+
+    # Function to yield synthetic rows in blocks; block b is drawn from seed (seed, b)
+    def iter_samples(self, n_samples, seed=0):
+        for block, start in enumerate(range(0, n_samples, BLOCK_ROWS)):
+            size = min(BLOCK_ROWS, n_samples - start)
+            rng = np.random.default_rng([seed, block])
+            rows = rng.integers(len(self.points), size=size)
+            columns = rng.integers(self.k, size=size)
+            steps = rng.random(size)[:, None]
+            base = self.points[rows]
+            yield base + steps * (self.points[self.neighbors[rows, columns]] - base)
+
+    def sample(self, n_samples, seed=0):
+        if n_samples <= 0:
+            return np.empty((0, self.points.shape[1]))
+        return np.concatenate(list(self.iter_samples(n_samples, seed)))
+
+
+# Function to return a cached index for a minority matrix (built on first use)
+def get_index(minority, k_neighbors=K_NEIGHBORS):
+    key = (hash_arrays({'minority': np.ascontiguousarray(minority)}), k_neighbors)
+    index = _index_cache.get(key)
+    if index is None:
+        index = SmoteIndex(minority, k_neighbors)
+        _index_cache[key] = index
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    else:
+        _index_cache.move_to_end(key)
+    return index
+
+
+# Function to count the synthetic rows a sampling strategy asks for
+# 'minority'/'auto' balance the classes; a float is the wanted minority/majority ratio.
+def synthetic_count(n_minority, n_majority, sampling_strategy='minority'):
+    if sampling_strategy in ('minority', 'auto'):
+        return n_majority - n_minority
+    return max(0, int(round(float(sampling_strategy) * n_majority)) - n_minority)
+
+
+# Function to oversample the minority class of a binary problem
+# Same output layout as imblearn: the original rows first, then the synthetic ones.
+def fit_resample(X, y, sampling_strategy='minority', seed=0, k_neighbors=K_NEIGHBORS):
+    X = np.asarray(X)
+    y = np.asarray(y)
+    classes, counts = np.unique(y, return_counts=True)
+    if len(classes) != 2:
+        raise ValueError('fit_resample expects two classes, got {}'.format(len(classes)))
+    minority_class = classes[np.argmin(counts)]
+    minority = X[y == minority_class]
+    n_samples = synthetic_count(len(minority), counts.max(), sampling_strategy)
+    synthetic = get_index(minority, k_neighbors).sample(n_samples, seed)
+    X_res = np.concatenate([X, synthetic.astype(X.dtype, copy=False)])
+    y_res = np.concatenate([y, np.full(len(synthetic), minority_class, dtype=y.dtype)])
+    return X_res, y_res
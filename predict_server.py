@@ -0,0 +1,221 @@
+# Prediction service around the tuned XGBoost model.
+# The model is loaded once. Concurrent requests are collected into small
+# batches (up to --max-batch records or --window-ms milliseconds) and scored
+# with a single predict_proba call.
+#
+#   python predict_server.py --port 8502 --window-ms 5
+#   curl -d '{"records": [{"gender": "Male", "age": 67, ...}]}' localhost:8502/predict
+#   curl localhost:8502/stats
+#
+# The Prediction tab uses the server when STROKE_PREDICT_URL is set,
+# e.g. STROKE_PREDICT_URL=http://localhost:8502.
+import argparse
+import json
+import queue
+import threading
+import time as timer
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from model_bundle import MODEL_BUNDLE_DIR, load_predictor
+
+
+class _Pending:
+    def __init__(self, records):
+        self.records = records
+        self.enqueued = timer.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    def __init__(self, model, schema, window_ms=5.0, max_batch=64, history=10000):
+        self.model = model
+        self.schema = schema
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.latencies = deque(maxlen=history)
+        self.lock = threading.Lock()
+        self.started = timer.perf_counter()
+        self.requests = 0
+        self.records = 0
+        self.batches = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    # Function to score records (list of raw dicts), blocking until their batch is done
+    def submit(self, records, timeout=30.0):
+        pending = _Pending(records)
+        self.queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError('prediction timed out')
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        size = len(batch[0].records)
+        deadline = timer.perf_counter() + self.window
+        while size < self.max_batch:
+            remaining = deadline - timer.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                pending = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            size += len(pending.records)
+        return batch
+
+    # Function to score a batch of requests in one model call, setting each request's result
+    def _score(self, batch):
+        frame = pd.DataFrame.from_records([r for pending in batch for r in pending.records])
+        probability = self.model.predict_proba(self.schema.encode(frame))[:, 1]
+        offset = 0
+        for pending in batch:
+            part = probability[offset:offset + len(pending.records)]
+            offset += len(pending.records)
+            pending.result = [{'stroke': int(p > 0.5), 'probability': float(p)} for p in part]
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._score(batch)
+            except Exception as error:
+                if len(batch) == 1:
+                    batch[0].error = error
+                else:
+                    # One bad request fails the whole batch: score each alone so only it gets the error
+                    for pending in batch:
+                        try:
+                            self._score([pending])
+                        except Exception as single_error:
+                            pending.error = single_error
+            finished = timer.perf_counter()
+            with self.lock:
+                self.batches += 1
+                for pending in batch:
+                    self.requests += 1
+                    self.records += len(pending.records)
+                    self.latencies.append(finished - pending.enqueued)
+            for pending in batch:
+                pending.done.set()
+
+    # Function to report latency percentiles and throughput since start
+    def stats(self):
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            elapsed = timer.perf_counter() - self.started
+            stats = {'requests': self.requests, 'records': self.records, 'batches': self.batches,
+                     'mean_batch_records': self.records / max(self.batches, 1),
+                     'throughput_records_per_sec': self.records / max(elapsed, 1e-9)}
+        if len(latencies):
+            stats['p50_ms'] = float(np.percentile(latencies, 50))
+            stats['p99_ms'] = float(np.percentile(latencies, 99))
+        return stats
+
+
+# Function to check a request's records before they are queued, returning an error message or None
+# Bad input is the client's fault (HTTP 400) and must not fail the batch it would share with others.
+def check_records(records, columns):
+    if not isinstance(records, list) or not records:
+        return 'records must be a non-empty list'
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            return 'record {} is not an object'.format(i)
+        missing = [name for name in columns if name not in record]
+        if missing:
+            return 'record {} is missing {}'.format(i, ', '.join(missing))
+    return None
+
+
+def make_handler(batcher):
+    class PredictionHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._reply(200, batcher.stats())
+            elif self.path == '/health':
+                self._reply(200, {'status': 'ok'})
+            else:
+                self._reply(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._reply(404, {'error': 'not found'})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                records = payload['records'] if 'records' in payload else [payload]
+            except (ValueError, TypeError, KeyError):
+                self._reply(400, {'error': 'expected a JSON record or {"records": [...]}'})
+                return
+            error = check_records(records, batcher.schema.columns)
+            if error:
+                self._reply(400, {'error': error})
+                return
+            try:
+                self._reply(200, {'predictions': batcher.submit(records)})
+            except Exception as error:
+                self._reply(500, {'error': str(error)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return PredictionHandler
+
+
+# Function to build the server (call serve_forever() on the result)
+def make_server(host='127.0.0.1', port=8502, model_path=MODEL_BUNDLE_DIR, window_ms=5.0, max_batch=64):
+    model, schema = load_predictor(model_path)
+    batcher = MicroBatcher(model, schema, window_ms, max_batch)
+    server = ThreadingHTTPServer((host, port), make_handler(batcher))
+    server.daemon_threads = True
+    server.batcher = batcher
+    return server
+
+
+# Function used by clients such as the Prediction tab
+def predict_remote(url, records, timeout=5.0):
+    body = json.dumps({'records': records}).encode('utf-8')
+    request = urllib.request.Request(url.rstrip('/') + '/predict', data=body,
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read().decode('utf-8'))['predictions']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve stroke predictions over HTTP with micro-batching.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--model', default=MODEL_BUNDLE_DIR, help='model bundle directory or joblib file')
+    parser.add_argument('--window-ms', type=float, default=5.0, help='how long a batch waits for more requests')
+    parser.add_argument('--max-batch', type=int, default=64, help='records per batch')
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, args.model, args.window_ms, args.max_batch)
+    print('serving predictions on http://{}:{}'.format(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.batcher.stats(), indent=1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+# Preprocessing pipeline for the Method Assessment tab.
+# The steps are feature encoding, SMOTE oversampling, the train/test split and
+# standardization. Each step is an artifact stage keyed by its inputs and
+# parameters, so a rerun only recomputes the stages whose inputs changed.
+# prepare_holdout_data splits before resampling instead, so its test split
+# holds real patients only.
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+import oversampling
+from artifacts import ArtifactStore, hash_arrays
+from features import TARGET, FeatureSchema
+from tracing import traced
+
+ModelData = namedtuple('ModelData', ['X_train', 'X_test', 'y_train', 'y_test',
+                                     'X_train_std', 'X_test_std', 'feature_names', 'classes'])
+
+
+# Function to hash a DataFrame by content (column names, dtypes and values)
+def hash_frame(df):
+    arrays = {'__columns__': np.array([str(c) for c in df.columns])}
+    for name in df.columns:
+        column = df[name]
+        if pd.api.types.is_numeric_dtype(column):
+            arrays[name] = column.to_numpy()
+        else:
+            arrays[name] = pd.util.hash_pandas_object(column, index=False).to_numpy()
+    return hash_arrays(arrays)
+
+
+# Function to encode the categorical columns into a feature matrix
+# Codes come from the feature schema (LabelEncoder order); without one the
+# schema is fitted on the frame itself.
+@traced('encode')
+def encode_frame(df, schema=None):
+    features = df.drop(TARGET, axis=1)
+    if schema is None:
+        schema = FeatureSchema.fit(df)
+    X = schema.encode(features).to_numpy(dtype=np.float64)
+    y = df[TARGET].to_numpy()
+    arrays = {'X': X, 'y': y}
+    meta = {'feature_names': list(schema.columns), 'classes': schema.classes}
+    return arrays, meta
+
+
+# Function to oversample the minority class with SMOTE (cached neighbour index, seeded)
+@traced('smote')
+def resample(X, y, sampling_strategy, random_state):
+    X_res, y_res = oversampling.fit_resample(X, y, sampling_strategy, seed=random_state)
+    return {'X': X_res, 'y': y_res}, {}
+
+
+def split(X, y, test_size, random_state, stratify=False):
+    X_train, X_test, y_train, y_test = train_test_split(np.asarray(X), np.asarray(y),
+                                                        test_size=test_size, random_state=random_state,
+                                                        stratify=np.asarray(y) if stratify else None)
+    return {'X_train': X_train, 'X_test': X_test, 'y_train': y_train, 'y_test': y_test}, {}
+
+
+# Function to standardize with statistics of the training split only
+@traced('scale')
+def scale(X_train, X_test):
+    scaler = StandardScaler().fit(X_train)
+    arrays = {'X_train_std': scaler.transform(X_train), 'X_test_std': scaler.transform(X_test),
+              'mean': scaler.mean_, 'scale': scaler.scale_}
+    return arrays, {}
+
+
+# Function to run only the encode stage, returning (key, {'X', 'y'}, meta)
+# Cross-validation starts from these arrays, before any resampling.
+def encode_stage(df, store=None, schema=None):
+    if store is None:
+        store = ArtifactStore()
+    if schema is None:
+        schema = FeatureSchema.fit(df)
+    return store.stage('encode', hash_frame(df), {'schema': schema.to_dict(), 'target': TARGET},
+                       lambda: encode_frame(df, schema))
+
+
+# Function to run the whole pipeline through the artifact store
+def prepare_model_data(df, store=None, sampling_strategy='minority', test_size=0.22, random_state=42,
+                       schema=None):
+    if store is None:
+        store = ArtifactStore()
+
+    encoded_key, encoded, encoded_meta = encode_stage(df, store, schema)
+
+    resampled_key, resampled, _ = store.stage(
+        'smote', encoded_key, {'sampling_strategy': sampling_strategy, 'random_state': random_state,
+                   'oversampler': 'native'},
+        lambda: resample(encoded['X'], encoded['y'], sampling_strategy, random_state))
+
+    split_key, splits, _ = store.stage(
+        'split', resampled_key, {'test_size': test_size, 'random_state': random_state},
+        lambda: split(resampled['X'], resampled['y'], test_size, random_state))
+
+    _, scaled, _ = store.stage(
+        'scale', split_key, {},
+        lambda: scale(splits['X_train'], splits['X_test']))
+
+    return ModelData(splits['X_train'], splits['X_test'], splits['y_train'], splits['y_test'],
+                     scaled['X_train_std'], scaled['X_test_std'],
+                     encoded_meta['feature_names'], encoded_meta['classes'])
+
+
+# Function to split the real (encoded, not resampled) rows into stratified train and test parts,
+# returning (key, {'X_train', 'X_test', 'y_train', 'y_test'}, meta)
+def holdout_stage(df, store=None, test_size=0.22, random_state=42, schema=None):
+    if store is None:
+        store = ArtifactStore()
+    encoded_key, encoded, encoded_meta = encode_stage(df, store, schema)
+    split_key, splits, _ = store.stage(
+        'split', encoded_key, {'test_size': test_size, 'random_state': random_state, 'stratify': True},
+        lambda: split(encoded['X'], encoded['y'], test_size, random_state, stratify=True))
+    return split_key, splits, encoded_meta
+
+
+# Function to run the pipeline with the test rows held out before resampling
+# The test split holds real patients only; SMOTE and the scaler see the training rows alone,
+# as in each cross-validation fold. Metrics reported as the model's quality come from here.
+def prepare_holdout_data(df, store=None, sampling_strategy='minority', test_size=0.22, random_state=42,
+                         schema=None):
+    if store is None:
+        store = ArtifactStore()
+
+    split_key, splits, encoded_meta = holdout_stage(df, store, test_size, random_state, schema)
+
+    resampled_key, resampled, _ = store.stage(
+        'smote', split_key, {'sampling_strategy': sampling_strategy, 'random_state': random_state,
+                             'oversampler': 'native', 'part': 'train'},
+        lambda: resample(splits['X_train'], splits['y_train'], sampling_strategy, random_state))
+
+    _, scaled, _ = store.stage(
+        'scale', resampled_key, {},
+        lambda: scale(resampled['X'], splits['X_test']))
+
+    return ModelData(resampled['X'], splits['X_test'], resampled['y'], splits['y_test'],
+                     scaled['X_train_std'], scaled['X_test_std'],
+                     encoded_meta['feature_names'], encoded_meta['classes'])
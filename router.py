@@ -0,0 +1,44 @@
+# Section router for the Streamlit app.
+# Every section of the page is a registered function and a rerun executes only
+# the selected one, instead of the bodies of all tabs. The router records the
+# sections each run executed and how long they took, so the app can report
+# the work done per interaction.
+from collections import OrderedDict
+
+from tracing import span
+
+
+class SectionRouter:
+    def __init__(self):
+        self.sections = OrderedDict()
+        # (name, seconds) of the sections executed in this run, in order
+        self.executed = []
+
+    # Decorator registering a function as the section with this name
+    def section(self, name):
+        def register(function):
+            self.sections[name] = function
+            return function
+        return register
+
+    @property
+    def names(self):
+        return list(self.sections)
+
+    # Function to execute one section, recording it even when it stops the script
+    def run(self, name):
+        if name not in self.sections:
+            raise KeyError('unknown section {!r}'.format(name))
+        section_span = span('section.{}'.format(name)).start()
+        try:
+            return self.sections[name]()
+        finally:
+            self.executed.append((name, section_span.stop()))
+
+    # Function to describe the work of this run, e.g. for a caption
+    def summary(self):
+        if not self.executed:
+            return 'No section executed'
+        return 'Executed {} of {} sections: {}'.format(
+            len(self.executed), len(self.sections),
+            ', '.join('{} ({:.0f} ms)'.format(name, seconds * 1000) for name, seconds in self.executed))
@@ -0,0 +1,55 @@
+# Helpers to hand NumPy arrays to worker processes through shared memory.
+# Only a small spec (block name, shape, dtype) is pickled to each worker; the
+# worker maps the same block instead of receiving a copy of the data.
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Blocks already attached in this (worker) process, by block name
+_attached = {}
+
+
+class SharedArrays:
+    # Function to copy arrays into new shared memory blocks
+    def __init__(self, arrays):
+        self.blocks = []
+        self.specs = {}
+        for name, values in arrays.items():
+            values = np.ascontiguousarray(values)
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[...] = values
+            self.blocks.append(block)
+            self.specs[name] = (block.name, values.shape, values.dtype.str)
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _attach(block_name):
+    block = _attached.get(block_name)
+    if block is None:
+        # Pool workers share the parent's resource tracker, so the block is
+        # still unlinked exactly once, by SharedArrays.close in the parent
+        block = shared_memory.SharedMemory(name=block_name)
+        _attached[block_name] = block
+    return block
+
+
+# Function to map the arrays described by SharedArrays.specs (read-only views)
+def attach_arrays(specs):
+    arrays = {}
+    for name, (block_name, shape, dtype) in specs.items():
+        block = _attach(block_name)
+        values = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        values.flags.writeable = False
+        arrays[name] = values
+    return arrays
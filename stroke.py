@@ -1,51 +1,61 @@
 import streamlit as st
-import plotly.express as px
-import seaborn as sns
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import hiplot as hip
-import time as timer
-import joblib
-
-from sklearn import metrics
-from imblearn.over_sampling import SMOTE
-from sklearn.metrics import roc_curve, precision_recall_curve, auc, confusion_matrix, accuracy_score,make_scorer
-from sklearn.model_selection import train_test_split
-from sklearn.inspection import permutation_importance
-from sklearn.preprocessing import LabelEncoder,StandardScaler
-from sklearn.metrics import classification_report,accuracy_score,confusion_matrix
-from sklearn.metrics import auc,roc_auc_score,roc_curve,precision_score,recall_score,f1_score
-
-
-#model imports
-from sklearn.svm import SVC
-from sklearn.naive_bayes import GaussianNB
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import cross_val_score
-from sklearn.ensemble import RandomForestClassifier
-from xgboost import XGBClassifier
-from xgboost import plot_importance
-
-#charts
-import plotly.express as px
-import matplotlib.pyplot as plt
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-
-# Keep this to avoid unwanted warning on the wen app
-st.set_option('deprecation.showPyplotGlobalUse', False)
-
-# Loading dataset
-df = pd.read_csv('https://raw.githubusercontent.com/madhuryashankar/CMSE/main/healthcare-dataset-stroke-data.csv')
-
-
-# Function to replace missing values with median
-def replace_missing_with_median(df):
-    df['bmi'] = df['bmi'].fillna(df['bmi'].median())
-
-df = df.drop('id',axis=1)
+import os
+import multiprocessing
+import data_cache
+import dataset
+import tracing
+from artifacts import ArtifactStore
+from features import load_schema
+from cohort import CohortIndex
+from aggregates import SortedGroups, grouped_counts, bar_figure, histogram_figure, violin_figure
+from downsample import reduce_points, stratified_sample, group_line_stats, density_grid, scatter_figure, density_figure
+from corr_stats import PartitionedMoments
+from lazy_imports import lazy_import
+from router import SectionRouter
+
+# Heavy libraries and the modeling modules (sklearn, xgboost, hiplot, plotly express)
+# are imported on first use, so the first tab renders before they load
+px = lazy_import('plotly.express')
+hip = lazy_import('hiplot')
+preprocessing = lazy_import('preprocessing')
+evaluation = lazy_import('evaluation')
+leaderboard = lazy_import('leaderboard')
+importance = lazy_import('importance')
+cross_validation = lazy_import('cross_validation')
+predict_server = lazy_import('predict_server')
+tree_engine = lazy_import('tree_engine')
+model_bundle = lazy_import('model_bundle')
+thresholds = lazy_import('thresholds')
+
+# Collect the spans of this rerun for the diagnostics panel
+tracing.begin_trace()
+rerun_span = tracing.span('rerun').start()
+
+# Serve the latency histograms of every session at /metrics (Prometheus text) and
+# /metrics.json when STROKE_METRICS_PORT is set; started once per process.
+# The server listens on 127.0.0.1 unless STROKE_METRICS_HOST names a wider bind (e.g. 0.0.0.0).
+@st.cache_resource(show_spinner=False)
+def start_metrics_server(port, host):
+    return tracing.serve_metrics(port, host)
+
+if os.environ.get('STROKE_METRICS_PORT'):
+    start_metrics_server(int(os.environ['STROKE_METRICS_PORT']), os.environ.get('STROKE_METRICS_HOST', '127.0.0.1'))
+
+# Loading the typed dataset views once per process from the local columnar cache
+# (rebuilt when the CSV changes). The views are shared and read-only.
+@st.cache_resource
+def load_dataset_views(version):
+    return dataset.load(data_cache.DATA_FILE)
+
+with tracing.span('data_load'):
+    stroke_data = load_dataset_views(dataset.current_version(data_cache.DATA_FILE))
+raw_df = stroke_data.raw
+df = stroke_data.imputed
+
+# Cache key for summaries of the imputed view
+dataset_version = stroke_data.key('imputed')
 
 # Check for duplicate rows
 duplicate_rows = df.duplicated()    
@@ -53,94 +63,156 @@ duplicate_rows = df.duplicated()
 # Count the number of duplicate rows
 duplicate_rows.sum()
     
+# Function to build the cohort index once per dataset version
+@st.cache_resource
+def get_cohort_index(_df, dataset_version):
+    return CohortIndex(_df)
+
 # Function to filter data based on user selections
-def filter_data(df, selected_work_type, selected_smoking_status, selected_age_range, selected_gender):
-    filtered_data = df[(df['work_type'] == selected_work_type) &
-                       (df['smoking_status'] == selected_smoking_status) &
-                       (df['age'] >= selected_age_range[0]) & (df['age'] <= selected_age_range[1]) &
-                       (df['gender'] == selected_gender)]
-    return filtered_data
+def filter_data(df, selected_work_type, selected_smoking_status, selected_age_range, selected_gender, index=None):
+    if index is None or index.n_rows != len(df):
+        index = CohortIndex(df)
+    selections = {'work_type': selected_work_type, 'smoking_status': selected_smoking_status, 'gender': selected_gender}
+    with tracing.span('filter'):
+        return index.filter(df, selections, selected_age_range)
+
+# Function to count strokes per category once per dataset version
+@st.cache_data
+def get_grouped_counts(_df, dataset_version, categorical_feature):
+    return grouped_counts(_df["stroke"], _df[categorical_feature])
+
+# Function to sort a numerical column per group once per dataset version
+@st.cache_resource
+def get_sorted_groups(_df, dataset_version, numerical_feature, group_feature):
+    return SortedGroups(_df[numerical_feature], _df[group_feature])
 
 # Function to create bar plots of categorical features by diagnosis
-def create_bar_plot(df, categorical_feature):
-    fig = px.histogram(df, x="stroke", color=categorical_feature, barmode='group')
+def create_bar_plot(df, categorical_feature, dataset_version=None):
+    if dataset_version is None:
+        counts = grouped_counts(df["stroke"], df[categorical_feature])
+    else:
+        counts = get_grouped_counts(df, dataset_version, categorical_feature)
+    fig = bar_figure(*counts, x_title="stroke", legend_title=categorical_feature)
     return fig
 
 # Function to create violin plots of numerical features by diagnosis
-def create_violin_plot(df, numerical_feature):
-    fig = px.violin(df, x="stroke", y=numerical_feature, box=True, hover_data=df.columns)
+def create_violin_plot(df, numerical_feature, dataset_version=None):
+    if dataset_version is None:
+        groups = SortedGroups(df[numerical_feature], df["stroke"])
+    else:
+        groups = get_sorted_groups(df, dataset_version, numerical_feature, "stroke")
+    fig = violin_figure(groups, numerical_feature, x_title="stroke")
     return fig
 
+# Function to pick the rows drawn in scatter views, keeping stroke cases and outliers
+@st.cache_data
+def get_reduced_rows(_df, dataset_version, columns, grid=128, per_cell=8):
+    return reduce_points(_df[list(columns)].to_numpy(), _df["stroke"].to_numpy() == 1, grid=grid, per_cell=per_cell)
+
+# Function to compute per-group trendline statistics once per dataset version
+@st.cache_data
+def get_line_stats(_df, dataset_version, x_feature, y_feature, hue_feature):
+    return group_line_stats(_df[x_feature], _df[y_feature], _df[hue_feature])
+
+@st.cache_data
+def get_density_grid(_df, dataset_version, x_feature, y_feature):
+    return density_grid(_df[x_feature], _df[y_feature])
+
 # Function to create scatter plots with correlation analysis
-def create_scatterplot_with_correlation(df, x_feature, y_feature, hue_feature):
-    fig = px.scatter(df, x=x_feature, y=y_feature, color=hue_feature, trendline="ols")
+def create_scatterplot_with_correlation(df, x_feature, y_feature, hue_feature, dataset_version=None):
+    if dataset_version is None:
+        rows = reduce_points(df[[x_feature, y_feature]].to_numpy(), df["stroke"].to_numpy() == 1)
+        line_stats = group_line_stats(df[x_feature], df[y_feature], df[hue_feature])
+    else:
+        rows = get_reduced_rows(df, dataset_version, (x_feature, y_feature))
+        line_stats = get_line_stats(df, dataset_version, x_feature, y_feature, hue_feature)
+    shown = df.iloc[rows]
+    fig = scatter_figure(shown[x_feature], shown[y_feature], shown[hue_feature], line_stats, x_feature, y_feature, hue_feature)
     return fig
 
+# Function to keep streaming correlation statistics per (stroke, gender) partition
+@st.cache_resource
+def get_moment_stats(_df, dataset_version):
+    numerical_features = _df.select_dtypes(include=[np.floating]).columns
+    return PartitionedMoments.from_frame(_df, numerical_features, ['stroke', 'gender'])
+
 # Function to create a correlation matrix
-def create_correlation_matrix(df, corr_range):
-    numerical_features = df.select_dtypes(include=['float64']).columns
-    selected_corr_data = df[numerical_features].corr()
+# With cached statistics only the cohort merge and the range mask run on a rerun.
+def create_correlation_matrix(df, corr_range, moment_stats=None, cohort=None):
+    if moment_stats is None:
+        numerical_features = df.select_dtypes(include=[np.floating]).columns
+        moment_stats = PartitionedMoments.from_frame(df, numerical_features, [])
+    selected_corr_data = moment_stats.correlation(cohort)
     selected_corr_data = selected_corr_data[(selected_corr_data >= corr_range[0]) & (selected_corr_data <= corr_range[1])]
     return selected_corr_data
 
-# Plots for the models
-def calculate_metrics_and_plots(model,train_X, train_y, test_X, test_y):
-    # Train the classifier
-    model.fit(train_X, train_y)
-
-    # Predict on the test set
-    y_pred_model = model.predict(test_X)
-
-    # Calculate metrics
-    ac = accuracy_score(test_y, y_pred_model)
-    rc = roc_auc_score(test_y, y_pred_model)
-    prec = precision_score(test_y, y_pred_model)
-    rec = recall_score(test_y, y_pred_model)
-    f1 = f1_score(test_y, y_pred_model)
-
-    # Confusion Matrix
-    cm = confusion_matrix(test_y, y_pred_model)
-
-    # ROC Curve
-    fpr, tpr, _ = roc_curve(test_y, model.predict_proba(test_X)[:, 1])
-    roc_auc = auc(fpr, tpr)
-
-    # Precision-Recall Curve
-    precision, recall, _ = precision_recall_curve(test_y, model.predict_proba(test_X)[:, 1])
-    pr_auc = auc(recall, precision)
-
-    # Create Plots
-    # Confusion Matrix Heatmap
-    fig_cm = go.Figure()
-    fig_cm.add_trace(go.Heatmap(z=cm[::-1], x=['Predicted 0', 'Predicted 1'], y=['Actual 1', 'Actual 0'],
-                                colorscale='Viridis', showscale=False))
-    fig_cm.update_layout(title='Confusion Matrix', xaxis=dict(title='Predicted Class'), yaxis=dict(title='Actual Class'))
-
-    # ROC Curve
-    fig_roc = go.Figure()
-    fig_roc.add_trace(go.Scatter(x=fpr, y=tpr, mode='lines', name='ROC curve (AUC={:.2f})'.format(roc_auc)))
-    fig_roc.update_layout(title='Receiver Operating Characteristic (ROC) Curve',
-                          xaxis=dict(title='False Positive Rate'),
-                          yaxis=dict(title='True Positive Rate'),
-                          showlegend=True)
-
-    # Precision-Recall Curve
-    fig_pr = go.Figure()
-    fig_pr.add_trace(go.Scatter(x=recall, y=precision, mode='lines', name='Precision-Recall curve (AUC={:.2f})'.format(pr_auc)))
-    fig_pr.update_layout(title='Precision-Recall Curve',
-                         xaxis=dict(title='Recall'),
-                         yaxis=dict(title='Precision'),
-                         showlegend=True)
-
-    # Metrics Bar Graph
-    metrics_labels = ['Accuracy', 'ROC AUC', 'Precision', 'Recall', 'F1-Score']
-    metrics_values = [ac, rc, prec, rec, f1]
-
-    fig_metrics = go.Figure()
-    fig_metrics.add_trace(go.Bar(x=metrics_labels, y=metrics_values, name='Metrics'))
-    fig_metrics.update_layout(barmode='group', xaxis=dict(title='Metrics'), yaxis=dict(title='Value'))
-
-    return fig_cm, fig_roc, fig_pr, fig_metrics
+# Dataset labels for the Prediction tab choices
+# Load the persisted feature schema shared by training and every inference path
+@st.cache_resource
+def load_feature_schema():
+    return load_schema()
+
+# Function to show a dataset label such as 'Self-employed' or 'never smoked' in the form
+def format_label(label):
+    return label.replace('_', ' ').replace('-', ' ').capitalize()
+
+# Function to build a radio whose options are the labels of a categorical feature
+def schema_radio(question, feature, default=None):
+    options = load_feature_schema().classes[feature]
+    index = options.index(default) if default in options else 0
+    return st.radio(question, options, index=index, format_func=format_label)
+
+# Number of HiPlot pages kept in memory; the least recently used one is dropped first
+HIPLOT_CACHE_ENTRIES = 16
+# Default number of rows drawn when HiPlot sampling is enabled
+HIPLOT_SAMPLE_ROWS = 2000
+
+# Function to build the HiPlot page in memory for a column selection
+# Rows are optionally reduced to a sample stratified by stroke.
+@st.cache_data(max_entries=HIPLOT_CACHE_ENTRIES, show_spinner="Rendering HiPlot...")
+def render_hiplot_html(_df, dataset_version, columns, max_rows=None):
+    with tracing.span('hiplot.render') as render_span:
+        rows = np.arange(len(_df)) if max_rows is None else stratified_sample(_df["stroke"], max_rows)
+        experiment = hip.Experiment.from_dataframe(_df.iloc[rows][list(columns)])
+        html = experiment.to_html()
+    return html, len(rows), render_span.seconds
+
+# Worker pools started from the app spawn fresh interpreters: forking Streamlit's
+# multithreaded server can leave a child blocked on a lock another thread held
+def worker_context():
+    return multiprocessing.get_context('spawn')
+
+# Function to fit and score a registered model once per preprocessed data version
+@st.cache_resource(max_entries=16)
+def get_evaluation(_model_data, model_data_version, model_name):
+    return evaluation.evaluate_registered(model_name, _model_data)
+
+# Function to compute feature importance once per model and preprocessed data version
+# (the results are also artifacts on disk, so other processes load them)
+@st.cache_data(max_entries=32, show_spinner="Computing permutation importance...")
+def get_feature_importance(_model, _X, _y, feature_names, model_data_version, model_name, max_rows):
+    return importance.feature_importance(_model, _X, _y, list(feature_names), max_rows=max_rows,
+                                         mp_context=worker_context())
+
+MODEL_BUNDLE_PATH = os.path.join('models', 'xgboost_tuned')
+MODEL_PATH = 'XGBoostTunedModel.pkl'
+
+# Load the tuned model once per process, compiled to NumPy arrays for fast single-row scoring
+# Returns (model, feature schema, model version). The model bundle brings its own
+# encoders; the joblib pickle is the fallback when no bundle was exported.
+@st.cache_resource
+def load_trained_model(bundle_path, model_path):
+    if model_bundle.is_bundle(bundle_path):
+        bundle = model_bundle.get_bundle(bundle_path)
+        return bundle.compiled, bundle.schema, bundle.version
+    return tree_engine.load_compiled(model_path), load_feature_schema(), model_path
+
+# Score the held-out real patients (split before any SMOTE) once per model and dataset version;
+# the prediction threshold then only reads the sweep
+@st.cache_resource(max_entries=4)
+def get_prediction_sweep(_model, _schema, model_version, dataset_version):
+    _, holdout, _ = preprocessing.holdout_stage(stroke_data.imputed, ArtifactStore(), schema=_schema)
+    return thresholds.ThresholdSweep(holdout['y_test'], _model.predict_proba(holdout['X_test'])[:, 1])
 
 # Apply styling
 st.set_page_config(
@@ -152,10 +224,14 @@ st.set_page_config(
 # Set the title and description of the app
 st.write('<h2 style="text-align:center; vertical-align:middle; line-height:2; color:#046366;">Predicting Strokes: Insights from the Data</h2>', unsafe_allow_html=True)
 
-# Create tabs
-tab1, tab2, tab3, tab4, tab5, tab6, tab7= st.tabs(["About the Data", "Visualizations", "Playground", "Method Assessment", "Prediciton", "Conclusion", "About Me"])
+# Section navigation is drawn here; the sections below only run when selected
+navigation = st.container()
+
+# Sections of the page, registered in navigation order
+router = SectionRouter()
 
-with tab1 :
+@router.section("About the Data")
+def show_about_data():
     image_path = "bg.png"  # Replace with the actual file path
 
     # Check if the image file exists at the specified path
@@ -188,28 +264,35 @@ with tab1 :
     with checks[0]:
         with st.expander("Show Raw Data"):
             # if st.checkbox('Show Raw Data'):
-            st.write(pd.DataFrame(df, columns=df.columns))
+            st.write(pd.DataFrame(raw_df, columns=raw_df.columns))
             st.write('Stroke Prediction Dataset Information:')
-            st.write(f'Total Number of Samples: {df.shape[0]}')
-            st.write(f'Number of Features: {df.shape[1]}')
+            st.write(f'Total Number of Samples: {raw_df.shape[0]}')
+            st.write(f'Number of Features: {raw_df.shape[1]}')
 
     with checks[1]:
         with st.expander("Show Statistics about Data"):
-            st.write(df.describe())
+            st.write(raw_df.describe())
             st.write('Stroke Prediction Dataset Information:')
-            st.write(f'Total Number of Samples: {df.shape[0]}')
-            st.write(f'Number of Features: {df.shape[1]}')
+            st.write(f'Total Number of Samples: {raw_df.shape[0]}')
+            st.write(f'Number of Features: {raw_df.shape[1]}')
+            st.caption('Dataset loaded from the {} cache in {:.1f} ms'.format(stroke_data.load_info['mode'], stroke_data.load_info['seconds'] * 1000))
+            memory = stroke_data.memory_report()
+            process = dataset.process_memory()
+            st.caption('Memory: {:.0f} KB for the raw, imputed and encoded views together ({:.0f} KB as object strings), '
+                       'shared by every session; this session holds {:.0f} KB; process peak {}'.format(
+                           memory['unique_bytes'] / 1024, memory['object_bytes'] / 1024,
+                           dataset.session_bytes(st.session_state.to_dict().values()) / 1024,
+                           '{:.0f} MB'.format(process['peak_rss'] / 2 ** 20) if process['peak_rss'] else 'n/a'))
 
     st.write('To explore the data further we will take a look into interactive plots and visualizations in the next tabs')
         
 
 
-with tab2 :
+@router.section("Visualizations")
+def show_visualizations():
     st.sidebar.title('Welcome to the data exploration section')
     st.header("What factors are causing a Stroke ?")
 
-    replace_missing_with_median(df)
-
     # Sidebar inputs
     st.sidebar.subheader('Use filters to uncover insights')
     selected_work_type = st.sidebar.selectbox('Work Type', df['work_type'].unique())
@@ -218,10 +301,12 @@ with tab2 :
     selected_gender = st.sidebar.selectbox('Gender', df['gender'].unique())
 
     # Apply filters and store filtered data
-    filtered_data = filter_data(df, selected_work_type, selected_smoking_status, selected_age_range, selected_gender)
+    cohort_index = get_cohort_index(df, stroke_data.version)
+    filtered_data = filter_data(df, selected_work_type, selected_smoking_status, selected_age_range, selected_gender, cohort_index)
 
     # Display filtered data
     st.sidebar.subheader('Filtered Data')
+    st.sidebar.caption('{} of {} patients match the filters'.format(len(filtered_data), len(df)))
     st.sidebar.dataframe(filtered_data)
 
     if st.checkbox('Examining stroke trends by lifestyle category'):
@@ -233,7 +318,7 @@ with tab2 :
         # Create bar plot
         categorical_variables = ['gender', 'hypertension', 'heart_disease', 'ever_married', 'work_type', 'Residence_type', 'smoking_status']
         bar_x = st.selectbox('Select a category', categorical_variables)
-        bar_plot = create_bar_plot(df, bar_x)
+        bar_plot = create_bar_plot(df, bar_x, dataset_version)
         st.plotly_chart(bar_plot)
 
         # Description for bar graph
@@ -264,8 +349,8 @@ with tab2 :
         st.markdown("You can pick different factors like age, average glucose level, and BMI. The violin graph here shows a picture of how these numbers are spread out among people who had a stroke and people who didn't. It helps us compare and see the differences in these factors between the two groups. It's like a visual tool to understand how these numbers affect the chances of having a stroke.")
 
         # Create violin plot
-        violin_y = st.selectbox('Select a category', df.select_dtypes(include=['float64']).columns)
-        violin_plot = create_violin_plot(df, violin_y)
+        violin_y = st.selectbox('Select a category', df.select_dtypes(include=[np.floating]).columns)
+        violin_plot = create_violin_plot(df, violin_y, dataset_version)
         st.plotly_chart(violin_plot)
 
         # Description for violin graph
@@ -286,14 +371,14 @@ with tab2 :
         st.write(" Imagine the bars as groups, each with a different color. These bars show how often something happened, like a stroke, and how it's related to something else, like a age. The taller the bars, the more it happened, and you can point your mouse at them to see the exact numbers. When the bars overlap, like they're close together, it means these things are connected. If one group's bars are mostly on one side and another group's bars are on the other side, it means they're different in some way. It's like they're sharing a secret!")
         col1,col2=st.columns(2,gap='small')
         st.subheader('Select a feature for the histogram:')
-        selected_feature = st.selectbox('Select a feature', df.select_dtypes(include=['float64']).columns)
+        selected_feature = st.selectbox('Select a feature', df.select_dtypes(include=[np.floating]).columns)
         gender_format = 'gender'
         bin_count = st.slider('Number of Bins', min_value=1, max_value=100, value=20)
 
         st.subheader(f'Histogram of {selected_feature}')
 
-        # Create an interactive histogram using Plotly Express
-        fig = px.histogram(df, x=selected_feature, color=gender_format, nbins=bin_count)
+        # Create an interactive histogram from counts binned on the server (re-binning reuses the sorted column)
+        fig = histogram_figure(get_sorted_groups(df, dataset_version, selected_feature, gender_format), bin_count, selected_feature, gender_format)
         fig.update_xaxes(title_text=selected_feature)
         fig.update_yaxes(title_text='Count')
         fig.update_traces(marker=dict(line=dict(width=2)))
@@ -313,8 +398,8 @@ with tab2 :
 
         col3, col4, col5 = st.columns(3,gap='large')
 
-        numerical = df.select_dtypes(include=['float64']).columns;
-        categorical = df.select_dtypes(include=['object']).columns;
+        numerical = df.select_dtypes(include=[np.floating]).columns;
+        categorical = df.select_dtypes(include=['category']).columns;
         with col3:
             alt_x = st.selectbox("Select a feature for (X)?", numerical)
         with col4:
@@ -322,8 +407,16 @@ with tab2 :
         with col5:
             cat_hue = st.selectbox("Choose target", categorical)
 
+        scatter_mode = st.radio("Rendering", ("Points (dense regions thinned)", "Density raster"), horizontal=True)
+
         if alt_x and alt_y and cat_hue:
-            fig3 = px.scatter(df, alt_x, alt_y, color=cat_hue, trendline="ols")
+            # Trendlines come from cached closed-form statistics; dense regions are thinned or rasterized
+            if scatter_mode == "Density raster":
+                line_stats = get_line_stats(df, dataset_version, alt_x, alt_y, cat_hue)
+                fig3 = density_figure(*get_density_grid(df, dataset_version, alt_x, alt_y), line_stats, alt_x, alt_y, cat_hue)
+            else:
+                fig3 = create_scatterplot_with_correlation(df, alt_x, alt_y, cat_hue, dataset_version)
+                st.caption("Showing {} of {} points; every stroke case and outlier is kept".format(len(get_reduced_rows(df, dataset_version, (alt_x, alt_y))), len(df)))
             fig3.update_layout({
             'plot_bgcolor': 'rgba(0, 0, 0, 0)',
             'paper_bgcolor': 'rgba(0, 0, 0, 0)',
@@ -353,8 +446,10 @@ with tab2 :
 
         with st.form("key2"):
             corr_range = st.slider("Select correlation magnitude range", value=[-1.0, 1.0], step=0.05)
+            corr_cohort = st.selectbox("Patients", ("All patients", "Stroke", "No stroke"))
 
-            correlation_data = create_correlation_matrix(df, corr_range)
+            correlation_data = create_correlation_matrix(df, corr_range, get_moment_stats(df, dataset_version),
+                                                         {"All patients": None, "Stroke": {'stroke': 1}, "No stroke": {'stroke': 0}}[corr_cohort])
 
             st.write("Correlation Matrix:")
             st.dataframe(correlation_data, width=800, height=150)
@@ -367,9 +462,10 @@ with tab2 :
             st.subheader("Correlation Matrix Heatmap")
             st.markdown("The correlation matrix heatmap provides an overview of the relationships between numerical features. Strong correlations are shown in warmer (reddish) or cooler (bluish) colors.")
 
-            fig_corr = px.imshow(correlation_data,
-                                color_continuous_scale="RdBu_r",
-                                title="Correlation Matrix Heatmap")
+            with tracing.span('figure.heatmap'):
+                fig_corr = px.imshow(correlation_data,
+                                    color_continuous_scale="RdBu_r",
+                                    title="Correlation Matrix Heatmap")
             fig_corr.update_layout(width=800, height=600)
             st.plotly_chart(fig_corr)
 
@@ -380,10 +476,11 @@ with tab2 :
         st.header('3D Scatter Plot')
         st.write(" The 3D scatter plot provides a three-dimensional view of how age, avg_glucose_level, and bmi interact with each other with respect to the stroke status. The points are colored based on whether a patient had a stroke (red) or not (blue).")
        
-        # Create a color map for the 'stroke' variable
-        colors = df['stroke'].map({0: 'blue', 1: 'red'})
-
-        fig = px.scatter_3d(df, x='age', y='avg_glucose_level', z='bmi', color='stroke',color_continuous_scale=["blue", "red"],labels={'age': 'Age', 'avg_glucose_level': 'Average Glucose Level', 'bmi': 'BMI', 'stroke': 'Stroke'})
+        # Thin dense regions on a coarse 3D grid, keeping every stroke case and outlier
+        shown_3d = df.iloc[get_reduced_rows(df, dataset_version, ('age', 'avg_glucose_level', 'bmi'), grid=32, per_cell=4)]
+        st.caption("Showing {} of {} patients".format(len(shown_3d), len(df)))
+        with tracing.span('figure.scatter_3d'):
+            fig = px.scatter_3d(shown_3d, x='age', y='avg_glucose_level', z='bmi', color='stroke',color_continuous_scale=["blue", "red"],labels={'age': 'Age', 'avg_glucose_level': 'Average Glucose Level', 'bmi': 'BMI', 'stroke': 'Stroke'})
 
         fig.update_layout(scene=dict(xaxis_title='Age', yaxis_title='Average Glucose Level', zaxis_title='BMI'),title='Age, Average Glucose Level, BMI vs. Stroke')
         # Display the interactive 3D scatter plot
@@ -394,19 +491,23 @@ with tab2 :
         st.markdown("2. BMI does not appear to differentiate stroke patients from non-stroke patients as there is significant overlap in the BMI values of both groups.")
 
 
-with tab3 :
+@router.section("Playground")
+def show_playground():
     #visualization with HiPlot
-    def save_hiplot_to_html(exp):
-        output_file = "hiplot_plot_1.html"
-        exp.to_html(output_file)
-        return output_file
     st.write("Visualization with HiPlot")
     selected_columns = st.multiselect("Select columns to visualize", df.columns)
-    selected_data = df[selected_columns]
-    if not selected_data.empty:
-        experiment = hip.Experiment.from_dataframe(selected_data)
-        hiplot_html_file = save_hiplot_to_html(experiment)
-        st.components.v1.html(open(hiplot_html_file, 'r').read(), height=1500, scrolling=True)
+    sample_rows = st.checkbox("Sample rows (stratified by stroke)", value=len(df) > HIPLOT_SAMPLE_ROWS)
+    max_rows = None
+    if sample_rows:
+        max_rows = st.slider("Rows to draw", min_value=min(100, len(df)), max_value=len(df),
+                             value=min(HIPLOT_SAMPLE_ROWS, len(df)), step=100)
+    if selected_columns:
+        with tracing.span('hiplot') as serve_span:
+            hiplot_html, drawn_rows, render_seconds = render_hiplot_html(df, dataset_version, tuple(selected_columns), max_rows)
+        served_seconds = serve_span.seconds
+        st.caption("HiPlot of {} of {} rows: rendered in {:.0f} ms, served in {:.1f} ms, {:.0f} KB of HTML".format(
+            drawn_rows, len(df), render_seconds * 1000, served_seconds * 1000, len(hiplot_html.encode('utf-8')) / 1024))
+        st.components.v1.html(hiplot_html, height=1500, scrolling=True)
     else:
         st.write("No data selected. Please choose at least one column to visualize.")
 
@@ -421,146 +522,42 @@ with tab3 :
     st.markdown("5. It was observed that older patients, particularly those who are self-employed or in private jobs, have a higher incidence of stroke. Also, stroke patients generally have higher glucose levels regardless of their work type and gender.")
     st.markdown("6. The EDA provided valuable insights into the factors associated with strokes. Age, hypertension, heart disease, and average glucose level appear to be significant factors, while BMI might not be a significant predictor. This information can guide the feature selection and modeling process. However, the imbalance in the target variable could present a challenge in building a predictive model.")
 
-with tab4 :
-        label_gender = LabelEncoder()
-        label_married = LabelEncoder()
-        label_work = LabelEncoder()
-        label_residence = LabelEncoder()
-        label_smoking = LabelEncoder()
-        df['gender'] = label_gender.fit_transform(df['gender'])
-        df['ever_married'] = label_married.fit_transform(df['ever_married'])
-        df['work_type']= label_work.fit_transform(df['work_type'])
-        df['Residence_type']= label_residence.fit_transform(df['Residence_type'])
-        df['smoking_status']= label_smoking.fit_transform(df['smoking_status'])
-         #Handling Imbalanced Class Data Using SMOTE Technique
-        smote = SMOTE(sampling_strategy='minority')
-        X, y= smote.fit_resample(df.loc[:,df.columns!='stroke'], df['stroke'])
-        #Building Data Model and Training
-        X_train,X_test,y_train,y_test=train_test_split(X,y,test_size=0.22,random_state=42)
-
-        #Data Standardization
-        scaler = StandardScaler()
-        scaler = scaler.fit(X_train)
-        X_train_std = scaler.transform(X_train)
-        X_test_std = scaler.transform(X_test)
+@router.section("Method Assessment")
+def show_method_assessment():
+        # Encoding, SMOTE, split and scaling are cached as artifacts keyed by their inputs
+        artifact_store = ArtifactStore()
+        with tracing.span('preprocess'):
+            model_data = preprocessing.prepare_model_data(stroke_data.imputed, artifact_store, schema=load_feature_schema())
+        X_train, X_test, y_train, y_test = model_data.X_train, model_data.X_test, model_data.y_train, model_data.y_test
+        X_train_std, X_test_std = model_data.X_train_std, model_data.X_test_std
+        # The scale stage key covers every earlier stage
+        model_data_version = artifact_store.log[-1]['key']
+        st.caption("Preprocessing: " + ", ".join("{} {} {:.1f} ms".format(entry['stage'], entry['status'], entry['seconds'] * 1000) for entry in artifact_store.log))
 
         #ML Model Training and Evaluation
-        model_menu = ["XGBoost (XGB) with HyperTuned Parameters","XGBoost (XGB)","Random Forest (RF)","Logistic Regression (LR)","Decision Tree (DT)","Gaussian Naive Bayes (GNB)","Singular Vector Machine (SVM)"]
-        model = st.selectbox("Select a Model",model_menu)
-        #XGBoost
-        if model == "XGBoost (XGB)":
-            start = timer.time()
-            xgb_m = XGBClassifier(objective="reg:logistic", random_state=42,use_label_encoder = False)
-            xgb_m.fit(X_train, y_train)
-            end = timer.time()
-            st.success("Training time {:.2f} seconds".format(end-start))
-            # Predicting test data
-            y_xgb = xgb_m.predict(X_test)
-            cnf_matrix = metrics.confusion_matrix(y_test, y_xgb)
-            st.write("Accuracy:",metrics.accuracy_score(y_test, y_xgb))
-            st.write("Precision:",metrics.precision_score(y_test, y_xgb))
-            st.write("Recall:",metrics.recall_score(y_test, y_xgb))
-            st.write("F1:",metrics.f1_score(y_test, y_xgb))
-
-
-            # Calculate metrics and create plots
-            fig_cm, fig_roc, fig_pr, fig_metrics = calculate_metrics_and_plots(XGBClassifier(), X_train, y_train, X_test, y_test)
-
-            # Display Plots
-            st.subheader("Confusion Matrix")
-            st.plotly_chart(fig_cm)
-
-            st.subheader("ROC Curve")
-            st.plotly_chart(fig_roc)
-
-            st.subheader("Precision-Recall Curve")
-            st.plotly_chart(fig_pr)
-
-            st.subheader("Metrics Bar Graph")
-            st.plotly_chart(fig_metrics)
-
-
-        #XGBoost with HyperTuned Parameter
-        elif model == "XGBoost (XGB) with HyperTuned Parameters":
-            start = timer.time()
-            xgb_mt = XGBClassifier(objective="reg:logistic", random_state=42,
-                                use_label_encoder = False, colsample_bytree= 0.5, 
-                                gamma= 0.2, learning_rate= 0.25,
-                                max_depth= 10, min_child_weight= 1,)
-            xgb_mt.fit(X_train, y_train)
-            end = timer.time()
-            st.success("Training time {:.2f} seconds".format(end-start))
-            # Predicting test data
-            y_xgb = xgb_mt.predict(X_test)
-            y_train_predict = xgb_mt.predict(X_train)
-            cnf_matrix = metrics.confusion_matrix(y_train , y_train_predict)
-            st.write('Train Accuracy',accuracy_score(y_train , y_train_predict))
-            st.write("Accuracy:",metrics.accuracy_score(y_test, y_xgb))
-            st.write("Precision:",metrics.precision_score(y_test, y_xgb))
-            st.write("Recall:",metrics.recall_score(y_test, y_xgb))
-            st.write("F1:",metrics.f1_score(y_test, y_xgb))
-
-            # Calculate metrics and create plots
-            fig_cm, fig_roc, fig_pr, fig_metrics = calculate_metrics_and_plots(XGBClassifier(), X_train, y_train, X_test, y_test)
-
-            # Display Plots
-            st.subheader("Confusion Matrix")
-            st.plotly_chart(fig_cm)
-
-            st.subheader("ROC Curve")
-            st.plotly_chart(fig_roc)
-
-            st.subheader("Precision-Recall Curve")
-            st.plotly_chart(fig_pr)
-
-            st.subheader("Metrics Bar Graph")
-            st.plotly_chart(fig_metrics)
-        # Random Forest
-        elif model == "Random Forest (RF)":
-            start = timer.time()
-            ranfor_m = RandomForestClassifier(n_estimators=100, random_state=42)
-            ranfor_m.fit(X_train, y_train)
-            end = timer.time()
-            st.success("Training time {:.2f} seconds".format(end-start))
-            # Predicting test data
-            y_ranfor = ranfor_m.predict(X_test)
-            cnf_matrix = metrics.confusion_matrix(y_test, y_ranfor)
-            st.write("Accuracy:",metrics.accuracy_score(y_test, y_ranfor))
-            st.write("Precision:",metrics.precision_score(y_test, y_ranfor))
-            st.write("Recall:",metrics.recall_score(y_test, y_ranfor))
-            st.write("F1:",metrics.f1_score(y_test, y_ranfor))
-
-            # Calculate metrics and create plots
-            fig_cm, fig_roc, fig_pr, fig_metrics = calculate_metrics_and_plots(RandomForestClassifier(), X_train, y_train, X_test, y_test)
-
-            # Display Plots
-            st.subheader("Confusion Matrix")
-            st.plotly_chart(fig_cm)
-
-            st.subheader("ROC Curve")
-            st.plotly_chart(fig_roc)
-
-            st.subheader("Precision-Recall Curve")
-            st.plotly_chart(fig_pr)
-
-            st.subheader("Metrics Bar Graph")
-            st.plotly_chart(fig_metrics)
-        # Decision Tree
-        elif model == "Decision Tree (DT)":
-            start = timer.time()
-            dtree_m = DecisionTreeClassifier(random_state=42)
-            dtree_m.fit(X_train, y_train)
-            end = timer.time()
-            st.success("Training time {:.2f} seconds".format(end-start))
-            # Predicting test data
-            y_dtree = dtree_m.predict(X_test)
-            cnf_matrix = metrics.confusion_matrix(y_test, y_dtree)
-            st.write("Accuracy:",metrics.accuracy_score(y_test, y_dtree))
-            st.write("Precision:",metrics.precision_score(y_test, y_dtree))
-            st.write("Recall:",metrics.recall_score(y_test, y_dtree))
-            st.write("F1:",metrics.f1_score(y_test, y_dtree))
-            # Calculate metrics and create plots
-            fig_cm, fig_roc, fig_pr, fig_metrics = calculate_metrics_and_plots(DecisionTreeClassifier(), X_train, y_train, X_test, y_test)
+        assessment_mode = st.radio("Assessment mode", ("Single model", "Leaderboard (train all models in parallel)", "Cross-validation (SMOTE inside each fold)"), horizontal=True)
+        if assessment_mode == "Single model":
+            model_menu = list(evaluation.MODEL_REGISTRY)
+            model = st.selectbox("Select a Model",model_menu)
+
+            # Fit once per preprocessed data version and derive every metric and curve from the same predictions
+            result = get_evaluation(model_data, model_data_version, model)
+            st.success("Training time {:.2f} seconds".format(result['fit_seconds']))
+
+            # Moving the threshold reads the cached sweep of the test scores; the model is not scored again
+            threshold = st.slider("Decision threshold", min_value=0.01, max_value=0.99, value=0.5, step=0.01, key="assessment_threshold")
+            result = evaluation.at_threshold(result, threshold)
+            st.caption("At threshold {:.2f}, {:.1%} of the (resampled) test rows are predicted to have a stroke. F1 is highest at threshold {:.2f}.".format(
+                threshold, result['flagged'], result['sweep'].best_threshold('f1')))
+            if 'train_accuracy' in result:
+                st.write('Train Accuracy',result['train_accuracy'])
+            st.write("Accuracy:",result['accuracy'])
+            st.write("Precision:",result['precision'])
+            st.write("Recall:",result['recall'])
+            st.write("F1:",result['f1'])
+
+            # Create plots
+            fig_cm, fig_roc, fig_pr, fig_metrics = evaluation.calculate_metrics_and_plots(result)
 
             # Display Plots
             st.subheader("Confusion Matrix")
@@ -572,112 +569,74 @@ with tab4 :
             st.subheader("Precision-Recall Curve")
             st.plotly_chart(fig_pr)
 
-            st.subheader("Metrics Bar Graph")
-            st.plotly_chart(fig_metrics)
-        # Logistic Regression
-        elif model == "Logistic Regression (LR)":
-            start = timer.time()
-            logit_m = LogisticRegression(solver='lbfgs', random_state=42)
-            logit_m.fit(X_train_std,y_train)
-            end = timer.time()
-            st.success("Training time {:.2f} seconds".format(end-start))
-            # Predicting test data
-            y_pred = logit_m.predict(X_test_std)
-            cnf_matrix = metrics.confusion_matrix(y_test, y_pred)
-            st.write("Accuracy:",metrics.accuracy_score(y_test, y_pred))
-            st.write("Precision:",metrics.precision_score(y_test, y_pred))
-            st.write("Recall:",metrics.recall_score(y_test, y_pred))
-            st.write("F1:",metrics.f1_score(y_test, y_pred))
-            # Calculate metrics and create plots
-            fig_cm, fig_roc, fig_pr, fig_metrics = calculate_metrics_and_plots(LogisticRegression(), X_train, y_train, X_test, y_test)
-
-            # Display Plots
-            st.subheader("Confusion Matrix")
-            st.plotly_chart(fig_cm)
-
-            st.subheader("ROC Curve")
-            st.plotly_chart(fig_roc)
-
-            st.subheader("Precision-Recall Curve")
-            st.plotly_chart(fig_pr)
+            st.subheader("Metrics by Decision Threshold")
+            st.plotly_chart(thresholds.sweep_figure(result['sweep'], threshold))
 
             st.subheader("Metrics Bar Graph")
             st.plotly_chart(fig_metrics)
-        # Gaussian Naive Bayes
-        elif model == "Gaussian Naive Bayes (GNB)":
-            start = timer.time()
-            gnb_m = GaussianNB()
-            gnb_m.fit(X_train, y_train)
-            end = timer.time()
-            st.success("Training time {:.2f} seconds".format(end-start))
-            # Predicting test data
-            y_gnb = gnb_m.predict(X_test)
-            cnf_matrix = metrics.confusion_matrix(y_test, y_gnb)
-            st.write("Accuracy:",metrics.accuracy_score(y_test, y_gnb))
-            st.write("Precision:",metrics.precision_score(y_test, y_gnb))
-            st.write("Recall:",metrics.recall_score(y_test, y_gnb))
-            st.write("F1:",metrics.f1_score(y_test, y_gnb))
-            # Calculate metrics and create plots
-            fig_cm, fig_roc, fig_pr, fig_metrics = calculate_metrics_and_plots(GaussianNB(), X_train, y_train, X_test, y_test)
-
-            # Display Plots
-            st.subheader("Confusion Matrix")
-            st.plotly_chart(fig_cm)
 
-            st.subheader("ROC Curve")
-            st.plotly_chart(fig_roc)
-
-            st.subheader("Precision-Recall Curve")
-            st.plotly_chart(fig_pr)
-
-            st.subheader("Metrics Bar Graph")
-            st.plotly_chart(fig_metrics)
-        # Singular Vector Machine
-        elif model == "Singular Vector Machine (SVM)":
-            start = timer.time()
-            svm_m = SVC(kernel='rbf',probability=True)
-            svm_m.fit(X_train_std, y_train)
-            end = timer.time()
-            st.success("Training time {:.2f} seconds".format(end-start))
-            # Predicting test data
-            y_svm = svm_m.predict(X_test_std)
-            cnf_matrix = metrics.confusion_matrix(y_test, y_svm)
-            st.write("Accuracy:",metrics.accuracy_score(y_test, y_svm))
-            st.write("Precision:",metrics.precision_score(y_test, y_svm))
-            st.write("Recall:",metrics.recall_score(y_test, y_svm))
-            st.write("F1 Score:",metrics.f1_score(y_test, y_svm))
-            # Calculate metrics and create plots
-            fig_cm, fig_roc, fig_pr, fig_metrics = calculate_metrics_and_plots(SVC(kernel='linear'), X_train, y_train, X_test, y_test)
-
-            # Display Plots
-            st.subheader("Confusion Matrix")
-            st.plotly_chart(fig_cm)
-
-            st.subheader("ROC Curve")
-            st.plotly_chart(fig_roc)
-
-            st.subheader("Precision-Recall Curve")
-            st.plotly_chart(fig_pr)
+            st.subheader("Feature Importance")
+            if st.checkbox("Show feature importance (permutation on a stratified test sample)"):
+                model_spec = evaluation.MODEL_REGISTRY[model]
+                test_X = X_test_std if model_spec.scaled else X_test
+                importance_table, importance_info = get_feature_importance(result['model'], test_X, y_test, tuple(model_data.feature_names), model_data_version, model,
+                                                                           model_spec.importance_rows or importance.IMPORTANCE_ROWS)
+                st.caption("ROC AUC drop when a feature is shuffled, on {} test rows x {} repeats (baseline ROC AUC {:.3f}), computed in {:.2f} s".format(
+                    importance_info['rows'], importance_info['n_repeats'], importance_info['baseline_roc_auc'], importance_info['seconds']))
+                importance_columns = st.columns(2)
+                with importance_columns[0]:
+                    st.plotly_chart(importance.importance_figure(importance_table))
+                builtin_figure = importance.builtin_importance_figure(importance_table)
+                if builtin_figure is not None:
+                    with importance_columns[1]:
+                        st.plotly_chart(builtin_figure)
+                st.dataframe(importance_table)
+        elif assessment_mode == "Leaderboard (train all models in parallel)":
+            st.write("All models are trained at the same time on separate CPU cores. Rows appear as each model finishes.")
+            if st.button("Train all models"):
+                leaderboard_rows = []
+                leaderboard_table = st.empty()
+                for row in leaderboard.run_leaderboard(model_data, mp_context=worker_context()):
+                    leaderboard_rows.append(row)
+                    leaderboard_table.dataframe(pd.DataFrame(leaderboard_rows).sort_values('roc_auc', ascending=False).reset_index(drop=True))
+                st.session_state['leaderboard_rows'] = leaderboard_rows
+            elif 'leaderboard_rows' in st.session_state:
+                st.dataframe(pd.DataFrame(st.session_state['leaderboard_rows']).sort_values('roc_auc', ascending=False).reset_index(drop=True))
+        else:
+            st.write("SMOTE and scaling are fitted on the training rows of each fold only, so the held-out rows contain no synthetic patients. Folds run in parallel processes.")
+            cv_estimate = st.radio("Estimate", ("Honest (stratified k-fold)", "Fast (single holdout split)"), horizontal=True)
+            cv_folds = st.slider("Folds", min_value=3, max_value=10, value=5) if cv_estimate.startswith("Honest") else 1
+            cv_models = st.multiselect("Models", list(evaluation.MODEL_REGISTRY), default=list(evaluation.MODEL_REGISTRY))
+            if st.button("Run cross-validation") and cv_models:
+                _, encoded, _ = preprocessing.encode_stage(stroke_data.imputed, artifact_store, load_feature_schema())
+                cv_rows = []
+                cv_table = st.empty()
+                for row in cross_validation.run_cross_validation(encoded['X'], encoded['y'], cv_models, n_splits=cv_folds,
+                                                mode='honest' if cv_folds > 1 else 'fast', mp_context=worker_context()):
+                    cv_rows.append(row)
+                    cv_table.dataframe(pd.DataFrame(cv_rows).sort_values(['model', 'fold']).reset_index(drop=True))
+                st.session_state['cv_rows'] = cv_rows
+            if 'cv_rows' in st.session_state:
+                st.subheader("Mean and standard deviation over the folds")
+                st.dataframe(cross_validation.summarize(st.session_state['cv_rows']))
 
-            st.subheader("Metrics Bar Graph")
-            st.plotly_chart(fig_metrics)
-        
         st.markdown("Conclusion:")
         st.info("XGBoost (with Hyper Tuned Parameters) has been selected as the Best Model due to its High Accuracy compared to other models that has been Trained")
 
-with tab5 :
+@router.section("Prediciton")
+def show_prediction():
 
         st.markdown("Enter the User's Details to predict the occurance of Stroke")
         st.text("Please Enter correct details to get better results")
         
         #Getting User Inputs
-        gender = st.radio("What is User's gender",("Male","Female"))
+        gender = schema_radio("What is User's gender", 'gender', 'Male')
         age = st.number_input("Enter User's age",value=40)
         hypertension = st.radio("Hypertension?",("Yes","No"))
         heart_disease = st.radio("User Ever had a heart disease?",("Yes","No"))
-        ever_married = st.radio("User Ever Married?",("Yes","No"))
-        work_type = st.radio("What is User's work type?",("Government Job","Private Job","Self Employed","Never Worked","Children"))
-        Residence_type = st.radio("What is User's Residence type?",("Urban","Rural"))
+        ever_married = schema_radio("User Ever Married?", 'ever_married', 'Yes')
+        work_type = schema_radio("What is User's work type?", 'work_type', 'Govt_job')
+        Residence_type = schema_radio("What is User's Residence type?", 'Residence_type', 'Urban')
         avg_glucose_level = st.number_input("Enter User's Average Glucose Level",value=92.35)
         
         #BMI Calculation with Height and Weight is User doesn't know BMI
@@ -689,54 +648,52 @@ with tab5 :
         else:
             bmi = st.number_input("Enter User's BMI",value=25.4)
 
-        smoking_status = st.radio("User's Smoking Status?",("Unknown","Formerly Smoked","Never Smoked","Smokes"))
+        smoking_status = schema_radio("User's Smoking Status?", 'smoking_status', 'Unknown')
         
         #model (XGBoost)
         prediction_model = 'XGBoost'
-        trained_model = joblib.load('XGBoostTunedModel.pkl')
-        model_accuracy = "94.9%"
+        prediction_url = os.environ.get('STROKE_PREDICT_URL')
+
+        #Raw record in the dataset's own labels; encoding is shared with training
+        user_record = {
+            'gender': gender,
+            'age': float(age),
+            'hypertension': 1 if hypertension == 'Yes' else 0,
+            'heart_disease': 1 if heart_disease == 'Yes' else 0,
+            'ever_married': ever_married,
+            'work_type': work_type,
+            'Residence_type': Residence_type,
+            'avg_glucose_level': float(avg_glucose_level),
+            'bmi': float(bmi),
+            'smoking_status': smoking_status,
+        }
+
+        #Decision threshold; moving it re-reads the stored probability, nothing is scored again
+        threshold = st.slider("Decision threshold", min_value=0.01, max_value=0.99, value=0.5, step=0.01, key="prediction_threshold",
+                              help="A lower threshold misses fewer strokes but flags more users who will not have one")
 
         if st.button("Submit"):
-            #Encoding categorical attributes to values
-            gender = 1 if gender == 'Male' else 0
-            age = float(age)
-            hypertension = 1 if hypertension == 'Yes' else 0
-            ever_married = 1 if ever_married == 'Yes' else 0
-            heart_disease = 1 if heart_disease == 'Yes' else 0
-            if work_type == 'Government Job':
-                work_type = 0 
-            elif work_type == 'Never Worked':
-                work_type = 1 
-            elif work_type == 'Private Job':
-                work_type = 2 
-            elif work_type == 'Self Employed':
-                work_type = 3
-            elif work_type == 'Children':
-                work_type = 4 
-            Residence_type = 1 if Residence_type == 'Urban' else 0
-            avg_glucose_level = float(avg_glucose_level)
-            bmi = float(bmi)
-            if smoking_status == 'Unknown':
-                smoking_status = 0 
-            elif smoking_status == 'Formerly Smoked':
-                smoking_status = 1 
-            elif smoking_status == 'Never Smoked':
-                smoking_status = 2
-            elif smoking_status == 'Smokes':
-                smoking_status = 3 
-
-            #Creating nparray of User Inputs
-            user_input = np.array([gender,age,hypertension,heart_disease,ever_married,work_type,Residence_type,avg_glucose_level,bmi,smoking_status]).reshape(1,-1)
-            
-            #converting into dataframe to avoid mismatching feature_names error
-            user_input = pd.DataFrame(user_input, columns = ['gender', 'age', 'hypertension', 'heart_disease', 'ever_married', 'work_type', 'Residence_type', 'avg_glucose_level', 'bmi', 'smoking_status'])
-            
-            #prediction using selected model
-            prediction = trained_model.predict(user_input)
-
-            #Prediction Probability
-            pred_prob = trained_model.predict_proba(user_input)
-            stroke_prob = pred_prob[0][1]*100
+            result = None
+            if prediction_url:
+                #Use the micro-batching prediction server when one is configured
+                try:
+                    with tracing.span('predict_remote'):
+                        result = predict_server.predict_remote(prediction_url, [user_record])[0]
+                except (OSError, ValueError, KeyError, IndexError) as error:
+                    st.warning("Prediction server unavailable ({}), predicting in-process".format(error))
+            if result is None:
+                trained_model, model_schema, _ = load_trained_model(MODEL_BUNDLE_PATH, MODEL_PATH)
+                user_input = model_schema.encode(pd.DataFrame([user_record]))
+                with tracing.span('predict_one'):
+                    stroke_probability = trained_model.predict_one(trained_model.as_matrix(user_input)[0])
+                result = {'probability': float(stroke_probability)}
+            st.session_state['prediction_result'] = {'record': user_record, 'probability': result['probability']}
+
+        #The last prediction stays on screen while only the threshold changes
+        stored_prediction = st.session_state.get('prediction_result')
+        if stored_prediction is not None and stored_prediction['record'] == user_record:
+            prediction = int(stored_prediction['probability'] > threshold)
+            stroke_prob = stored_prediction['probability']*100
 
             #Printing Predicted results
             if prediction == 1:
@@ -753,9 +710,16 @@ with tab5 :
                 st.warning("Probability of Occurance of Stroke is {:.2f}%".format(stroke_prob))
             else:
                 st.error("Probability of Occurance of Stroke is {:.2f}%".format(stroke_prob))
-            st.text("Predicted with "+prediction_model+" Model with Accuracy of " +model_accuracy)
 
-with tab6:
+            #Metrics of the model at this threshold on held-out real patients (no synthetic rows)
+            trained_model, model_schema, model_version = load_trained_model(MODEL_BUNDLE_PATH, MODEL_PATH)
+            test_metrics = get_prediction_sweep(trained_model, model_schema, model_version, dataset_version).metrics(threshold)
+            st.text("Predicted with {} Model with Accuracy of {:.1%} at threshold {:.2f}".format(prediction_model, test_metrics['accuracy'], threshold))
+            st.caption("On {} held-out real patients ({} strokes), this threshold finds {:.1%} of the strokes, and {:.1%} of the patients it flags had one.".format(
+                test_metrics['confusion_matrix'].sum(), test_metrics['confusion_matrix'][1].sum(), test_metrics['recall'], test_metrics['precision']))
+
+@router.section("Conclusion")
+def show_conclusion():
     #Conclusion
     st.markdown("Conclusions:")
 
@@ -773,7 +737,8 @@ with tab6:
 
     st.markdown("[Stroke Prediction Dataset](https://www.kaggle.com/fedesoriano/stroke-prediction-dataset)")
 
-with tab7 :
+@router.section("About Me")
+def show_about_me():
 
     image_path = "bio.jpg" 
     image = open(image_path, "rb").read()
@@ -785,3 +750,20 @@ with tab7 :
         st.write("In the halls of MSU, I dive deep into the realms of Python, Data Analysis, and Machine Learning. Learning isn't just a task; it's my enthusiasm for embracing new technologies and methodologies in the dynamic field of data science.") 
         st.write("Beyond the screen, I find joy in diverse pursuits. Whether it's a fierce badminton match, the strokes of a paintbrush, the soothing chords of a guitar, or the tranquility of a hiking trail, I embrace the beauty of life beyond coding.")
         st.write("Come, explore my web app, and join me in this exciting adventure of data exploration and analytics. Let's make technology not just a skill but a thrilling journey!")
+
+# Only the selected section executes on a rerun
+section = navigation.radio("Section", router.names, horizontal=True, key="section", label_visibility="collapsed")
+router.run(section)
+st.caption(router.summary())
+rerun_span.stop()
+
+# Optional diagnostics: where this rerun's time went, and the latency of every traced step across sessions
+if st.sidebar.checkbox("Show diagnostics"):
+    with st.expander("Diagnostics", expanded=True):
+        st.write("This rerun took {:.0f} ms:".format(rerun_span.seconds * 1000))
+        st.dataframe(pd.DataFrame([{'span': entry['span'], 'depth': entry['depth'], 'start_ms': entry['offset'] * 1000,
+                                    'ms': entry['seconds'] * 1000} for entry in tracing.current_trace()]))
+        st.write("All sessions of this process:")
+        st.dataframe(pd.DataFrame(tracing.TRACER.summary()))
+        st.download_button("Download metrics (JSON)", tracing.TRACER.to_json(), file_name="stroke_metrics.json",
+                           mime="application/json")
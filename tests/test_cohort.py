@@ -0,0 +1,90 @@
+# Indexed cohort filters against plain pandas boolean masks
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cohort import FILTER_COLUMNS, CohortIndex
+
+
+@pytest.fixture(scope='module')
+def df():
+    rng = np.random.RandomState(0)
+    n = 1003
+    return pd.DataFrame({
+        # Rounded ages give many ties at the range edges
+        'age': np.round(rng.uniform(0, 82, n) * 2) / 2,
+        'work_type': rng.choice(['Private', 'Self-employed', 'Govt_job', 'children', 'Never_worked'], n),
+        'smoking_status': rng.choice(['never smoked', 'smokes', 'formerly smoked', 'Unknown'], n),
+        'gender': rng.choice(['Male', 'Female', 'Other'], n, p=[0.45, 0.549, 0.001]),
+    }, index=rng.permutation(n) + 5000)
+
+
+@pytest.fixture(scope='module')
+def index(df):
+    return CohortIndex(df)
+
+
+def _mask(df, selections, value_range):
+    mask = df['age'].between(value_range[0], value_range[1])
+    for name, value in selections.items():
+        mask &= df[name] == value
+    return mask
+
+
+def _check(df, index, selections, value_range):
+    mask = _mask(df, selections, value_range)
+    assert index.count(selections, value_range) == int(mask.sum())
+    np.testing.assert_array_equal(index.positions(selections, value_range), np.flatnonzero(mask.to_numpy()))
+    pd.testing.assert_frame_equal(index.filter(df, selections, value_range), df[mask])
+
+
+def _selections(df):
+    options = [[None] + sorted(df[name].unique()) for name in FILTER_COLUMNS]
+    for values in itertools.product(*options):
+        yield {name: value for name, value in zip(FILTER_COLUMNS, values) if value is not None}
+
+
+@pytest.mark.parametrize('value_range', [(0, 82), (18, 65), (40.5, 41), (0.5, 0.5), (37, 37.25)])
+def test_matches_boolean_masks(df, index, value_range):
+    for selections in _selections(df):
+        _check(df, index, selections, value_range)
+
+
+def test_range_edges_are_inclusive(df, index):
+    ages = np.unique(df['age'])
+    for low, high in [(ages[0], ages[0]), (ages[-1], ages[-1]), (ages[3], ages[10]), (ages[1], ages[2])]:
+        _check(df, index, {}, (low, high))
+        _check(df, index, {'gender': 'Female'}, (low, high))
+
+
+def test_slices_at_every_byte_offset(df, index):
+    ages = np.sort(df['age'].to_numpy())
+    # Ranges whose slice starts and stops at each position within a byte
+    for start in range(0, 24):
+        for width in (1, 7, 8, 9, 100):
+            value_range = (ages[start], ages[min(start + width, len(ages) - 1)])
+            _check(df, index, {'work_type': 'Private'}, value_range)
+
+
+@pytest.mark.parametrize('selections, value_range', [
+    ({}, (90, 100)),
+    ({}, (-10, -1)),
+    ({}, (50, 40)),
+    ({'work_type': 'Astronaut'}, (0, 82)),
+    ({'gender': 'Other', 'work_type': 'children', 'smoking_status': 'smokes'}, (80, 82)),
+])
+def test_empty_selections(df, index, selections, value_range):
+    assert index.count(selections, value_range) == 0
+    assert len(index.positions(selections, value_range)) == 0
+    assert index.filter(df, selections, value_range).empty
+    _check(df, index, selections, value_range)
+
+
+def test_missing_values_never_match():
+    df = pd.DataFrame({'age': [10.0, 20.0, 30.0, 40.0], 'work_type': ['Private', None, 'Private', 'Govt_job'],
+                       'smoking_status': ['smokes'] * 4, 'gender': ['Male'] * 4})
+    index = CohortIndex(df)
+    _check(df, index, {'work_type': 'Private'}, (0, 100))
+    _check(df, index, {}, (15, 35))
@@ -0,0 +1,70 @@
+# Streaming correlation statistics against pandas' pairwise corr and cov
+import numpy as np
+import pandas as pd
+import pytest
+
+from corr_stats import MomentStats, PartitionedMoments
+
+COLUMNS = ['age', 'avg_glucose_level', 'bmi', 'sparse']
+
+
+@pytest.fixture(scope='module')
+def df():
+    rng = np.random.RandomState(0)
+    n = 4000
+    df = pd.DataFrame(rng.normal(size=(n, 4)) * [20, 40, 7, 1] + [45, 100, 28, 0], columns=COLUMNS)
+    df['bmi'] += 0.1 * df['age']
+    # Different missing shares per column, so each pair has its own rows
+    df[COLUMNS] = df[COLUMNS].mask(rng.rand(n, 4) < [0.0, 0.1, 0.3, 0.95])
+    df['stroke'] = (rng.rand(n) < 0.1).astype(int)
+    df['gender'] = rng.choice(['Male', 'Female', 'Other'], n, p=[0.45, 0.54, 0.01])
+    return df
+
+
+def test_batches_match_pandas(df):
+    stats = MomentStats(COLUMNS)
+    for part in np.array_split(df[COLUMNS].to_numpy(), 17):
+        stats.update(part)
+    pd.testing.assert_frame_equal(stats.correlation(), df[COLUMNS].corr(), atol=1e-12, rtol=0)
+    pd.testing.assert_frame_equal(stats.covariance(), df[COLUMNS].cov(), rtol=1e-10)
+
+
+@pytest.mark.parametrize('selections, mask', [
+    (None, lambda df: df['stroke'] >= 0),
+    ({'stroke': 1}, lambda df: df['stroke'] == 1),
+    ({'gender': ['Male', 'Other']}, lambda df: df['gender'] != 'Female'),
+    ({'stroke': 0, 'gender': 'Female'}, lambda df: (df['stroke'] == 0) & (df['gender'] == 'Female')),
+])
+def test_cohorts_match_pandas(df, selections, mask):
+    moments = PartitionedMoments.from_frame(df, COLUMNS, ['stroke', 'gender'])
+    expected = df.loc[mask(df), COLUMNS].corr()
+    pd.testing.assert_frame_equal(moments.correlation(selections), expected, atol=1e-12, rtol=0)
+
+
+def test_append_matches_one_build(df):
+    moments = PartitionedMoments.from_frame(df.iloc[:1500], COLUMNS, ['stroke'])
+    moments.append(df.iloc[1500:])
+    pd.testing.assert_frame_equal(moments.correlation(), df[COLUMNS].corr(), atol=1e-12, rtol=0)
+
+
+def test_large_offsets_keep_precision():
+    rng = np.random.RandomState(1)
+    X = rng.normal(size=(2000, 2)) + 1e8
+    X[rng.rand(2000) < 0.2, 1] = np.nan
+    stats = MomentStats(['a', 'b'])
+    for part in np.array_split(X, 9):
+        stats.update(part)
+    expected = pd.DataFrame(X, columns=['a', 'b']).corr()
+    pd.testing.assert_frame_equal(stats.correlation(), expected, atol=1e-6, rtol=0)
+
+
+def test_pairs_without_enough_rows_are_nan():
+    df = pd.DataFrame({'a': [1.0, 2.0, np.nan, 4.0], 'b': [np.nan, np.nan, 3.0, 5.0], 'c': [1.0, 1.0, 1.0, 1.0]})
+    stats = MomentStats(list(df)).update(df.to_numpy())
+    pd.testing.assert_frame_equal(stats.correlation(), df.corr())
+
+
+def test_empty_statistics():
+    stats = MomentStats(['a', 'b']).update(np.empty((0, 2)))
+    assert stats.correlation().isna().all().all()
+    assert stats.covariance().isna().all().all()
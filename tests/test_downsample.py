@@ -0,0 +1,51 @@
+# Streaming trendline statistics against numpy's least-squares fit
+import numpy as np
+import pytest
+
+from downsample import LineStats, group_line_stats
+
+
+def _line(seed, n, offset):
+    rng = np.random.RandomState(seed)
+    x = rng.uniform(0, 10, n) + offset
+    y = 2.5 * (x - offset) + rng.normal(scale=3, size=n) + 40
+    return x, y
+
+
+@pytest.mark.parametrize('offset', [0.0, 1e6])
+def test_fit_matches_polyfit(offset):
+    x, y = _line(0, 200000, offset)
+    stats = LineStats()
+    for x_part, y_part in zip(np.array_split(x, 11), np.array_split(y, 11)):
+        stats.update(x_part, y_part)
+    slope, intercept = stats.fit()
+    expected = np.polyfit(x, y, 1)
+    assert slope == pytest.approx(expected[0], rel=1e-9)
+    assert intercept == pytest.approx(expected[1], rel=1e-9)
+    assert (stats.x_min, stats.x_max) == (x.min(), x.max())
+
+
+def test_merge_matches_one_update():
+    x, y = _line(1, 5000, 1e6)
+    parts = [LineStats().update(x[i::3], y[i::3]) for i in range(3)]
+    merged = parts[0].merge(parts[1]).merge(LineStats()).merge(parts[2])
+    whole = LineStats().update(x, y)
+    assert merged.n == whole.n
+    np.testing.assert_allclose(merged.fit(), whole.fit(), rtol=1e-9)
+
+
+def test_missing_values_and_degenerate_lines():
+    assert LineStats().update([1.0, np.nan], [np.nan, 2.0]).fit() is None
+    assert LineStats().update([3.0, 3.0, 3.0], [1.0, 2.0, 3.0]).fit() is None
+    slope, intercept = LineStats().update([0.0, 1.0, np.nan, 2.0], [1.0, 3.0, 9.0, 5.0]).fit()
+    assert slope == pytest.approx(2.0) and intercept == pytest.approx(1.0)
+
+
+def test_group_line_stats():
+    x, y = _line(2, 3000, 0.0)
+    groups = np.where(np.arange(3000) % 2, 'Male', 'Female')
+    stats = group_line_stats(x, y, groups)
+    assert sorted(stats) == ['Female', 'Male']
+    for name, line in stats.items():
+        mask = groups == name
+        np.testing.assert_allclose(line.fit(), np.polyfit(x[mask], y[mask], 1), rtol=1e-9)
@@ -0,0 +1,109 @@
+# Streaming ingest: the quantile sketch and the replacement of an existing store
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_cache
+import ingest
+from ingest import QuantileSketch
+
+
+# Function to return the share of values below an estimate (its rank as a fraction)
+def _rank(values, estimate):
+    return np.searchsorted(np.sort(values), estimate) / len(values)
+
+
+def test_median_is_exact_before_compaction():
+    rng = np.random.RandomState(0)
+    for n in (1, 2, 101, 1000):
+        values = rng.normal(30, 7, n)
+        sketch = QuantileSketch(k=2048).update(values)
+        assert sketch.quantile(0.5) == pytest.approx(float(pd.Series(values).median()))
+        assert sketch.quantile(0.9) == pytest.approx(float(pd.Series(values).quantile(0.9)))
+
+
+def test_nan_values_are_ignored():
+    sketch = QuantileSketch().update([1.0, np.nan, 3.0, np.nan])
+    assert sketch.n == 2
+    assert sketch.quantile(0.5) == 2.0
+
+
+def test_quantiles_within_rank_error_after_updates():
+    rng = np.random.RandomState(1)
+    values = rng.lognormal(3, 0.5, 300000)
+    sketch = QuantileSketch(k=256)
+    for batch in np.array_split(values, 37):
+        sketch.update(batch)
+    assert sketch.n == len(values)
+    assert sum(len(level) for level in sketch.levels) < 4 * 256
+    for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+        assert abs(_rank(values, sketch.quantile(q)) - q) < 0.01
+
+
+def test_quantiles_within_rank_error_after_merge():
+    rng = np.random.RandomState(2)
+    parts = [rng.normal(loc, 5, 80000) for loc in (20, 30, 40)]
+    merged = QuantileSketch(k=256, seed=1)
+    for i, part in enumerate(parts):
+        merged.merge(QuantileSketch(k=256, seed=10 + i).update(part))
+    values = np.concatenate(parts)
+    assert merged.n == len(values)
+    for q in (0.1, 0.5, 0.9):
+        assert abs(_rank(values, merged.quantile(q)) - q) < 0.01
+
+
+def test_round_trip_keeps_state_and_seed():
+    rng = np.random.RandomState(3)
+    sketch = QuantileSketch(k=64, seed=7).update(rng.rand(5000))
+    restored = QuantileSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    assert restored.seed == 7
+    assert restored.n == sketch.n
+    assert restored.quantile(0.5) == sketch.quantile(0.5)
+    # The restored generator continues where the original stopped
+    more = rng.rand(5000)
+    sketch.update(more)
+    restored.update(more)
+    assert restored.to_dict() == sketch.to_dict()
+
+
+def test_from_dict_accepts_states_without_seed():
+    state = {'k': 8, 'n': 3, 'levels': [[1.0, 2.0, 3.0]]}
+    sketch = QuantileSketch.from_dict(state)
+    assert sketch.seed == 0
+    assert sketch.quantile(0.5) == 2.0
+
+
+@pytest.fixture
+def small_csv(tmp_path):
+    path = tmp_path / 'patients.csv'
+    pd.read_csv(data_cache.DATA_FILE, nrows=300).to_csv(path, index=False)
+    return str(path)
+
+
+def test_ingest_replaces_existing_store(small_csv, tmp_path):
+    out_dir = str(tmp_path / 'store')
+    ingest.ingest(small_csv, out_dir, chunksize=100)
+    manifest = ingest.ingest(small_csv, out_dir, chunksize=128)
+    assert manifest['rows'] == 300
+    assert ingest.IngestedData(out_dir).manifest['chunks'] == manifest['chunks']
+    assert sorted(os.listdir(str(tmp_path))) == ['patients.csv', 'store']
+
+
+def test_failed_replace_keeps_old_store(small_csv, tmp_path, monkeypatch):
+    out_dir = str(tmp_path / 'store')
+    old_manifest = ingest.ingest(small_csv, out_dir, chunksize=100)
+    replace = os.replace
+
+    def failing_replace(source, target):
+        if '.tmp-' in str(source):
+            raise OSError('disk full')
+        return replace(source, target)
+
+    monkeypatch.setattr(ingest.os, 'replace', failing_replace)
+    with pytest.raises(OSError):
+        ingest.ingest(small_csv, out_dir, chunksize=128)
+    assert ingest.IngestedData(out_dir).manifest['chunks'] == old_manifest['chunks']
+    assert sorted(os.listdir(str(tmp_path))) == ['patients.csv', 'store']
@@ -0,0 +1,100 @@
+# Native SMOTE: incremental neighbour lists and resampling against imblearn
+import numpy as np
+import pytest
+from imblearn.over_sampling import SMOTE
+from sklearn.neighbors import KDTree
+
+import oversampling
+from oversampling import SmoteIndex, fit_resample
+
+
+# Function to compute the exact neighbour lists of every row with a fresh tree
+def _fresh_neighbors(points, k):
+    distances, indices = KDTree(points).query(points, k=k + 1)
+    return distances[:, 1:], indices[:, 1:]
+
+
+def _assert_exact(index):
+    distances, indices = _fresh_neighbors(index.points, index.k)
+    np.testing.assert_allclose(index.distances, distances)
+    np.testing.assert_array_equal(index.neighbors, indices)
+
+
+def _data(seed, n=1000, n_minority=80, features=4):
+    rng = np.random.RandomState(seed)
+    X = rng.normal(size=(n, features))
+    y = np.zeros(n, dtype=np.int64)
+    y[rng.choice(n, n_minority, replace=False)] = 1
+    X[y == 1] += 1.5
+    return X, y
+
+
+def test_add_patches_neighbors_without_rebuild():
+    rng = np.random.RandomState(0)
+    index = SmoteIndex(rng.normal(size=(200, 3)))
+    for size in (1, 7, 12):
+        index.add(rng.normal(size=(size, 3)))
+        # 20 rows added to 200: still under the rebuild share
+        assert index.n_indexed == 200
+        _assert_exact(index)
+
+
+def test_add_past_rebuild_ratio_rebuilds_tree():
+    rng = np.random.RandomState(1)
+    index = SmoteIndex(rng.normal(size=(100, 3)))
+    index.add(rng.normal(size=(20, 3)))
+    assert index.n_indexed == 100
+    _assert_exact(index)
+    index.add(rng.normal(size=(10, 3)))
+    # 30 added rows exceed 25% of the 100 indexed ones
+    assert index.n_indexed == 130
+    _assert_exact(index)
+    index.add(rng.normal(size=(5, 3)))
+    _assert_exact(index)
+
+
+def test_add_nothing_is_a_no_op():
+    rng = np.random.RandomState(2)
+    index = SmoteIndex(rng.normal(size=(50, 2)))
+    neighbors = index.neighbors.copy()
+    index.add(np.empty((0, 2)))
+    np.testing.assert_array_equal(index.neighbors, neighbors)
+
+
+def test_too_few_minority_rows():
+    with pytest.raises(ValueError):
+        SmoteIndex(np.zeros((5, 2)))
+
+
+def test_fit_resample_is_deterministic_per_seed():
+    X, y = _data(3)
+    oversampling._index_cache.clear()
+    first = fit_resample(X, y, seed=4)
+    oversampling._index_cache.clear()
+    again = fit_resample(X, y, seed=4)
+    other = fit_resample(X, y, seed=5)
+    np.testing.assert_array_equal(first[0], again[0])
+    np.testing.assert_array_equal(first[1], again[1])
+    assert not np.array_equal(first[0], other[0])
+
+
+@pytest.mark.parametrize('strategy', ['minority', 'auto', 0.5, 0.3])
+def test_fit_resample_matches_imblearn_counts(strategy):
+    X, y = _data(6)
+    X_res, y_res = fit_resample(X, y, sampling_strategy=strategy)
+    X_ref, y_ref = SMOTE(sampling_strategy=strategy, random_state=0).fit_resample(X, y)
+    assert X_res.shape == X_ref.shape
+    np.testing.assert_array_equal(np.bincount(y_res), np.bincount(y_ref))
+    # The original rows come first, as in imblearn
+    np.testing.assert_array_equal(X_res[:len(X)], X)
+    np.testing.assert_array_equal(y_res[:len(y)], y)
+
+
+def test_synthetic_rows_stay_within_minority_range():
+    X, y = _data(7)
+    minority = X[y == 1]
+    X_res, _ = fit_resample(X, y, seed=1)
+    synthetic = X_res[len(X):]
+    # Synthetic rows interpolate between minority rows, so they stay within the minority range
+    assert synthetic.min() >= minority.min() - 1e-12
+    assert synthetic.max() <= minority.max() + 1e-12
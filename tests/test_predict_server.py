@@ -0,0 +1,130 @@
+# Prediction server: request checks, batch isolation and HTTP status codes
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+import predict_server
+from features import FEATURE_COLUMNS, load_schema
+
+
+class ConstantModel:
+    # Scores every row 0.25 and counts the predict_proba calls
+    def __init__(self):
+        self.calls = 0
+
+    def predict_proba(self, X):
+        self.calls += 1
+        return np.tile([0.75, 0.25], (len(X), 1))
+
+
+class BrokenModel:
+    def predict_proba(self, X):
+        raise RuntimeError('model failed')
+
+
+RECORD = {'gender': 'Male', 'age': 67, 'hypertension': 0, 'heart_disease': 1, 'ever_married': 'Yes',
+          'work_type': 'Private', 'Residence_type': 'Urban', 'avg_glucose_level': 228.69, 'bmi': 36.6,
+          'smoking_status': 'formerly smoked'}
+
+
+def _server(model):
+    batcher = predict_server.MicroBatcher(model, load_schema(), window_ms=1.0)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), predict_server.make_handler(batcher))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+
+@pytest.fixture
+def served():
+    model = ConstantModel()
+    server, url = _server(model)
+    yield model, url
+    server.shutdown()
+    server.server_close()
+
+
+# Function to post a raw body and return (status, decoded reply)
+def _post(url, body):
+    request = urllib.request.Request(url + '/predict', data=body.encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read().decode('utf-8'))
+
+
+def test_record_columns_match_the_schema():
+    assert sorted(RECORD) == sorted(FEATURE_COLUMNS)
+
+
+def test_valid_records(served):
+    model, url = served
+    status, reply = _post(url, json.dumps({'records': [RECORD, RECORD]}))
+    assert status == 200
+    assert reply['predictions'] == [{'stroke': 0, 'probability': 0.25}] * 2
+    assert predict_server.predict_remote(url, [RECORD]) == [{'stroke': 0, 'probability': 0.25}]
+    status, reply = _post(url, json.dumps(RECORD))
+    assert status == 200 and len(reply['predictions']) == 1
+
+
+@pytest.mark.parametrize('body', [
+    'not json',
+    '"a string"',
+    '42',
+    '{"records": "abc"}',
+    '{"records": []}',
+    '{"records": [1, 2]}',
+    '{"records": [["Male", 67]]}',
+    json.dumps({'records': [RECORD, {k: v for k, v in RECORD.items() if k != 'age'}]}),
+    json.dumps({k: v for k, v in RECORD.items() if k != 'bmi'}),
+])
+def test_bad_input_is_rejected_before_scoring(served, body):
+    model, url = served
+    status, reply = _post(url, body)
+    assert status == 400
+    assert 'error' in reply
+    assert model.calls == 0
+
+
+def test_model_failures_are_server_errors():
+    server, url = _server(BrokenModel())
+    try:
+        status, reply = _post(url, json.dumps({'records': [RECORD]}))
+        assert status == 500
+        assert reply['error'] == 'model failed'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_failed_request_does_not_fail_its_batch():
+    model = ConstantModel()
+    batcher = predict_server.MicroBatcher(model, load_schema(), window_ms=50.0)
+    results = {}
+
+    def submit(key, records):
+        try:
+            results[key] = batcher.submit(records)
+        except Exception as error:
+            results[key] = error
+
+    threads = [threading.Thread(target=submit, args=(i, [5] if i == 1 else [RECORD])) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert isinstance(results[1], Exception)
+    assert results[0] == results[2] == [{'stroke': 0, 'probability': 0.25}]
+
+
+def test_check_records():
+    assert predict_server.check_records([RECORD], FEATURE_COLUMNS) is None
+    assert 'missing gender' in predict_server.check_records([{}], ['gender'])
+    assert 'record 1' in predict_server.check_records([RECORD, 'x'], FEATURE_COLUMNS)
@@ -0,0 +1,102 @@
+# ThresholdSweep against sklearn's metrics on the same labels and scores
+import numpy as np
+import pytest
+from sklearn.metrics import (accuracy_score, auc, confusion_matrix, f1_score, precision_recall_curve,
+                             precision_score, recall_score, roc_auc_score, roc_curve)
+
+from thresholds import ThresholdSweep
+
+THRESHOLDS = [0.0, 0.1, 0.25, 0.3, 0.5, 0.7, 0.9, 1.0]
+
+
+def _data(seed, n=400, ties=False):
+    rng = np.random.RandomState(seed)
+    y_true = (rng.rand(n) < 0.2).astype(int)
+    y_score = np.clip(0.3 * y_true + rng.rand(n) * 0.7, 0, 1)
+    if ties:
+        # Few distinct scores, several of them equal to the thresholds tested
+        y_score = np.round(y_score * 10) / 10
+    return y_true, y_score
+
+
+@pytest.mark.parametrize('ties', [False, True])
+def test_counts_match_predictions(ties):
+    y_true, y_score = _data(0, ties=ties)
+    sweep = ThresholdSweep(y_true, y_score)
+    tp, fp = sweep.counts(THRESHOLDS)
+    for threshold, tp_t, fp_t in zip(THRESHOLDS, tp, fp):
+        predicted = y_score > threshold
+        assert tp_t == np.sum(predicted & (y_true == 1))
+        assert fp_t == np.sum(predicted & (y_true == 0))
+
+
+@pytest.mark.parametrize('ties', [False, True])
+def test_metrics_match_sklearn(ties):
+    y_true, y_score = _data(1, ties=ties)
+    sweep = ThresholdSweep(y_true, y_score)
+    for threshold in THRESHOLDS:
+        y_pred = (y_score > threshold).astype(int)
+        result = sweep.metrics(threshold)
+        assert result['accuracy'] == pytest.approx(accuracy_score(y_true, y_pred))
+        assert result['precision'] == pytest.approx(precision_score(y_true, y_pred, zero_division=0))
+        assert result['recall'] == pytest.approx(recall_score(y_true, y_pred, zero_division=0))
+        assert result['f1'] == pytest.approx(f1_score(y_true, y_pred, zero_division=0))
+        assert result['flagged'] == pytest.approx(y_pred.mean())
+        np.testing.assert_array_equal(result['confusion_matrix'], confusion_matrix(y_true, y_pred, labels=[0, 1]))
+
+
+@pytest.mark.parametrize('ties', [False, True])
+def test_curves_and_aucs_match_sklearn(ties):
+    y_true, y_score = _data(2, ties=ties)
+    sweep = ThresholdSweep(y_true, y_score)
+
+    fpr, tpr, _ = roc_curve(y_true, y_score, drop_intermediate=False)
+    sweep_fpr, sweep_tpr = sweep.roc_curve()
+    np.testing.assert_allclose(sweep_fpr, fpr)
+    np.testing.assert_allclose(sweep_tpr, tpr)
+    assert sweep.roc_auc() == pytest.approx(roc_auc_score(y_true, y_score))
+
+    precision, recall, _ = precision_recall_curve(y_true, y_score)
+    # sklearn 0.24 starts the curve at the highest threshold with full recall; later releases keep
+    # the lower thresholds too (all at recall 1, so the area is the same)
+    start = np.flatnonzero(recall == recall[0]).max()
+    sweep_precision, sweep_recall = sweep.pr_curve()
+    np.testing.assert_allclose(sweep_precision, precision[start:])
+    np.testing.assert_allclose(sweep_recall, recall[start:])
+    assert sweep.pr_auc() == pytest.approx(auc(recall, precision))
+
+
+def test_table_matches_metrics():
+    y_true, y_score = _data(3)
+    sweep = ThresholdSweep(y_true, y_score)
+    table = sweep.table(THRESHOLDS)
+    for i, threshold in enumerate(THRESHOLDS):
+        result = sweep.metrics(threshold)
+        for name in ('precision', 'recall', 'f1', 'accuracy', 'flagged'):
+            assert table[name][i] == pytest.approx(result[name])
+
+
+def test_best_threshold_reaches_best_f1():
+    y_true, y_score = _data(4, ties=True)
+    sweep = ThresholdSweep(y_true, y_score)
+    best = max(f1_score(y_true, (y_score > t).astype(int), zero_division=0) for t in np.unique(y_score))
+    best = max(best, f1_score(y_true, (y_score > -1).astype(int)))
+    assert sweep.metrics(sweep.best_threshold('f1'))['f1'] == pytest.approx(best)
+
+
+@pytest.mark.parametrize('label', [0, 1])
+def test_single_class(label):
+    y_score = np.linspace(0.05, 0.95, 20)
+    y_true = np.full(20, label)
+    sweep = ThresholdSweep(y_true, y_score)
+    for threshold in THRESHOLDS:
+        y_pred = (y_score > threshold).astype(int)
+        result = sweep.metrics(threshold)
+        assert result['accuracy'] == pytest.approx(accuracy_score(y_true, y_pred))
+        assert result['precision'] == pytest.approx(precision_score(y_true, y_pred, zero_division=0))
+        assert result['recall'] == pytest.approx(recall_score(y_true, y_pred, zero_division=0))
+        np.testing.assert_array_equal(result['confusion_matrix'], confusion_matrix(y_true, y_pred, labels=[0, 1]))
+    # The curve along the missing class stays at 0 instead of dividing by zero
+    fpr, tpr = sweep.roc_curve()
+    assert np.all(np.isfinite(fpr)) and np.all(np.isfinite(tpr))
+    assert np.all((fpr if label == 1 else tpr) == 0)
@@ -0,0 +1,73 @@
+# Compiled tree ensembles against XGBoost's own predictions
+import numpy as np
+import pandas as pd
+import pytest
+from xgboost import XGBClassifier
+
+from tree_engine import compile_booster
+
+FEATURES = ['age', 'avg_glucose_level', 'bmi', 'hypertension']
+
+
+# Function to build rows with missing values in every column, so trees learn a default direction
+def _data(seed, n=600):
+    rng = np.random.RandomState(seed)
+    X = pd.DataFrame(rng.normal(size=(n, len(FEATURES))), columns=FEATURES)
+    y = ((X['age'] + 0.5 * X['bmi'].fillna(0) + rng.normal(scale=0.5, size=n)) > 0.8).astype(int)
+    X = X.mask(rng.rand(n, len(FEATURES)) < 0.15)
+    return X, y
+
+
+def _fit(X, y, **params):
+    params = dict(dict(n_estimators=25, max_depth=4, learning_rate=0.3), **params)
+    return XGBClassifier(**params).fit(X, y)
+
+
+@pytest.mark.parametrize('base_score', [None, 0.2, 0.7])
+def test_batched_matches_xgboost(base_score):
+    X, y = _data(0)
+    params = {} if base_score is None else {'base_score': base_score}
+    model = _fit(X, y, **params)
+    engine = compile_booster(model)
+    np.testing.assert_allclose(engine.predict_proba(X), model.predict_proba(X), atol=1e-6)
+    np.testing.assert_array_equal(engine.predict(X), model.predict(X))
+
+
+def test_single_row_matches_xgboost():
+    X, y = _data(1)
+    model = _fit(X, y)
+    engine = compile_booster(model)
+    expected = model.predict_proba(X)[:, 1]
+    single = np.array([engine.predict_one(row) for row in engine.as_matrix(X)[:100]])
+    np.testing.assert_allclose(single, expected[:100], atol=1e-6)
+
+
+def test_missing_values_follow_default_direction():
+    X, y = _data(2)
+    model = _fit(X, y)
+    engine = compile_booster(model)
+    # Rows missing everything, or one column at a time, take only default branches there
+    rows = pd.concat([X.iloc[:1].mask(np.ones((1, len(FEATURES)), dtype=bool))] +
+                     [X.iloc[:20].assign(**{name: np.nan}) for name in FEATURES])
+    np.testing.assert_allclose(engine.predict_proba(rows), model.predict_proba(rows), atol=1e-6)
+    for row, expected in zip(engine.as_matrix(rows), model.predict_proba(rows)[:, 1]):
+        assert engine.predict_one(row) == pytest.approx(expected, abs=1e-6)
+
+
+def test_column_order_follows_the_booster():
+    X, y = _data(3)
+    model = _fit(X, y)
+    engine = compile_booster(model)
+    shuffled = X[FEATURES[::-1]]
+    np.testing.assert_allclose(engine.predict_proba(shuffled), model.predict_proba(X), atol=1e-6)
+
+
+def test_blocks_give_the_same_result(monkeypatch):
+    import tree_engine
+
+    X, y = _data(4)
+    model = _fit(X, y)
+    engine = compile_booster(model)
+    expected = engine.predict_proba(X)
+    monkeypatch.setattr(tree_engine, 'BLOCK_ROWS', 7)
+    np.testing.assert_array_equal(engine.predict_proba(X), expected)
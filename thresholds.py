@@ -0,0 +1,121 @@
+# Threshold sweep over one probability vector.
+# The scores are sorted once and the true and false positive counts at every
+# distinct score come from one cumulative sum. ROC and precision-recall curves
+# and the point metrics (accuracy, precision, recall, F1, confusion matrix) at
+# any decision threshold are read off those counts, so moving the threshold
+# is a binary search and never re-scores the model. A row is predicted
+# positive when its score is above the threshold, as in predict.
+import numpy as np
+import plotly.graph_objects as go
+
+# Curve points kept for plotting (the AUCs use every point)
+MAX_CURVE_POINTS = 512
+SWEEP_METRICS = ('precision', 'recall', 'f1', 'accuracy', 'flagged')
+
+
+# Function to divide counts, giving 0 where the denominator is 0 (as sklearn does)
+def _ratio(numerator, denominator):
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros(np.broadcast(numerator, denominator).shape),
+                     where=denominator > 0)
+
+
+# Function to pick at most max_points evenly spaced indices of n, keeping both ends
+def thin(n, max_points=MAX_CURVE_POINTS):
+    if n <= max_points:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, max_points).round().astype(np.int64))
+
+
+def _trapezoid(x, y):
+    return float(np.sum(np.diff(x) * (y[1:] + y[:-1]) / 2.0))
+
+
+class ThresholdSweep:
+    def __init__(self, y_true, y_score):
+        y_score = np.asarray(y_score, dtype=np.float64).ravel()
+        positive = np.asarray(y_true).ravel() == 1
+        order = np.argsort(-y_score, kind='mergesort')
+        score = y_score[order]
+        # Last row of each run of equal scores: a threshold below the run takes all of it
+        ends = np.append(np.flatnonzero(np.diff(score)), len(score) - 1)
+        # Distinct scores in decreasing order with the counts above each one (inclusive)
+        self.scores = score[ends]
+        self.tp = np.cumsum(positive[order])[ends]
+        self.fp = ends + 1 - self.tp
+        self.n_pos = int(positive.sum())
+        self.n_neg = int(len(positive) - self.n_pos)
+
+    # Function to count the true and false positives at one or more thresholds
+    def counts(self, threshold):
+        above = np.searchsorted(-self.scores, -np.asarray(threshold, dtype=np.float64), side='left')
+        return np.append(0, self.tp)[above], np.append(0, self.fp)[above]
+
+    # Function to compute the point metrics from counts (arrays in, arrays out)
+    def _metrics(self, tp, fp):
+        fn, tn = self.n_pos - tp, self.n_neg - fp
+        return {'precision': _ratio(tp, tp + fp), 'recall': _ratio(tp, self.n_pos),
+                'f1': _ratio(2 * tp, 2 * tp + fp + fn), 'accuracy': _ratio(tp + tn, self.n_pos + self.n_neg),
+                'flagged': _ratio(tp + fp, self.n_pos + self.n_neg)}
+
+    # Function to return the point metrics and confusion matrix at one threshold
+    def metrics(self, threshold=0.5):
+        tp, fp = (int(count) for count in self.counts(float(threshold)))
+        result = {name: float(value) for name, value in self._metrics(tp, fp).items()}
+        result['confusion_matrix'] = np.array([[self.n_neg - fp, fp], [self.n_pos - tp, tp]])
+        result['threshold'] = float(threshold)
+        return result
+
+    # Function to return every sweep metric at each of the given thresholds
+    def table(self, thresholds):
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        table = self._metrics(*self.counts(thresholds))
+        table['threshold'] = thresholds
+        return table
+
+    # Function to return the threshold with the highest value of a sweep metric
+    # Any threshold from it up to (not including) the next distinct score gives the same predictions.
+    def best_threshold(self, metric='f1'):
+        best = int(np.argmax(self._metrics(self.tp, self.fp)[metric]))
+        return float(self.scores[best + 1]) if best + 1 < len(self.scores) else 0.0
+
+    # Function to return the ROC curve (fpr, tpr) from (0, 0) to (1, 1)
+    def roc_curve(self, max_points=None):
+        fpr = np.append(0.0, _ratio(self.fp, self.n_neg))
+        tpr = np.append(0.0, _ratio(self.tp, self.n_pos))
+        if max_points:
+            rows = thin(len(fpr), max_points)
+            fpr, tpr = fpr[rows], tpr[rows]
+        return fpr, tpr
+
+    # Function to return the precision-recall curve (precision, recall) as precision_recall_curve does:
+    # increasing thresholds up to full recall first, ending at precision 1, recall 0
+    def pr_curve(self, max_points=None):
+        last = int(np.searchsorted(self.tp, self.tp[-1]))
+        precision = np.append(_ratio(self.tp, self.tp + self.fp)[last::-1], 1.0)
+        recall = np.append(_ratio(self.tp, self.n_pos)[last::-1], 0.0)
+        if max_points:
+            rows = thin(len(precision), max_points)
+            precision, recall = precision[rows], recall[rows]
+        return precision, recall
+
+    def roc_auc(self):
+        return _trapezoid(*self.roc_curve())
+
+    def pr_auc(self):
+        precision, recall = self.pr_curve()
+        return _trapezoid(recall[::-1], precision[::-1])
+
+
+# Function to draw precision, recall, F1 and the share of flagged rows against the threshold
+def sweep_figure(sweep, threshold=None, points=101):
+    table = sweep.table(np.linspace(0.0, 1.0, points))
+    names = {'precision': 'Precision', 'recall': 'Recall', 'f1': 'F1-Score', 'flagged': 'Predicted positive'}
+    fig = go.Figure([go.Scatter(x=table['threshold'], y=table[name], mode='lines', name=label)
+                     for name, label in names.items()])
+    if threshold is not None:
+        fig.add_vline(x=threshold, line_dash='dash', line_color='gray')
+    fig.update_layout(title='Metrics by Decision Threshold', xaxis=dict(title='Threshold'),
+                      yaxis=dict(title='Value'), showlegend=True)
+    return fig
@@ -0,0 +1,208 @@
+# Span timing for the app's hot paths.
+# A span measures one named step (data load, filtering, encoding, SMOTE, fit,
+# predict, figure construction, HiPlot rendering, ...). Finished spans are
+# added to a per-name latency histogram that lives for the whole process, so
+# it aggregates every session. The histograms are exported as Prometheus
+# text or JSON, optionally over HTTP, and each script thread also keeps the
+# spans of its current trace (one rerun) for the in-app diagnostics panel.
+#
+#   with span('fit'):
+#       model.fit(X, y)
+import bisect
+import json
+import threading
+import time as timer
+from collections import OrderedDict
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds (Prometheus 'le' labels)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_NAME = 'stroke_span_seconds'
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus the +Inf bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    # Function to estimate a quantile by interpolating inside its bucket (as histogram_quantile does)
+    def quantile(self, q):
+        if self.count == 0:
+            return float('nan')
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = self.buckets[i - 1] if i > 0 else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(low + (high - low) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': self.sum, 'max': self.max,
+                'buckets': OrderedDict(zip([str(b) for b in self.buckets] + ['+Inf'], self.counts))}
+
+
+class Span:
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.start_time = None
+        self.seconds = None
+
+    def start(self):
+        self.start_time = timer.perf_counter()
+        self.tracer._enter()
+        return self
+
+    def stop(self):
+        if self.seconds is None:
+            self.seconds = timer.perf_counter() - self.start_time
+            self.tracer._finish(self)
+        return self.seconds
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+
+class Tracer:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.histograms = OrderedDict()
+        self.lock = threading.Lock()
+        self.started = timer.time()
+        # Per thread: current nesting depth and the spans of the current trace
+        self.local = threading.local()
+
+    def span(self, name):
+        return Span(self, name)
+
+    # Decorator timing every call of a function as one span
+    def traced(self, name):
+        def decorate(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def _enter(self):
+        self.local.depth = getattr(self.local, 'depth', 0) + 1
+
+    def _finish(self, span):
+        self.local.depth = max(getattr(self.local, 'depth', 1) - 1, 0)
+        trace = getattr(self.local, 'trace', None)
+        if trace is not None:
+            trace.append({'span': span.name, 'depth': self.local.depth, 'seconds': span.seconds,
+                          'offset': span.start_time - self.local.trace_start})
+        with self.lock:
+            histogram = self.histograms.get(span.name)
+            if histogram is None:
+                histogram = self.histograms[span.name] = Histogram(self.buckets)
+            histogram.observe(span.seconds)
+
+    # Function to start collecting this thread's spans (e.g. at the top of a rerun)
+    def begin_trace(self):
+        self.local.trace = []
+        self.local.trace_start = timer.perf_counter()
+        self.local.depth = 0
+
+    # Function to return the spans finished in this thread since begin_trace, in start order
+    def current_trace(self):
+        return sorted(getattr(self.local, 'trace', None) or [], key=lambda entry: entry['offset'])
+
+    # Function to summarize every histogram: count, mean, p50, p95, max and total in milliseconds
+    def summary(self):
+        with self.lock:
+            rows = [{'span': name, 'count': h.count, 'mean_ms': 1000 * h.sum / h.count,
+                     'p50_ms': 1000 * h.quantile(0.5), 'p95_ms': 1000 * h.quantile(0.95),
+                     'max_ms': 1000 * h.max, 'total_ms': 1000 * h.sum}
+                    for name, h in self.histograms.items()]
+        return sorted(rows, key=lambda row: -row['total_ms'])
+
+    def to_dict(self):
+        with self.lock:
+            return {'started': self.started, 'spans': OrderedDict(
+                (name, histogram.to_dict()) for name, histogram in self.histograms.items())}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=1)
+
+    # Function to render the histograms in the Prometheus text exposition format
+    def to_prometheus(self):
+        lines = ['# HELP {} Latency of traced app steps.'.format(METRIC_NAME),
+                 '# TYPE {} histogram'.format(METRIC_NAME)]
+        with self.lock:
+            for name, histogram in self.histograms.items():
+                label = name.replace('\\', '\\\\').replace('"', '\\"')
+                cumulative = 0
+                for bound, count in zip(list(self.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append('{}_bucket{{span="{}",le="{}"}} {}'.format(METRIC_NAME, label, bound, cumulative))
+                lines.append('{}_sum{{span="{}"}} {!r}'.format(METRIC_NAME, label, histogram.sum))
+                lines.append('{}_count{{span="{}"}} {}'.format(METRIC_NAME, label, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.started = timer.time()
+
+
+# Process-wide tracer shared by every session
+TRACER = Tracer()
+span = TRACER.span
+traced = TRACER.traced
+begin_trace = TRACER.begin_trace
+current_trace = TRACER.current_trace
+
+
+def make_handler(tracer):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def _reply(self, body, content_type):
+            body = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                self._reply(tracer.to_prometheus(), 'text/plain; version=0.0.4')
+            elif self.path == '/metrics.json':
+                self._reply(tracer.to_json(), 'application/json')
+            else:
+                self.send_error(404)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+
+# Function to serve /metrics (Prometheus) and /metrics.json from a background thread
+# Only this machine can connect unless a wider host (e.g. '0.0.0.0') is given.
+def serve_metrics(port, host='127.0.0.1', tracer=TRACER):
+    server = ThreadingHTTPServer((host, port), make_handler(tracer))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    return server
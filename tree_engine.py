@@ -0,0 +1,200 @@
+# NumPy evaluator for boosted tree ensembles.
+# The trees of an XGBoost booster are compiled into flat arrays (feature
+# index, threshold, left/right/missing child, leaf value) so rows can be scored
+# without building a DataFrame or DMatrix. Leaves point to themselves, so
+# every row can take exactly max_depth vectorized steps.
+import json
+import os
+import sys
+import tempfile
+import time as timer
+
+import joblib
+import numpy as np
+
+# Rows scored per block in the batched path (bounds the rows x trees index matrix)
+BLOCK_ROWS = 4096
+
+
+# Function to read the booster in XGBoost's JSON model format
+def _model_json(booster):
+    try:
+        raw = booster.save_raw(raw_format='json')
+        return json.loads(bytes(raw).decode('utf-8'))
+    except TypeError:
+        # Older XGBoost only writes JSON through save_model
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            booster.save_model(path)
+            with open(path) as f:
+                return json.load(f)
+        finally:
+            os.remove(path)
+
+
+def _parse_base_score(value):
+    return float(str(value).strip('[]').split(',')[0])
+
+
+class TreeEnsemble:
+    def __init__(self, feature, threshold, left, right, missing, value, roots, max_depth,
+                 base_margin, logistic, feature_names):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing = missing
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.base_margin = base_margin
+        self.logistic = logistic
+        self.feature_names = feature_names
+
+    # Function to turn a DataFrame or array into a float32 matrix in model feature order
+    def as_matrix(self, X):
+        if hasattr(X, 'columns') and self.feature_names:
+            X = X[self.feature_names]
+        return np.ascontiguousarray(X, dtype=np.float32)
+
+    # Function to walk every (row, tree) pair from the roots down to a leaf
+    def _leaves(self, X):
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        row_base = (np.arange(n_rows, dtype=np.int64) * n_features)[:, None]
+        node = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            x = flat.take(row_base + self.feature.take(node))
+            step = np.where(x < self.threshold.take(node), self.left.take(node), self.right.take(node))
+            # NaN compares False above; send missing values the default way instead
+            missing = np.isnan(x)
+            if missing.any():
+                step[missing] = self.missing.take(node[missing])
+            node = step
+        return node
+
+    def _transform(self, margin):
+        if self.logistic:
+            return 1.0 / (1.0 + np.exp(-margin))
+        return margin
+
+    # Function to compute raw margins for a batch of rows
+    def predict_margin(self, X):
+        X = self.as_matrix(X)
+        margin = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], BLOCK_ROWS):
+            block = X[start:start + BLOCK_ROWS]
+            margin[start:start + len(block)] = self.value.take(self._leaves(block)).sum(axis=1, dtype=np.float64)
+        return margin + self.base_margin
+
+    # Function to return class probabilities shaped like XGBClassifier.predict_proba
+    def predict_proba(self, X):
+        p = self._transform(self.predict_margin(X))
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, X, threshold=0.5):
+        return (self.predict_proba(X)[:, 1] > threshold).astype(int)
+
+    # Function to score a single row (1-D, in feature order) without any 2-D indexing
+    def predict_one(self, row):
+        row = np.asarray(row, dtype=np.float32)
+        node = self.roots
+        for _ in range(self.max_depth):
+            x = row[self.feature[node]]
+            node = np.where(np.isnan(x), self.missing[node],
+                            np.where(x < self.threshold[node], self.left[node], self.right[node]))
+        return float(self._transform(self.value[node].sum(dtype=np.float64) + self.base_margin))
+
+
+# Function to compile an XGBoost Booster or XGBClassifier into a TreeEnsemble
+def compile_booster(booster):
+    if hasattr(booster, 'get_booster'):
+        booster = booster.get_booster()
+    learner = _model_json(booster)['learner']
+    trees = learner['gradient_booster']['model']['trees']
+
+    features, thresholds, lefts, rights, missings, values, roots = [], [], [], [], [], [], []
+    max_depth = 0
+    offset = 0
+    for tree in trees:
+        left = np.asarray(tree['left_children'], dtype=np.int64)
+        right = np.asarray(tree['right_children'], dtype=np.int64)
+        condition = np.asarray(tree['split_conditions'], dtype=np.float32)
+        default_left = np.asarray(tree['default_left']).astype(bool)
+        n_nodes = len(left)
+        node_ids = offset + np.arange(n_nodes)
+        is_leaf = left == -1
+
+        # Leaves loop back to themselves; leaf values are kept in split_conditions
+        left_global = np.where(is_leaf, node_ids, offset + left)
+        right_global = np.where(is_leaf, node_ids, offset + right)
+        features.append(np.where(is_leaf, 0, tree['split_indices']))
+        thresholds.append(np.where(is_leaf, np.float32(np.inf), condition))
+        lefts.append(left_global)
+        rights.append(right_global)
+        missings.append(np.where(default_left, left_global, right_global))
+        values.append(np.where(is_leaf, condition, np.float32(0)))
+        roots.append(offset)
+
+        depth = np.zeros(n_nodes, dtype=np.int64)
+        for i in range(n_nodes):
+            if not is_leaf[i]:
+                depth[left[i]] = depth[right[i]] = depth[i] + 1
+        max_depth = max(max_depth, int(depth.max()))
+        offset += n_nodes
+
+    params = learner['learner_model_param']
+    objective = learner['objective']['name']
+    logistic = objective in ('binary:logistic', 'reg:logistic')
+    base_score = _parse_base_score(params['base_score'])
+    base_margin = float(np.log(base_score / (1.0 - base_score))) if logistic else base_score
+
+    return TreeEnsemble(np.concatenate(features).astype(np.int32),
+                        np.concatenate(thresholds).astype(np.float32),
+                        np.concatenate(lefts).astype(np.int32),
+                        np.concatenate(rights).astype(np.int32),
+                        np.concatenate(missings).astype(np.int32),
+                        np.concatenate(values).astype(np.float32),
+                        np.asarray(roots, dtype=np.int32),
+                        max_depth, base_margin, logistic, booster.feature_names)
+
+
+# Function to load a joblib-pickled XGBoost model and compile it
+def load_compiled(path):
+    return compile_booster(joblib.load(path))
+
+
+# Function to compare the compiled ensemble with XGBoost on the same rows
+def verify(model, X, repeats=200):
+    engine = compile_booster(model)
+    expected = model.predict_proba(X)[:, 1]
+    batched = engine.predict_proba(X)[:, 1]
+    matrix = engine.as_matrix(X)
+    single = np.array([engine.predict_one(row) for row in matrix[:repeats]])
+
+    one_row = X.iloc[:1] if hasattr(X, 'iloc') else X[:1]
+    start = timer.perf_counter()
+    for _ in range(repeats):
+        model.predict_proba(one_row)
+    xgb_one = (timer.perf_counter() - start) / repeats
+    start = timer.perf_counter()
+    for _ in range(repeats):
+        engine.predict_one(matrix[0])
+    engine_one = (timer.perf_counter() - start) / repeats
+
+    return {'rows': len(matrix), 'trees': len(engine.roots), 'max_depth': engine.max_depth,
+            'max_abs_diff_batched': float(np.abs(batched - expected).max()),
+            'max_abs_diff_single': float(np.abs(single - expected[:len(single)]).max()),
+            'xgboost_one_row_ms': xgb_one * 1000, 'engine_one_row_ms': engine_one * 1000}
+
+
+if __name__ == '__main__':
+    import pandas as pd
+    from features import load_schema
+
+    model_path = sys.argv[1] if len(sys.argv) > 1 else 'XGBoostTunedModel.pkl'
+    data_path = sys.argv[2] if len(sys.argv) > 2 else 'test.csv'
+    X = load_schema().encode(pd.read_csv(data_path))
+    for name, value in verify(joblib.load(model_path), X).items():
+        print('{:<24} {}'.format(name, value))
@@ -0,0 +1,292 @@
+# Hyperparameter search for the tuned models.
+# Successive halving: many sampled configurations get a small budget (boosting
+# rounds or trees), the best third moves on to three times the budget, and so
+# on until one is left. XGBoost trials stop early on a validation split cut
+# from the real training rows before SMOTE, which only resamples the fit part,
+# so no synthetic row reaches validation and the test split is never seen. The
+# search writes nothing unless --write (the shipped model, bundle and
+# tuned_params.json) or --output (one model file) is given. Trials run in a
+# process pool over shared-memory matrices and every finished trial is
+# appended to a JSONL store, so an interrupted search resumes where it stopped.
+#
+#   python tuning.py --model xgboost --configs 27 --workers 4 [--write]
+import argparse
+import json
+import math
+import os
+import sys
+import time as timer
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import xgboost as xgb
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import log_loss, roc_auc_score
+from sklearn.model_selection import train_test_split
+from xgboost import XGBClassifier
+
+from artifacts import hash_arrays, hash_key
+from evaluation import TUNED_PARAMS_FILE, TUNED_XGB_PARAMS
+from features import load_schema
+from model_bundle import MODEL_BUNDLE_DIR, save_bundle
+from preprocessing import resample
+from shared_arrays import SharedArrays, attach_arrays
+
+TRIAL_FILE = os.path.join('.cache', 'tuning', 'trials.jsonl')
+
+# Values tried for each parameter; configurations are sampled from the grid
+SEARCH_SPACES = {
+    'xgboost': {
+        'learning_rate': [0.05, 0.1, 0.25, 0.3],
+        'max_depth': [3, 4, 6, 8, 10],
+        'min_child_weight': [1, 3, 5],
+        'subsample': [0.7, 0.85, 1.0],
+        'colsample_bytree': [0.5, 0.75, 1.0],
+        'gamma': [0.0, 0.2, 1.0],
+    },
+    'random_forest': {
+        'max_depth': [None, 8, 12, 16],
+        'min_samples_leaf': [1, 2, 4],
+        'max_features': ['sqrt', 0.5, None],
+    },
+}
+# Smallest and largest budget per model (boosting rounds / trees)
+BUDGETS = {'xgboost': (30, 810), 'random_forest': (25, 225)}
+MODEL_FILES = {'xgboost': 'XGBoostTunedModel.pkl', 'random_forest': 'RandomForestTunedModel.pkl'}
+EARLY_STOPPING_ROUNDS = 20
+
+# DMatrix objects built once per worker process, by shared block name
+_worker_matrices = {}
+
+
+# Function to draw distinct configurations from a search space
+# The current hand-tuned XGBoost parameters are always the first candidate.
+def sample_configs(model, n_configs, seed=0):
+    space = SEARCH_SPACES[model]
+    rng = np.random.default_rng(seed)
+    configs = []
+    if model == 'xgboost':
+        configs.append({name: TUNED_XGB_PARAMS.get(name, values[-1]) for name, values in space.items()})
+    total = int(np.prod([len(values) for values in space.values()]))
+    while len(configs) < min(n_configs, total):
+        config = {name: values[rng.integers(len(values))] for name, values in space.items()}
+        if config not in configs:
+            configs.append(config)
+    return configs
+
+
+class TrialStore:
+    # Append-only JSONL file of finished trials, keyed by configuration, budget and data
+    def __init__(self, path=TRIAL_FILE):
+        self.path = path
+        self.trials = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        trial = json.loads(line)
+                    except ValueError:
+                        # A line cut short by an interrupted write
+                        continue
+                    self.trials[trial['key']] = trial
+
+    def get(self, key):
+        return self.trials.get(key)
+
+    def add(self, trial):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(trial) + '\n')
+        self.trials[trial['key']] = trial
+
+
+def _worker_dmatrix(specs, name):
+    block = specs['X_' + name][0]
+    matrix = _worker_matrices.get(block)
+    if matrix is None:
+        data = attach_arrays(specs)
+        matrix = xgb.DMatrix(data['X_' + name], label=data['y_' + name])
+        _worker_matrices[block] = matrix
+    return matrix
+
+
+# Function to predict with the first rounds of a booster
+def _predict_rounds(booster, matrix, rounds):
+    try:
+        return booster.predict(matrix, iteration_range=(0, rounds))
+    except TypeError:
+        # Older XGBoost limits the trees with ntree_limit instead
+        return booster.predict(matrix, ntree_limit=rounds)
+
+
+# Function run in a worker: train one configuration with a budget and score it on the validation split
+def run_trial(model, config, budget, specs, threads=1, seed=42):
+    start = timer.perf_counter()
+    data = attach_arrays(specs)
+    if model == 'xgboost':
+        params = dict(config, objective=TUNED_XGB_PARAMS['objective'], eval_metric='logloss',
+                      seed=seed, nthread=threads)
+        booster = xgb.train(params, _worker_dmatrix(specs, 'fit'), num_boost_round=budget,
+                            evals=[(_worker_dmatrix(specs, 'val'), 'val')],
+                            early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False)
+        rounds = booster.best_iteration + 1
+        y_score = _predict_rounds(booster, _worker_dmatrix(specs, 'val'), rounds)
+    else:
+        forest = RandomForestClassifier(n_estimators=budget, random_state=seed, n_jobs=threads, **config)
+        forest.fit(data['X_fit'], data['y_fit'])
+        rounds = budget
+        y_score = forest.predict_proba(data['X_val'])[:, 1]
+    y_val = data['y_val']
+    return {'loss': float(log_loss(y_val, np.clip(y_score, 1e-7, 1 - 1e-7))),
+            'roc_auc': float(roc_auc_score(y_val, y_score)),
+            'rounds': int(rounds), 'seconds': timer.perf_counter() - start}
+
+
+# Function to split the real training rows into fit and validation parts, resampling the fit part only
+def validation_split(X_train, y_train, validation_size=0.2, seed=42, sampling_strategy='minority'):
+    X_fit, X_val, y_fit, y_val = train_test_split(np.asarray(X_train), np.asarray(y_train), test_size=validation_size,
+                                                  random_state=seed, stratify=np.asarray(y_train))
+    if sampling_strategy:
+        resampled, _ = resample(X_fit, y_fit, sampling_strategy, seed)
+        X_fit, y_fit = resampled['X'], resampled['y']
+    return {'X_fit': X_fit, 'y_fit': y_fit, 'X_val': X_val, 'y_val': y_val}
+
+
+# Function to run successive halving, yielding every trial (stored ones are marked cached)
+# X_train and y_train are real rows (not resampled); see validation_split.
+def iter_search(X_train, y_train, model='xgboost', n_configs=27, eta=3, min_budget=None, max_budget=None,
+                workers=None, store=None, seed=42, mp_context=None, sampling_strategy='minority'):
+    store = store or TrialStore()
+    low, high = BUDGETS[model]
+    min_budget, max_budget = min_budget or low, max_budget or high
+    workers = workers or os.cpu_count() or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    arrays = validation_split(X_train, y_train, seed=seed, sampling_strategy=sampling_strategy)
+    data_key = hash_arrays(arrays)
+
+    survivors = sample_configs(model, n_configs, seed)
+    budget, rung = min_budget, 0
+    with SharedArrays(arrays) as shared, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+        while True:
+            results, futures = [], {}
+            for config in survivors:
+                key = hash_key('trial', model, config, budget, data_key, seed)
+                trial = store.get(key)
+                if trial is not None:
+                    results.append(trial)
+                    yield dict(trial, rung=rung, cached=True)
+                else:
+                    future = pool.submit(run_trial, model, config, budget, shared.specs, threads, seed)
+                    futures[future] = (key, config)
+            for future in as_completed(futures):
+                key, config = futures[future]
+                trial = dict(future.result(), key=key, model=model, config=config, budget=budget)
+                store.add(trial)
+                results.append(trial)
+                yield dict(trial, rung=rung, cached=False)
+
+            results.sort(key=lambda trial: trial['loss'])
+            if len(results) <= 1 or budget >= max_budget:
+                return
+            survivors = [trial['config'] for trial in results[:max(1, math.ceil(len(results) / eta))]]
+            budget, rung = min(budget * eta, max_budget), rung + 1
+
+
+# Function to run the whole search and return the best trial of the final rung
+def search(X_train, y_train, model='xgboost', **kwargs):
+    final, final_rung = [], -1
+    for trial in iter_search(X_train, y_train, model, **kwargs):
+        if trial['rung'] > final_rung:
+            final, final_rung = [], trial['rung']
+        final.append(trial)
+    return min(final, key=lambda trial: trial['loss'])
+
+
+# Function to refit the best configuration on the whole (resampled) training split and save it
+# The model goes to the tuned model file and its parameters to tuned_params.json,
+# which the model registry reads. An XGBoost model is also written as a model
+# bundle, which the app and the scoring tools load first. params_path or
+# bundle_path None skips that file.
+def write_best(best, X_train, y_train, model_path=None, params_path=TUNED_PARAMS_FILE, seed=42,
+               bundle_path=MODEL_BUNDLE_DIR, sampling_strategy='minority'):
+    model = best['model']
+    model_path = model_path or MODEL_FILES[model]
+    if model == 'xgboost':
+        params = dict(TUNED_XGB_PARAMS, **best['config'])
+        params['n_estimators'] = best['rounds']
+        estimator = XGBClassifier(**params)
+    else:
+        params = dict(best['config'], n_estimators=best['rounds'], random_state=seed)
+        estimator = RandomForestClassifier(**params)
+    X_fit, y_fit = np.asarray(X_train), np.asarray(y_train)
+    if sampling_strategy:
+        resampled, _ = resample(X_fit, y_fit, sampling_strategy, seed)
+        X_fit, y_fit = resampled['X'], resampled['y']
+    estimator.fit(X_fit, y_fit)
+    joblib.dump(estimator, model_path)
+    if model == 'xgboost' and bundle_path:
+        schema = load_schema()
+        save_bundle(estimator, bundle_path, schema,
+                    metrics={'validation_loss': best['loss'], 'validation_roc_auc': best['roc_auc'],
+                             'split': 'validation'},
+                    data={'source': schema.source, 'train_rows': int(len(y_train)),
+                          'train_hash': hash_arrays({'X': np.asarray(X_train), 'y': np.asarray(y_train)})})
+    if params_path is None:
+        return estimator
+
+    tuned = {}
+    if os.path.exists(params_path):
+        with open(params_path) as f:
+            tuned = json.load(f)
+    tuned[model] = {'params': params, 'validation_loss': best['loss'], 'validation_roc_auc': best['roc_auc'],
+                    'model_file': model_path}
+    with open(params_path, 'w') as f:
+        json.dump(tuned, f, indent=1)
+    return estimator
+
+
+def main(argv=None):
+    from dataset import load
+    from preprocessing import holdout_stage
+
+    parser = argparse.ArgumentParser(description='Tune the stroke model with successive halving.')
+    parser.add_argument('--model', choices=sorted(SEARCH_SPACES), default='xgboost')
+    parser.add_argument('--configs', type=int, default=27, help='configurations in the first rung')
+    parser.add_argument('--eta', type=int, default=3, help='keep 1/eta of the trials per rung')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--trials', default=TRIAL_FILE, help='JSONL trial store (reused to resume)')
+    parser.add_argument('--write', action='store_true',
+                        help='replace the shipped tuned model, its bundle and tuned_params.json')
+    parser.add_argument('--output', default=None, help='write only the refitted model to this file')
+    args = parser.parse_args(argv)
+
+    # Real rows only: the test part is held out, the rest is split and resampled per trial
+    _, splits, _ = holdout_stage(load().imputed, schema=load_schema())
+    start = timer.perf_counter()
+    final, final_rung = [], -1
+    for trial in iter_search(splits['X_train'], splits['y_train'], args.model, args.configs, args.eta,
+                             workers=args.workers, store=TrialStore(args.trials)):
+        if trial['rung'] > final_rung:
+            final, final_rung = [], trial['rung']
+        final.append(trial)
+        print('rung {} budget {:>4} rounds {:>4} loss {:.4f} auc {:.4f} {:>6.2f} s{} {}'.format(
+            trial['rung'], trial['budget'], trial['rounds'], trial['loss'], trial['roc_auc'], trial['seconds'],
+            ' (stored)' if trial['cached'] else '', json.dumps(trial['config'])), file=sys.stderr)
+    best = min(final, key=lambda trial: trial['loss'])
+    print('best after {:.1f} s: {}'.format(timer.perf_counter() - start, json.dumps(best['config'])), file=sys.stderr)
+    if args.output:
+        # A model written elsewhere leaves the shipped model, bundle and parameters alone
+        write_best(best, splits['X_train'], splits['y_train'], args.output, params_path=None, bundle_path=None)
+        print('wrote {}'.format(args.output), file=sys.stderr)
+    elif args.write:
+        write_best(best, splits['X_train'], splits['y_train'])
+        written = [MODEL_FILES[args.model], TUNED_PARAMS_FILE] + ([MODEL_BUNDLE_DIR] if args.model == 'xgboost' else [])
+        print('wrote {}'.format(', '.join(written)), file=sys.stderr)
+    else:
+        print('nothing written (pass --write or --output to save the model)', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()